@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("inventory_balance", sa.Column("last_tx_datetime", sa.DateTime(), nullable=True))
+    op.execute(
+        """
+        UPDATE inventory_balance
+        SET last_tx_datetime = (
+            SELECT MAX(inventory_tx.tx_datetime)
+            FROM inventory_tx
+            WHERE inventory_tx.product_id = inventory_balance.product_id
+              AND inventory_tx.lot_id = inventory_balance.lot_id
+        )
+        """
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("inventory_balance") as batch_op:
+        batch_op.drop_column("last_tx_datetime")
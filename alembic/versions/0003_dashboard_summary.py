@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "group_stock_summary",
+        sa.Column("group_id", sa.Integer(), primary_key=True),
+        sa.Column("qty_on_hand", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("negative_lot_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.ForeignKeyConstraint(["group_id"], ["product_group.group_id"]),
+    )
+    op.create_table(
+        "daily_tx_summary",
+        sa.Column("tx_date", sa.Date(), primary_key=True),
+        sa.Column("tx_type", sa.String(length=3), primary_key=True),
+        sa.Column("tx_count", sa.Integer(), nullable=False, server_default="0"),
+        sa.Column("qty", sa.Integer(), nullable=False, server_default="0"),
+    )
+
+    op.execute(
+        """
+        INSERT INTO group_stock_summary (group_id, qty_on_hand, negative_lot_count, updated_at)
+        SELECT product.group_id,
+               SUM(inventory_balance.qty_on_hand),
+               SUM(CASE WHEN inventory_balance.qty_on_hand < 0 THEN 1 ELSE 0 END),
+               CURRENT_TIMESTAMP
+        FROM inventory_balance
+        JOIN product ON product.product_id = inventory_balance.product_id
+        GROUP BY product.group_id
+        """
+    )
+    tx_date = "DATE(tx_datetime)" if op.get_bind().dialect.name == "sqlite" else "CAST(tx_datetime AS DATE)"
+    op.execute(
+        f"""
+        INSERT INTO daily_tx_summary (tx_date, tx_type, tx_count, qty)
+        SELECT {tx_date}, tx_type, COUNT(*), SUM(qty)
+        FROM inventory_tx
+        GROUP BY {tx_date}, tx_type
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("daily_tx_summary")
+    op.drop_table("group_stock_summary")
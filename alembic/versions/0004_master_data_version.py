@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "master_data_version",
+        sa.Column("name", sa.String(length=50), primary_key=True),
+        sa.Column("version", sa.Integer(), nullable=False, server_default="0"),
+    )
+    op.execute("INSERT INTO master_data_version (name, version) VALUES ('master', 0)")
+
+
+def downgrade() -> None:
+    op.drop_table("master_data_version")
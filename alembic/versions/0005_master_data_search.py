@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from alembic import op
+
+revision = "0005"
+down_revision = "0004"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.execute("CREATE INDEX ix_product_code_trgm ON product USING gin (product_code gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_product_name_trgm ON product USING gin (product_name gin_trgm_ops)")
+        op.execute("CREATE INDEX ix_lot_no_trgm ON lot USING gin (lot_no gin_trgm_ops)")
+    elif dialect == "sqlite":
+        op.execute(
+            "CREATE VIRTUAL TABLE product_search USING fts5("
+            "product_code, product_name, content='product', content_rowid='product_id', tokenize='trigram')"
+        )
+        op.execute(
+            """
+            CREATE TRIGGER product_search_ai AFTER INSERT ON product BEGIN
+                INSERT INTO product_search (rowid, product_code, product_name)
+                VALUES (new.product_id, new.product_code, new.product_name);
+            END;
+            """
+        )
+        op.execute(
+            """
+            CREATE TRIGGER product_search_ad AFTER DELETE ON product BEGIN
+                INSERT INTO product_search (product_search, rowid, product_code, product_name)
+                VALUES ('delete', old.product_id, old.product_code, old.product_name);
+            END;
+            """
+        )
+        op.execute(
+            """
+            CREATE TRIGGER product_search_au AFTER UPDATE OF product_code, product_name ON product BEGIN
+                INSERT INTO product_search (product_search, rowid, product_code, product_name)
+                VALUES ('delete', old.product_id, old.product_code, old.product_name);
+                INSERT INTO product_search (rowid, product_code, product_name)
+                VALUES (new.product_id, new.product_code, new.product_name);
+            END;
+            """
+        )
+        op.execute(
+            "CREATE VIRTUAL TABLE lot_search USING fts5("
+            "lot_no, content='lot', content_rowid='lot_id', tokenize='trigram')"
+        )
+        op.execute(
+            """
+            CREATE TRIGGER lot_search_ai AFTER INSERT ON lot BEGIN
+                INSERT INTO lot_search (rowid, lot_no) VALUES (new.lot_id, new.lot_no);
+            END;
+            """
+        )
+        op.execute(
+            """
+            CREATE TRIGGER lot_search_ad AFTER DELETE ON lot BEGIN
+                INSERT INTO lot_search (lot_search, rowid, lot_no) VALUES ('delete', old.lot_id, old.lot_no);
+            END;
+            """
+        )
+        op.execute(
+            """
+            CREATE TRIGGER lot_search_au AFTER UPDATE OF lot_no ON lot BEGIN
+                INSERT INTO lot_search (lot_search, rowid, lot_no) VALUES ('delete', old.lot_id, old.lot_no);
+                INSERT INTO lot_search (rowid, lot_no) VALUES (new.lot_id, new.lot_no);
+            END;
+            """
+        )
+        op.execute("INSERT INTO product_search (product_search) VALUES ('rebuild')")
+        op.execute("INSERT INTO lot_search (lot_search) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        op.execute("DROP INDEX IF EXISTS ix_lot_no_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_product_name_trgm")
+        op.execute("DROP INDEX IF EXISTS ix_product_code_trgm")
+    elif dialect == "sqlite":
+        for trigger in (
+            "lot_search_au",
+            "lot_search_ad",
+            "lot_search_ai",
+            "product_search_au",
+            "product_search_ad",
+            "product_search_ai",
+        ):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS lot_search")
+        op.execute("DROP TABLE IF EXISTS product_search")
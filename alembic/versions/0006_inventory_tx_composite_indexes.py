@@ -0,0 +1,33 @@
+from __future__ import annotations
+
+from alembic import op
+
+revision = "0006"
+down_revision = "0005"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Listing: optional lot filter, ordered/paged by (tx_datetime, tx_id).
+    op.create_index("ix_inventory_tx_datetime_id", "inventory_tx", ["tx_datetime", "tx_id"])
+    op.create_index("ix_inventory_tx_lot_datetime", "inventory_tx", ["lot_id", "tx_datetime", "tx_id"])
+    # Balance recalculation and rebuild: covering index for the per-lot aggregate.
+    op.create_index(
+        "ix_inventory_tx_product_lot",
+        "inventory_tx",
+        ["product_id", "lot_id", "tx_type", "qty", "tx_datetime"],
+    )
+    # Superseded by the composite indexes above.
+    op.drop_index("ix_inventory_tx_datetime", table_name="inventory_tx")
+    op.drop_index("ix_inventory_tx_product", table_name="inventory_tx")
+    op.drop_index("ix_inventory_tx_lot", table_name="inventory_tx")
+
+
+def downgrade() -> None:
+    op.create_index("ix_inventory_tx_lot", "inventory_tx", ["lot_id"])
+    op.create_index("ix_inventory_tx_product", "inventory_tx", ["product_id"])
+    op.create_index("ix_inventory_tx_datetime", "inventory_tx", ["tx_datetime"])
+    op.drop_index("ix_inventory_tx_product_lot", table_name="inventory_tx")
+    op.drop_index("ix_inventory_tx_lot_datetime", table_name="inventory_tx")
+    op.drop_index("ix_inventory_tx_datetime_id", table_name="inventory_tx")
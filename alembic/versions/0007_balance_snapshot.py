@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0007"
+down_revision = "0006"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "balance_snapshot",
+        sa.Column("snapshot_date", sa.Date(), primary_key=True),
+        sa.Column("lot_id", sa.Integer(), primary_key=True),
+        sa.Column("product_id", sa.Integer(), nullable=False),
+        sa.Column("qty_on_hand", sa.Integer(), nullable=False),
+        sa.Column("last_tx_datetime", sa.DateTime(), nullable=True),
+        sa.ForeignKeyConstraint(["lot_id"], ["lot.lot_id"]),
+        sa.ForeignKeyConstraint(["product_id"], ["product.product_id"]),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("balance_snapshot")
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0010"
+down_revision = "0009"
+branch_labels = None
+depends_on = None
+
+
+def _partition_audit_log() -> None:
+    # Monthly range partitions need the partition key in the primary key. Old
+    # rows land in the default partition until the retention job archives them;
+    # `python -m app.cli audit-retention` creates the upcoming monthly partitions.
+    op.execute("ALTER TABLE audit_log RENAME TO audit_log_legacy")
+    op.execute("ALTER TABLE audit_log_legacy RENAME CONSTRAINT audit_log_pkey TO audit_log_legacy_pkey")
+    op.execute(
+        "CREATE TABLE audit_log (LIKE audit_log_legacy INCLUDING DEFAULTS INCLUDING CONSTRAINTS) "
+        "PARTITION BY RANGE (created_at)"
+    )
+    op.execute("ALTER TABLE audit_log ADD CONSTRAINT audit_log_pkey PRIMARY KEY (audit_id, created_at)")
+    op.execute("CREATE TABLE audit_log_default PARTITION OF audit_log DEFAULT")
+    op.execute("INSERT INTO audit_log SELECT * FROM audit_log_legacy")
+    op.execute("ALTER SEQUENCE audit_log_audit_id_seq OWNED BY audit_log.audit_id")
+    op.execute("DROP TABLE audit_log_legacy")
+
+
+def _unpartition_audit_log() -> None:
+    op.execute("ALTER TABLE audit_log RENAME TO audit_log_partitioned")
+    op.execute("ALTER TABLE audit_log_partitioned RENAME CONSTRAINT audit_log_pkey TO audit_log_partitioned_pkey")
+    op.execute("CREATE TABLE audit_log (LIKE audit_log_partitioned INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    op.execute("ALTER TABLE audit_log ADD CONSTRAINT audit_log_pkey PRIMARY KEY (audit_id)")
+    op.execute("INSERT INTO audit_log SELECT * FROM audit_log_partitioned")
+    op.execute("ALTER SEQUENCE audit_log_audit_id_seq OWNED BY audit_log.audit_id")
+    op.execute("DROP TABLE audit_log_partitioned CASCADE")
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "postgresql":
+        _partition_audit_log()
+    # Entity history (the endpoint's filter) and time-ordered paging/retention.
+    op.create_index("ix_audit_log_entity", "audit_log", ["entity_type", "entity_id", "created_at", "audit_id"])
+    op.create_index("ix_audit_log_created", "audit_log", ["created_at", "audit_id"])
+    op.create_table(
+        "audit_archive",
+        sa.Column("archive_id", sa.Integer(), primary_key=True),
+        sa.Column("month", sa.Date(), nullable=False),
+        sa.Column("part", sa.Integer(), nullable=False),
+        sa.Column("path", sa.String(length=500), nullable=False),
+        sa.Column("row_count", sa.Integer(), nullable=False),
+        sa.Column("archived_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.create_index("ix_audit_archive_month", "audit_archive", ["month"])
+
+
+def downgrade() -> None:
+    op.drop_table("audit_archive")
+    op.drop_index("ix_audit_log_created", table_name="audit_log")
+    op.drop_index("ix_audit_log_entity", table_name="audit_log")
+    if op.get_bind().dialect.name == "postgresql":
+        _unpartition_audit_log()
@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0011"
+down_revision = "0010"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    if op.get_bind().dialect.name == "sqlite":
+        # A batch table rebuild would drop the no-delete trigger; SQLite accepts
+        # an inline REFERENCES clause on ADD COLUMN instead.
+        op.execute("ALTER TABLE inventory_tx ADD COLUMN original_tx_id INTEGER REFERENCES inventory_tx (tx_id)")
+    else:
+        op.add_column("inventory_tx", sa.Column("original_tx_id", sa.Integer(), nullable=True))
+        op.create_foreign_key("fk_inventory_tx_original_tx_id", "inventory_tx", "inventory_tx", ["original_tx_id"], ["tx_id"])
+    # Aggregates now filter on is_void; keep the per-lot index covering.
+    op.drop_index("ix_inventory_tx_product_lot", table_name="inventory_tx")
+    op.create_index(
+        "ix_inventory_tx_product_lot",
+        "inventory_tx",
+        ["product_id", "lot_id", "tx_type", "qty", "tx_datetime", "is_void"],
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_inventory_tx_product_lot", table_name="inventory_tx")
+    op.create_index(
+        "ix_inventory_tx_product_lot",
+        "inventory_tx",
+        ["product_id", "lot_id", "tx_type", "qty", "tx_datetime"],
+    )
+    if op.get_bind().dialect.name != "sqlite":
+        op.drop_constraint("fk_inventory_tx_original_tx_id", "inventory_tx", type_="foreignkey")
+    op.drop_column("inventory_tx", "original_tx_id")
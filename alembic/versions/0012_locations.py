@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0012"
+down_revision = "0011"
+branch_labels = None
+depends_on = None
+
+DEFAULT_LOCATION_ID = 1
+
+
+def _is_sqlite() -> bool:
+    return op.get_bind().dialect.name == "sqlite"
+
+
+def _add_location_to_key(table: str, key: list[str]) -> None:
+    """Add ``location_id`` (existing rows go to the default location) and extend the primary key."""
+    column = sa.Column("location_id", sa.Integer(), nullable=False, server_default=str(DEFAULT_LOCATION_ID))
+    if _is_sqlite():
+        # SQLite cannot alter a primary key in place; balance tables have no triggers to lose.
+        with op.batch_alter_table(table, recreate="always") as batch_op:
+            batch_op.add_column(column)
+            batch_op.create_primary_key(f"{table}_pkey", [*key, "location_id"])
+            batch_op.create_foreign_key(f"fk_{table}_location_id", "location", ["location_id"], ["location_id"])
+    else:
+        op.add_column(table, column)
+        op.create_foreign_key(f"fk_{table}_location_id", table, "location", ["location_id"], ["location_id"])
+        op.drop_constraint(f"{table}_pkey", table, type_="primary")
+        op.create_primary_key(f"{table}_pkey", table, [*key, "location_id"])
+
+
+def _drop_location_from_key(table: str, key: list[str]) -> None:
+    if _is_sqlite():
+        with op.batch_alter_table(table, recreate="always") as batch_op:
+            batch_op.drop_constraint(f"fk_{table}_location_id", type_="foreignkey")
+            batch_op.create_primary_key(f"{table}_pkey", key)
+            batch_op.drop_column("location_id")
+    else:
+        op.drop_constraint(f"fk_{table}_location_id", table, type_="foreignkey")
+        op.drop_constraint(f"{table}_pkey", table, type_="primary")
+        op.create_primary_key(f"{table}_pkey", table, key)
+        op.drop_column(table, "location_id")
+
+
+def upgrade() -> None:
+    location = op.create_table(
+        "location",
+        sa.Column("location_id", sa.Integer(), primary_key=True),
+        sa.Column("location_code", sa.String(length=50), nullable=False, unique=True),
+        sa.Column("location_name", sa.String(length=200), nullable=False),
+        sa.Column("is_active", sa.Boolean(), nullable=False, server_default=sa.true()),
+        sa.Column("created_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+        sa.Column("updated_at", sa.DateTime(), nullable=False, server_default=sa.func.now()),
+    )
+    op.bulk_insert(
+        location,
+        [{"location_id": DEFAULT_LOCATION_ID, "location_code": "MAIN", "location_name": "Main warehouse", "is_active": True}],
+    )
+    if op.get_bind().dialect.name == "postgresql":
+        op.execute("SELECT setval(pg_get_serial_sequence('location', 'location_id'), (SELECT MAX(location_id) FROM location))")
+
+    if _is_sqlite():
+        # Plain ADD COLUMN keeps the no-delete trigger that a table rebuild would drop.
+        op.execute(
+            "ALTER TABLE inventory_tx ADD COLUMN location_id INTEGER NOT NULL "
+            f"DEFAULT {DEFAULT_LOCATION_ID} REFERENCES location (location_id)"
+        )
+    else:
+        op.add_column(
+            "inventory_tx",
+            sa.Column("location_id", sa.Integer(), nullable=False, server_default=str(DEFAULT_LOCATION_ID)),
+        )
+        op.create_foreign_key("fk_inventory_tx_location_id", "inventory_tx", "location", ["location_id"], ["location_id"])
+    op.create_index("ix_inventory_tx_location_datetime", "inventory_tx", ["location_id", "tx_datetime", "tx_id"])
+    op.drop_index("ix_inventory_tx_product_lot", table_name="inventory_tx")
+    op.create_index(
+        "ix_inventory_tx_product_lot",
+        "inventory_tx",
+        ["product_id", "lot_id", "location_id", "tx_type", "qty", "tx_datetime", "is_void"],
+    )
+
+    _add_location_to_key("inventory_balance", ["product_id", "lot_id"])
+    # Per-location listings; the primary key serves the per-lot roll-up.
+    op.create_index("ix_inventory_balance_location", "inventory_balance", ["location_id", "product_id", "lot_id"])
+    op.drop_index("ix_inventory_balance_lot", table_name="inventory_balance")
+    op.create_index("ix_inventory_balance_lot", "inventory_balance", ["lot_id", "location_id"])
+
+    _add_location_to_key("balance_snapshot", ["snapshot_date", "lot_id"])
+
+
+def downgrade() -> None:
+    for table in ("inventory_tx", "inventory_balance", "balance_snapshot"):
+        moved = op.get_bind().execute(
+            sa.text(f"SELECT COUNT(*) FROM {table} WHERE location_id <> {DEFAULT_LOCATION_ID}")
+        ).scalar()
+        if moved:
+            raise RuntimeError(f"{table} has rows outside the default location; merge them before downgrading")
+
+    _drop_location_from_key("balance_snapshot", ["snapshot_date", "lot_id"])
+
+    op.drop_index("ix_inventory_balance_lot", table_name="inventory_balance")
+    op.create_index("ix_inventory_balance_lot", "inventory_balance", ["lot_id"])
+    op.drop_index("ix_inventory_balance_location", table_name="inventory_balance")
+    _drop_location_from_key("inventory_balance", ["product_id", "lot_id"])
+
+    op.drop_index("ix_inventory_tx_product_lot", table_name="inventory_tx")
+    op.create_index(
+        "ix_inventory_tx_product_lot",
+        "inventory_tx",
+        ["product_id", "lot_id", "tx_type", "qty", "tx_datetime", "is_void"],
+    )
+    op.drop_index("ix_inventory_tx_location_datetime", table_name="inventory_tx")
+    if not _is_sqlite():
+        op.drop_constraint("fk_inventory_tx_location_id", "inventory_tx", type_="foreignkey")
+    op.drop_column("inventory_tx", "location_id")
+    op.drop_table("location")
@@ -0,0 +1,24 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0013"
+down_revision = "0012"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # Partial index: allocation reads only lots that still hold stock.
+    op.create_index(
+        "ix_inventory_balance_in_stock",
+        "inventory_balance",
+        ["product_id", "location_id", "lot_id", "qty_on_hand"],
+        sqlite_where=sa.text("qty_on_hand > 0"),
+        postgresql_where=sa.text("qty_on_hand > 0"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_inventory_balance_in_stock", table_name="inventory_balance")
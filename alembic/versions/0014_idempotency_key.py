@@ -0,0 +1,29 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision = "0014"
+down_revision = "0013"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "idempotency_key",
+        sa.Column("idempotency_key", sa.String(length=255), primary_key=True),
+        sa.Column("endpoint", sa.String(length=100), nullable=False),
+        sa.Column("request_hash", sa.String(length=64), nullable=False),
+        sa.Column("status_code", sa.Integer(), nullable=True),
+        sa.Column("response_body", sa.JSON().with_variant(postgresql.JSONB(), "postgresql"), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+    )
+    # The purge job deletes by age.
+    op.create_index("ix_idempotency_key_created", "idempotency_key", ["created_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_idempotency_key_created", table_name="idempotency_key")
+    op.drop_table("idempotency_key")
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0015"
+down_revision = "0014"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("group_stock_summary", sa.Column("product_count", sa.Integer(), nullable=False, server_default="0"))
+    op.add_column("group_stock_summary", sa.Column("lot_count", sa.Integer(), nullable=False, server_default="0"))
+
+    op.execute(
+        """
+        INSERT INTO group_stock_summary (group_id, qty_on_hand, negative_lot_count, updated_at)
+        SELECT product_group.group_id, 0, 0, CURRENT_TIMESTAMP
+        FROM product_group
+        WHERE NOT EXISTS (
+            SELECT 1 FROM group_stock_summary WHERE group_stock_summary.group_id = product_group.group_id
+        )
+        """
+    )
+    op.execute(
+        """
+        UPDATE group_stock_summary
+        SET product_count = (
+                SELECT COUNT(*) FROM product
+                WHERE product.group_id = group_stock_summary.group_id AND product.is_active
+            ),
+            lot_count = (
+                SELECT COUNT(*) FROM lot
+                JOIN product ON product.product_id = lot.product_id
+                WHERE product.group_id = group_stock_summary.group_id AND lot.is_active
+            )
+        """
+    )
+
+
+def downgrade() -> None:
+    with op.batch_alter_table("group_stock_summary") as batch_op:
+        batch_op.drop_column("lot_count")
+        batch_op.drop_column("product_count")
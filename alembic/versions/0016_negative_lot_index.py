@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+import sqlalchemy as sa
+from alembic import op
+
+revision = "0016"
+down_revision = "0015"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # The dashboard counts distinct short lots at read time; a per-row counter
+    # counted a lot once per location it was short at.
+    op.create_index(
+        "ix_inventory_balance_negative",
+        "inventory_balance",
+        ["product_id", "lot_id"],
+        sqlite_where=sa.text("qty_on_hand < 0"),
+        postgresql_where=sa.text("qty_on_hand < 0"),
+    )
+    with op.batch_alter_table("group_stock_summary") as batch_op:
+        batch_op.drop_column("negative_lot_count")
+
+
+def downgrade() -> None:
+    op.add_column("group_stock_summary", sa.Column("negative_lot_count", sa.Integer(), nullable=False, server_default="0"))
+    op.execute(
+        """
+        UPDATE group_stock_summary
+        SET negative_lot_count = (
+            SELECT COUNT(*) FROM inventory_balance
+            JOIN product ON product.product_id = inventory_balance.product_id
+            WHERE product.group_id = group_stock_summary.group_id AND inventory_balance.qty_on_hand < 0
+        )
+        """
+    )
+    op.drop_index("ix_inventory_balance_negative", table_name="inventory_balance")
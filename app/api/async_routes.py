@@ -0,0 +1,157 @@
+from __future__ import annotations
+
+import datetime as dt
+from typing import AsyncIterator
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request, status
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app import idempotency, schemas, serialization, services
+from app.api.routes import TX_STREAM_BATCH_SIZE, idempotent_replay, posting_error
+from app.db import async_read_session_factory, get_async_db, get_async_read_db
+
+# Async variants of the posting and listing endpoints. They reuse the sync
+# service functions through AsyncSession.run_sync, so database I/O is awaited on
+# the event loop instead of occupying a threadpool worker per request.
+async_router = APIRouter(prefix="/async")
+
+
+async def claim_idempotency_key(db: AsyncSession, key: str | None, endpoint: str, payload) -> Response | None:
+    if not key:
+        return None
+    try:
+        record = await db.run_sync(idempotency.claim, key, endpoint, payload)
+    except idempotency.IdempotencyKeyReusedError as exc:
+        await db.rollback()
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)) from exc
+    if record is None:
+        return None
+    replay = idempotent_replay(record)
+    await db.rollback()
+    return replay
+
+
+@async_router.post("/inventory/in", response_model=schemas.InventoryTxOut, status_code=status.HTTP_201_CREATED)
+async def create_inbound(
+    payload: schemas.InventoryInCreate,
+    idempotency_key: str | None = Header(default=None, max_length=255),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Keys are shared with the sync route: a retry may arrive on either.
+    replay = await claim_idempotency_key(db, idempotency_key, "POST /inventory/in", payload)
+    if replay is not None:
+        return replay
+    try:
+        tx = await db.run_sync(services.post_inbound, payload)
+    except ValueError as exc:
+        await db.rollback()
+        raise posting_error(exc) from exc
+    result = schemas.InventoryTxOut.model_validate(tx)
+    if idempotency_key:
+        await db.run_sync(idempotency.store, idempotency_key, status.HTTP_201_CREATED, result.model_dump(mode="json"))
+    await db.commit()
+    return result
+
+
+@async_router.post("/inventory/out", response_model=schemas.InventoryTxOut, status_code=status.HTTP_201_CREATED)
+async def create_outbound(
+    payload: schemas.InventoryOutCreate,
+    idempotency_key: str | None = Header(default=None, max_length=255),
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Keys are shared with the sync route: a retry may arrive on either.
+    replay = await claim_idempotency_key(db, idempotency_key, "POST /inventory/out", payload)
+    if replay is not None:
+        return replay
+    try:
+        tx = await db.run_sync(services.post_outbound, payload)
+    except ValueError as exc:
+        await db.rollback()
+        raise posting_error(exc) from exc
+    result = schemas.InventoryTxOut.model_validate(tx)
+    if idempotency_key:
+        await db.run_sync(idempotency.store, idempotency_key, status.HTTP_201_CREATED, result.model_dump(mode="json"))
+    await db.commit()
+    return result
+
+
+@async_router.post("/inventory/batch", response_model=list[schemas.InventoryTxOut], status_code=status.HTTP_201_CREATED)
+async def create_batch(payload: schemas.InventoryBatchCreate, db: AsyncSession = Depends(get_async_db)):
+    try:
+        txs = await db.run_sync(services.post_inventory_batch, payload.lines)
+    except ValueError as exc:
+        await db.rollback()
+        raise posting_error(exc) from exc
+    result = [schemas.InventoryTxOut.model_validate(tx) for tx in txs]
+    await db.commit()
+    return result
+
+
+@async_router.get("/inventory/transactions", response_model=list[schemas.InventoryTxOut])
+async def list_transactions(
+    request: Request,
+    start_datetime: dt.datetime | None = None,
+    end_datetime: dt.datetime | None = None,
+    product_code: str | None = None,
+    lot_id: int | None = None,
+    location_id: int | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = None,
+    format: str = Query(default="json", pattern="^(json|ndjson)$"),
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    try:
+        stmt = services.transactions_stmt(
+            db,
+            start_datetime=start_datetime,
+            end_datetime=end_datetime,
+            product_code=product_code,
+            lot_id=lot_id,
+            location_id=location_id,
+            cursor=cursor,
+        )
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc)) from exc
+    if format == "ndjson":
+        return StreamingResponse(_stream_transactions(stmt, async_read_session_factory(request)), media_type="application/x-ndjson")
+
+    rows, next_cursor = await db.run_sync(services.page_transactions, stmt, limit)
+    return serialization.JSONRows(rows, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+
+async def _stream_transactions(stmt, session_factory) -> AsyncIterator[bytes]:
+    stmt = stmt.with_only_columns(*services.TX_OUT_COLUMNS).execution_options(yield_per=TX_STREAM_BATCH_SIZE)
+    async with session_factory() as session:
+        result = await session.stream(stmt)
+        keys = tuple(result.keys())
+        async for row in result:
+            yield serialization.dumps(dict(zip(keys, row))) + b"\n"
+
+
+@async_router.get("/inventory/balance", response_model=list[schemas.BalanceOut])
+async def list_balance(
+    group_id: int | None = None,
+    product_code: str | None = None,
+    mfg_date_from: dt.date | None = None,
+    mfg_date_to: dt.date | None = None,
+    lot_no: str | None = None,
+    location_id: int | None = None,
+    by_location: bool = False,
+    as_of: dt.date | None = None,
+    db: AsyncSession = Depends(get_async_read_db),
+):
+    rows = await db.run_sync(
+        lambda sync_db: services.list_balance(
+            sync_db,
+            group_id=group_id,
+            product_code=product_code,
+            mfg_date_from=mfg_date_from,
+            mfg_date_to=mfg_date_to,
+            lot_no=lot_no,
+            location_id=location_id,
+            by_location=by_location,
+            as_of=as_of,
+        )
+    )
+    return serialization.JSONRows(rows)
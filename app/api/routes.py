@@ -1,25 +1,89 @@
 from __future__ import annotations
 
 import datetime as dt
+from typing import Iterator
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import and_, func, select
+from fastapi import APIRouter, BackgroundTasks, Depends, File, Header, HTTPException, Query, Request, UploadFile, status
+from fastapi.responses import Response, StreamingResponse
+from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
-from app import models, schemas, services
-from app.db import get_db
+from app import audit, export, idempotency, importer, models, schemas, search, serialization, services
+from app.cache import master_cache
+from app.db import get_db, get_read_db, read_session_factory
 
 router = APIRouter()
 
+TX_STREAM_BATCH_SIZE = 1000
+
+BALANCE_EXPORT_COLUMNS = (
+    "product_group",
+    "product_code",
+    "product_name",
+    "mfg_date",
+    "lot_no",
+    "qty_on_hand",
+    "last_tx_datetime",
+    "location_code",
+)
+TX_EXPORT_COLUMNS = (
+    "tx_id",
+    "tx_type",
+    "tx_datetime",
+    "product_id",
+    "lot_id",
+    "qty",
+    "ref_doc",
+    "note",
+    "is_void",
+    "original_tx_id",
+    "location_id",
+)
+
 
 def _handle_value_error(exc: ValueError) -> HTTPException:
     return HTTPException(status_code=400, detail=str(exc))
 
+
+def posting_error(exc: ValueError) -> HTTPException:
+    if isinstance(exc, services.InsufficientStockError):
+        return HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail={"message": str(exc), "current_qty": exc.current_qty, "requires_confirm": True},
+        )
+    if isinstance(exc, services.BatchValidationError):
+        return HTTPException(status_code=400, detail={"message": str(exc), "errors": exc.errors})
+    return _handle_value_error(exc)
+
+
+def idempotent_replay(record: models.IdempotencyKey) -> Response:
+    return serialization.JSONRows(
+        record.response_body, status_code=record.status_code, headers={"Idempotency-Replayed": "true"}
+    )
+
+
+def claim_idempotency_key(db: Session, key: str | None, endpoint: str, payload) -> Response | None:
+    """The stored response when ``key`` was already used, else ``None`` with the key held by this transaction."""
+    if not key:
+        return None
+    try:
+        record = idempotency.claim(db, key, endpoint, payload)
+    except idempotency.IdempotencyKeyReusedError as exc:
+        db.rollback()
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(exc)) from exc
+    if record is None:
+        return None
+    replay = idempotent_replay(record)
+    db.rollback()
+    return replay
+
+
 @router.post("/product-groups", response_model=schemas.ProductGroupOut, status_code=status.HTTP_201_CREATED)
 def create_product_group(payload: schemas.ProductGroupCreate, db: Session = Depends(get_db)):
     group = models.ProductGroup(**payload.model_dump())
     db.add(group)
+    services.invalidate_master_data(db)
     try:
         db.commit()
     except IntegrityError as exc:
@@ -33,7 +97,7 @@ def create_product_group(payload: schemas.ProductGroupCreate, db: Session = Depe
 def list_product_groups(
     is_active: bool | None = None,
     q: str | None = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     stmt = select(models.ProductGroup)
     if is_active is not None:
@@ -50,6 +114,7 @@ def update_product_group(group_id: int, payload: schemas.ProductGroupUpdate, db:
         raise HTTPException(status_code=404, detail="Product group not found")
     for key, value in payload.model_dump(exclude_unset=True).items():
         setattr(group, key, value)
+    services.invalidate_master_data(db)
     try:
         db.commit()
     except IntegrityError as exc:
@@ -67,6 +132,8 @@ def create_product(payload: schemas.ProductCreate, db: Session = Depends(get_db)
         raise _handle_value_error(exc) from exc
     product = models.Product(**payload.model_dump())
     db.add(product)
+    services.apply_master_count_deltas(db, {payload.group_id: (int(payload.is_active), 0)})
+    services.invalidate_master_data(db)
     try:
         db.commit()
     except IntegrityError as exc:
@@ -82,18 +149,19 @@ def list_products(
     product_code: str | None = None,
     is_active: bool | None = None,
     q: str | None = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     stmt = select(models.Product)
     if group_id:
         stmt = stmt.where(models.Product.group_id == group_id)
     if product_code:
-        stmt = stmt.where(models.Product.product_code.ilike(f"%{product_code}%"))
+        stmt = stmt.where(search.contains(db, models.Product.product_code, product_code))
     if is_active is not None:
         stmt = stmt.where(models.Product.is_active == is_active)
     if q:
-        stmt = stmt.where(models.Product.product_name.ilike(f"%{q}%"))
-    return db.execute(stmt.order_by(models.Product.product_code)).scalars().all()
+        stmt = stmt.where(search.contains(db, models.Product.product_name, q))
+    stmt = stmt.with_only_columns(*serialization.columns(models.Product, schemas.ProductOut))
+    return serialization.JSONRows(serialization.row_dicts(db.execute(stmt.order_by(models.Product.product_code))))
 
 
 @router.put("/products/{product_id}", response_model=schemas.ProductOut)
@@ -107,8 +175,19 @@ def update_product(product_id: int, payload: schemas.ProductUpdate, db: Session
             services.assert_group_active(db, update_data["group_id"])
         except ValueError as exc:
             raise _handle_value_error(exc) from exc
+        if update_data["group_id"] != product.group_id:
+            services.move_product_stock_summary(db, product_id, product.group_id, update_data["group_id"])
+    services.update_product_master_counts(
+        db,
+        product_id,
+        product.group_id,
+        product.is_active,
+        update_data.get("group_id", product.group_id),
+        update_data.get("is_active", product.is_active),
+    )
     for key, value in update_data.items():
         setattr(product, key, value)
+    services.invalidate_master_data(db)
     try:
         db.commit()
     except IntegrityError as exc:
@@ -121,11 +200,13 @@ def update_product(product_id: int, payload: schemas.ProductUpdate, db: Session
 @router.post("/lots", response_model=schemas.LotOut, status_code=status.HTTP_201_CREATED)
 def create_lot(payload: schemas.LotCreate, db: Session = Depends(get_db)):
     try:
-        services.assert_product_active(db, payload.product_id)
+        product = services.assert_product_active(db, payload.product_id)
     except ValueError as exc:
         raise _handle_value_error(exc) from exc
     lot = models.Lot(**payload.model_dump())
     db.add(lot)
+    services.apply_master_count_deltas(db, {product.group_id: (0, int(payload.is_active))})
+    services.invalidate_master_data(db)
     try:
         db.commit()
     except IntegrityError as exc:
@@ -142,7 +223,7 @@ def list_lots(
     mfg_date_to: dt.date | None = None,
     lot_no: str | None = None,
     is_active: bool | None = None,
-    db: Session = Depends(get_db),
+    db: Session = Depends(get_read_db),
 ):
     stmt = select(models.Lot)
     if product_id:
@@ -152,10 +233,11 @@ def list_lots(
     if mfg_date_to:
         stmt = stmt.where(models.Lot.mfg_date <= mfg_date_to)
     if lot_no:
-        stmt = stmt.where(models.Lot.lot_no.ilike(f"%{lot_no}%"))
+        stmt = stmt.where(search.contains(db, models.Lot.lot_no, lot_no))
     if is_active is not None:
         stmt = stmt.where(models.Lot.is_active == is_active)
-    return db.execute(stmt.order_by(models.Lot.mfg_date.desc())).scalars().all()
+    stmt = stmt.with_only_columns(*serialization.columns(models.Lot, schemas.LotOut))
+    return serialization.JSONRows(serialization.row_dicts(db.execute(stmt.order_by(models.Lot.mfg_date.desc()))))
 
 
 @router.put("/lots/{lot_id}", response_model=schemas.LotOut)
@@ -169,8 +251,16 @@ def update_lot(lot_id: int, payload: schemas.LotUpdate, db: Session = Depends(ge
             services.assert_product_active(db, update_data["product_id"])
         except ValueError as exc:
             raise _handle_value_error(exc) from exc
+    services.update_lot_master_counts(
+        db,
+        lot.product_id,
+        lot.is_active,
+        update_data.get("product_id", lot.product_id),
+        update_data.get("is_active", lot.is_active),
+    )
     for key, value in update_data.items():
         setattr(lot, key, value)
+    services.invalidate_master_data(db)
     try:
         db.commit()
     except IntegrityError as exc:
@@ -180,114 +270,171 @@ def update_lot(lot_id: int, payload: schemas.LotUpdate, db: Session = Depends(ge
     return lot
 
 
+@router.post("/locations", response_model=schemas.LocationOut, status_code=status.HTTP_201_CREATED)
+def create_location(payload: schemas.LocationCreate, db: Session = Depends(get_db)):
+    location = models.Location(**payload.model_dump())
+    db.add(location)
+    services.invalidate_master_data(db)
+    try:
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Duplicate location code") from exc
+    db.refresh(location)
+    return location
+
+
+@router.get("/locations", response_model=list[schemas.LocationOut])
+def list_locations(is_active: bool | None = None, db: Session = Depends(get_read_db)):
+    stmt = select(models.Location)
+    if is_active is not None:
+        stmt = stmt.where(models.Location.is_active == is_active)
+    return db.execute(stmt.order_by(models.Location.location_code)).scalars().all()
+
+
+@router.put("/locations/{location_id}", response_model=schemas.LocationOut)
+def update_location(location_id: int, payload: schemas.LocationUpdate, db: Session = Depends(get_db)):
+    location = db.get(models.Location, location_id)
+    if not location:
+        raise HTTPException(status_code=404, detail="Location not found")
+    for key, value in payload.model_dump(exclude_unset=True).items():
+        setattr(location, key, value)
+    services.invalidate_master_data(db)
+    try:
+        db.commit()
+    except IntegrityError as exc:
+        db.rollback()
+        raise HTTPException(status_code=400, detail="Duplicate location code") from exc
+    db.refresh(location)
+    return location
+
+
 @router.post("/inventory/in", response_model=schemas.InventoryTxOut, status_code=status.HTTP_201_CREATED)
-def create_inbound(payload: schemas.InventoryInCreate, db: Session = Depends(get_db)):
+def create_inbound(
+    payload: schemas.InventoryInCreate,
+    idempotency_key: str | None = Header(default=None, max_length=255),
+    db: Session = Depends(get_db),
+):
+    replay = claim_idempotency_key(db, idempotency_key, "POST /inventory/in", payload)
+    if replay is not None:
+        return replay
     try:
-        lot = services.assert_lot_active(db, payload.lot_id)
+        tx = services.post_inbound(db, payload)
     except ValueError as exc:
-        raise _handle_value_error(exc) from exc
-    if lot.product_id != payload.product_id:
-        raise HTTPException(status_code=400, detail="Lot does not match product")
-    with db.begin():
-        tx = models.InventoryTx(
-            tx_type=models.TxType.IN.value,
-            tx_datetime=dt.datetime.utcnow(),
-            product_id=payload.product_id,
-            lot_id=payload.lot_id,
-            qty=payload.qty,
-            ref_doc=payload.ref_doc,
-            note=payload.note,
-        )
-        db.add(tx)
-        db.flush()
-        balance = db.get(models.InventoryBalance, {"product_id": payload.product_id, "lot_id": payload.lot_id})
-        if balance:
-            balance.qty_on_hand += payload.qty
-        else:
-            balance = models.InventoryBalance(
-                product_id=payload.product_id,
-                lot_id=payload.lot_id,
-                qty_on_hand=payload.qty,
-            )
-            db.add(balance)
-        services.create_audit_log(
-            db,
-            entity_type="inventory_tx",
-            entity_id=str(tx.tx_id),
-            action="CREATE",
-            changed_fields={"after": payload.model_dump()},
-        )
-    db.refresh(tx)
-    return tx
+        db.rollback()
+        raise posting_error(exc) from exc
+    result = schemas.InventoryTxOut.model_validate(tx)
+    if idempotency_key:
+        idempotency.store(db, idempotency_key, status.HTTP_201_CREATED, result.model_dump(mode="json"))
+    db.commit()
+    return result
 
 
 @router.post("/inventory/out", response_model=schemas.InventoryTxOut, status_code=status.HTTP_201_CREATED)
-def create_outbound(payload: schemas.InventoryOutCreate, db: Session = Depends(get_db)):
+def create_outbound(
+    payload: schemas.InventoryOutCreate,
+    idempotency_key: str | None = Header(default=None, max_length=255),
+    db: Session = Depends(get_db),
+):
+    replay = claim_idempotency_key(db, idempotency_key, "POST /inventory/out", payload)
+    if replay is not None:
+        return replay
     try:
-        lot = services.assert_lot_active(db, payload.lot_id)
+        tx = services.post_outbound(db, payload)
     except ValueError as exc:
-        raise _handle_value_error(exc) from exc
-    if lot.product_id != payload.product_id:
-        raise HTTPException(status_code=400, detail="Lot does not match product")
-    current_qty = services.get_balance_qty(db, payload.product_id, payload.lot_id)
-    if current_qty - payload.qty < 0 and not payload.confirm_shortage:
+        db.rollback()
+        raise posting_error(exc) from exc
+    result = schemas.InventoryTxOut.model_validate(tx)
+    if idempotency_key:
+        idempotency.store(db, idempotency_key, status.HTTP_201_CREATED, result.model_dump(mode="json"))
+    db.commit()
+    return result
+
+
+@router.post("/inventory/out/allocate", response_model=list[schemas.InventoryTxOut], status_code=status.HTTP_201_CREATED)
+def create_allocated_outbound(payload: schemas.InventoryAllocateCreate, db: Session = Depends(get_db)):
+    try:
+        txs = services.post_allocated_outbound(db, payload)
+    except services.InsufficientStockError as exc:
+        db.rollback()
+        # Allocation never goes negative, so there is nothing to confirm.
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
-            detail={"message": "Insufficient stock", "current_qty": current_qty, "requires_confirm": True},
-        )
-    with db.begin():
-        tx = models.InventoryTx(
-            tx_type=models.TxType.OUT.value,
-            tx_datetime=dt.datetime.utcnow(),
-            product_id=payload.product_id,
-            lot_id=payload.lot_id,
-            qty=payload.qty,
-            ref_doc=payload.ref_doc,
-            note=payload.note,
-        )
-        db.add(tx)
-        db.flush()
-        balance = db.get(models.InventoryBalance, {"product_id": payload.product_id, "lot_id": payload.lot_id})
-        if balance:
-            balance.qty_on_hand -= payload.qty
-        else:
-            balance = models.InventoryBalance(
-                product_id=payload.product_id,
-                lot_id=payload.lot_id,
-                qty_on_hand=-payload.qty,
-            )
-            db.add(balance)
-        services.create_audit_log(
-            db,
-            entity_type="inventory_tx",
-            entity_id=str(tx.tx_id),
-            action="CREATE",
-            changed_fields={"after": payload.model_dump()},
-        )
-    db.refresh(tx)
-    return tx
+            detail={"message": str(exc), "current_qty": exc.current_qty, "requires_confirm": False},
+        ) from exc
+    except ValueError as exc:
+        db.rollback()
+        raise posting_error(exc) from exc
+    result = [schemas.InventoryTxOut.model_validate(tx) for tx in txs]
+    db.commit()
+    return result
+
+
+@router.post("/inventory/transfer", response_model=list[schemas.InventoryTxOut], status_code=status.HTTP_201_CREATED)
+def create_transfer(payload: schemas.InventoryTransferCreate, db: Session = Depends(get_db)):
+    try:
+        txs = services.post_transfer(db, payload)
+    except ValueError as exc:
+        db.rollback()
+        raise posting_error(exc) from exc
+    result = [schemas.InventoryTxOut.model_validate(tx) for tx in txs]
+    db.commit()
+    return result
+
+
+@router.post("/inventory/batch", response_model=list[schemas.InventoryTxOut], status_code=status.HTTP_201_CREATED)
+def create_batch(payload: schemas.InventoryBatchCreate, db: Session = Depends(get_db)):
+    try:
+        txs = services.post_inventory_batch(db, payload.lines)
+    except ValueError as exc:
+        db.rollback()
+        raise posting_error(exc) from exc
+    result = [schemas.InventoryTxOut.model_validate(tx) for tx in txs]
+    db.commit()
+    return result
 
 
 @router.get("/inventory/transactions", response_model=list[schemas.InventoryTxOut])
 def list_transactions(
+    request: Request,
     start_datetime: dt.datetime | None = None,
     end_datetime: dt.datetime | None = None,
     product_code: str | None = None,
     lot_id: int | None = None,
-    db: Session = Depends(get_db),
+    location_id: int | None = None,
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = None,
+    format: str = Query(default="json", pattern="^(json|ndjson)$"),
+    db: Session = Depends(get_read_db),
 ):
-    stmt = select(models.InventoryTx)
-    if start_datetime:
-        stmt = stmt.where(models.InventoryTx.tx_datetime >= start_datetime)
-    if end_datetime:
-        stmt = stmt.where(models.InventoryTx.tx_datetime <= end_datetime)
-    if lot_id:
-        stmt = stmt.where(models.InventoryTx.lot_id == lot_id)
-    if product_code:
-        stmt = stmt.join(models.Product, models.InventoryTx.product_id == models.Product.product_id).where(
-            models.Product.product_code.ilike(f"%{product_code}%")
+    try:
+        stmt = services.transactions_stmt(
+            db,
+            start_datetime=start_datetime,
+            end_datetime=end_datetime,
+            product_code=product_code,
+            lot_id=lot_id,
+            location_id=location_id,
+            cursor=cursor,
         )
-    return db.execute(stmt.order_by(models.InventoryTx.tx_datetime.desc())).scalars().all()
+    except ValueError as exc:
+        raise _handle_value_error(exc) from exc
+    if format == "ndjson":
+        return StreamingResponse(_stream_transactions(stmt, read_session_factory(request)), media_type="application/x-ndjson")
+
+    rows, next_cursor = services.page_transactions(db, stmt, limit)
+    return serialization.JSONRows(rows, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+
+def _stream_transactions(stmt, session_factory) -> Iterator[bytes]:
+    # The request-scoped session is closed before the body is sent, so the
+    # stream owns its session and reads through a server-side cursor.
+    stmt = stmt.with_only_columns(*services.TX_OUT_COLUMNS).execution_options(yield_per=TX_STREAM_BATCH_SIZE)
+    with session_factory() as session:
+        result = session.execute(stmt)
+        keys = tuple(result.keys())
+        for row in result:
+            yield serialization.dumps(dict(zip(keys, row))) + b"\n"
 
 
 @router.put("/inventory/transactions/{tx_id}", response_model=schemas.InventoryTxOut)
@@ -295,47 +442,36 @@ def update_transaction(tx_id: int, payload: schemas.InventoryTxUpdate, db: Sessi
     tx = db.get(models.InventoryTx, tx_id)
     if not tx:
         raise HTTPException(status_code=404, detail="Transaction not found")
-    update_data = payload.model_dump(exclude_unset=True)
-    lot_id = update_data.get("lot_id", tx.lot_id)
+    changes = payload.model_dump(exclude_unset=True, exclude={"reason"})
     try:
-        lot = services.assert_lot_active(db, lot_id)
+        replacement = services.correct_transaction(db, tx, changes, reason=payload.reason)
     except ValueError as exc:
-        raise _handle_value_error(exc) from exc
-    if lot.product_id != tx.product_id:
-        raise HTTPException(status_code=400, detail="Lot does not match product")
-
-    before = {
-        "lot_id": tx.lot_id,
-        "qty": tx.qty,
-        "ref_doc": tx.ref_doc,
-        "note": tx.note,
-    }
-
-    with db.begin():
-        for key, value in update_data.items():
-            if key == "reason":
-                continue
-            setattr(tx, key, value)
-        db.flush()
-        affected_lots = {before["lot_id"], tx.lot_id}
-        for affected_lot in affected_lots:
-            services.recalc_balance_for_lot(db, tx.product_id, affected_lot)
-        after = {
-            "lot_id": tx.lot_id,
-            "qty": tx.qty,
-            "ref_doc": tx.ref_doc,
-            "note": tx.note,
-        }
-        services.create_audit_log(
-            db,
-            entity_type="inventory_tx",
-            entity_id=str(tx.tx_id),
-            action="UPDATE",
-            changed_fields={"before": before, "after": after},
-            reason=payload.reason,
-        )
-    db.refresh(tx)
-    return tx
+        db.rollback()
+        raise _correction_error(exc) from exc
+    result = schemas.InventoryTxOut.model_validate(replacement)
+    db.commit()
+    return result
+
+
+@router.post("/inventory/transactions/{tx_id}/reverse", response_model=schemas.InventoryTxOut, status_code=status.HTTP_201_CREATED)
+def reverse_transaction(tx_id: int, payload: schemas.InventoryTxReverse, db: Session = Depends(get_db)):
+    tx = db.get(models.InventoryTx, tx_id)
+    if not tx:
+        raise HTTPException(status_code=404, detail="Transaction not found")
+    try:
+        reversal = services.reverse_transaction(db, tx, reason=payload.reason)
+    except ValueError as exc:
+        db.rollback()
+        raise _correction_error(exc) from exc
+    result = schemas.InventoryTxOut.model_validate(reversal)
+    db.commit()
+    return result
+
+
+def _correction_error(exc: ValueError) -> HTTPException:
+    if isinstance(exc, services.TransactionVoidError):
+        return HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(exc))
+    return _handle_value_error(exc)
 
 
 @router.get("/inventory/balance", response_model=list[schemas.BalanceOut])
@@ -345,69 +481,195 @@ def list_balance(
     mfg_date_from: dt.date | None = None,
     mfg_date_to: dt.date | None = None,
     lot_no: str | None = None,
-    db: Session = Depends(get_db),
+    location_id: int | None = None,
+    by_location: bool = Query(default=False, description="One row per lot and location instead of per lot"),
+    as_of: dt.date | None = None,
+    db: Session = Depends(get_read_db),
 ):
-    last_tx_subq = (
-        select(models.InventoryTx.lot_id, func.max(models.InventoryTx.tx_datetime).label("last_tx"))
-        .group_by(models.InventoryTx.lot_id)
-        .subquery()
+    rows = services.list_balance(
+        db,
+        group_id=group_id,
+        product_code=product_code,
+        mfg_date_from=mfg_date_from,
+        mfg_date_to=mfg_date_to,
+        lot_no=lot_no,
+        location_id=location_id,
+        by_location=by_location,
+        as_of=as_of,
     )
+    return serialization.JSONRows(rows)
 
-    stmt = (
-        select(
-            models.ProductGroup.group_name,
-            models.Product.product_code,
-            models.Product.product_name,
-            models.Lot.mfg_date,
-            models.Lot.lot_no,
-            models.InventoryBalance.qty_on_hand,
-            last_tx_subq.c.last_tx,
-        )
-        .select_from(models.InventoryBalance)
-        .join(models.Product, models.InventoryBalance.product_id == models.Product.product_id)
-        .join(models.ProductGroup, models.Product.group_id == models.ProductGroup.group_id)
-        .join(models.Lot, models.InventoryBalance.lot_id == models.Lot.lot_id)
-        .outerjoin(last_tx_subq, last_tx_subq.c.lot_id == models.InventoryBalance.lot_id)
+
+@router.get("/export/balance")
+def export_balance(
+    request: Request,
+    group_id: int | None = None,
+    product_code: str | None = None,
+    mfg_date_from: dt.date | None = None,
+    mfg_date_to: dt.date | None = None,
+    lot_no: str | None = None,
+    location_id: int | None = None,
+    by_location: bool = False,
+    as_of: dt.date | None = None,
+    format: str = Query(default="csv", pattern="^(csv|xlsx)$"),
+):
+    session_factory = read_session_factory(request)
+
+    def rows() -> Iterator:
+        with session_factory() as session:
+            stmt = services.balance_stmt(
+                session,
+                group_id=group_id,
+                product_code=product_code,
+                mfg_date_from=mfg_date_from,
+                mfg_date_to=mfg_date_to,
+                lot_no=lot_no,
+                location_id=location_id,
+                by_location=by_location,
+                as_of=as_of,
+            )
+            yield from session.execute(stmt.execution_options(yield_per=export.EXPORT_BATCH_SIZE))
+
+    return _export_response("balance", BALANCE_EXPORT_COLUMNS, rows(), format)
+
+
+@router.get("/export/transactions")
+def export_transactions(
+    request: Request,
+    start_datetime: dt.datetime | None = None,
+    end_datetime: dt.datetime | None = None,
+    product_code: str | None = None,
+    lot_id: int | None = None,
+    location_id: int | None = None,
+    format: str = Query(default="csv", pattern="^(csv|xlsx)$"),
+):
+    session_factory = read_session_factory(request)
+    tx = models.InventoryTx
+
+    def rows() -> Iterator:
+        with session_factory() as session:
+            stmt = services.transactions_stmt(
+                session,
+                start_datetime=start_datetime,
+                end_datetime=end_datetime,
+                product_code=product_code,
+                lot_id=lot_id,
+                location_id=location_id,
+            )
+            stmt = (
+                stmt.with_only_columns(*(getattr(tx, column) for column in TX_EXPORT_COLUMNS))
+                .order_by(None)
+                .order_by(tx.tx_datetime, tx.tx_id)
+            )
+            yield from session.execute(stmt.execution_options(yield_per=export.EXPORT_BATCH_SIZE))
+
+    return _export_response("transactions", TX_EXPORT_COLUMNS, rows(), format)
+
+
+def _export_response(name: str, columns: tuple[str, ...], rows: Iterator, format: str) -> StreamingResponse:
+    # Rows are read inside the response body: the session opens on the first
+    # row and the header goes out before the query runs.
+    if format == "xlsx":
+        body, media_type = export.stream_xlsx(columns, rows, sheet_name=name), export.XLSX_MEDIA_TYPE
+    else:
+        body, media_type = export.stream_csv(columns, rows), export.CSV_MEDIA_TYPE
+    return StreamingResponse(
+        body,
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{name}.{format}"'},
     )
 
-    filters = []
-    if group_id:
-        filters.append(models.Product.group_id == group_id)
-    if product_code:
-        filters.append(models.Product.product_code.ilike(f"%{product_code}%"))
-    if mfg_date_from:
-        filters.append(models.Lot.mfg_date >= mfg_date_from)
-    if mfg_date_to:
-        filters.append(models.Lot.mfg_date <= mfg_date_to)
-    if lot_no:
-        filters.append(models.Lot.lot_no.ilike(f"%{lot_no}%"))
-    if filters:
-        stmt = stmt.where(and_(*filters))
-
-    rows = db.execute(stmt.order_by(models.Product.product_code)).all()
-    return [
-        schemas.BalanceOut(
-            product_group=row.group_name,
-            product_code=row.product_code,
-            product_name=row.product_name,
-            mfg_date=row.mfg_date,
-            lot_no=row.lot_no,
-            qty_on_hand=row.qty_on_hand,
-            last_tx_datetime=row.last_tx,
-        )
-        for row in rows
-    ]
+
+@router.get("/search", response_model=list[schemas.SearchHitOut])
+def search_master_data(
+    q: str = Query(..., min_length=1, max_length=100),
+    entity_type: str | None = Query(default=None, pattern="^(product|lot)$"),
+    limit: int = Query(default=20, ge=1, le=100),
+    db: Session = Depends(get_read_db),
+):
+    return search.search(db, q, entity_type, limit)
+
+
+@router.get("/dashboard/summary", response_model=schemas.DashboardSummaryOut)
+def dashboard_summary(db: Session = Depends(get_read_db)):
+    return services.get_dashboard_summary(db, dt.datetime.utcnow().date())
+
+
+@router.get("/master-data/cache-stats", response_model=schemas.CacheStatsOut)
+def master_data_cache_stats():
+    return master_cache.stats()
+
+
+@router.post("/imports", response_model=schemas.ImportJobOut, status_code=status.HTTP_202_ACCEPTED)
+def create_import(background_tasks: BackgroundTasks, file: UploadFile = File(...), db: Session = Depends(get_db)):
+    try:
+        job = importer.create_job(db, file.filename or "upload", file.file)
+    except ValueError as exc:
+        raise _handle_value_error(exc) from exc
+    db.commit()
+    db.refresh(job)
+    background_tasks.add_task(importer.run_job, job.job_id)
+    return job
+
+
+@router.get("/imports/{job_id}", response_model=schemas.ImportJobOut)
+def get_import(job_id: int, db: Session = Depends(get_db)):
+    job = db.get(models.ImportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job
+
+
+@router.post("/imports/{job_id}/resume", response_model=schemas.ImportJobOut, status_code=status.HTTP_202_ACCEPTED)
+def resume_import(job_id: int, background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    job = db.get(models.ImportJob, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    if job.status not in (models.ImportStatus.PENDING.value, models.ImportStatus.FAILED.value):
+        raise HTTPException(status_code=409, detail=f"Import job is {job.status}")
+    background_tasks.add_task(importer.run_job, job.job_id)
+    return job
 
 
 @router.get("/audit-logs", response_model=list[schemas.AuditLogOut])
 def list_audit_logs(
     entity_type: str | None = Query(default=None),
     entity_id: str | None = Query(default=None),
-    db: Session = Depends(get_db),
+    limit: int = Query(default=100, ge=1, le=1000),
+    cursor: str | None = Query(default=None, description="X-Next-Cursor from the previous page"),
+    db: Session = Depends(get_read_db),
+):
+    try:
+        stmt = services.audit_logs_stmt(entity_type=entity_type, entity_id=entity_id, cursor=cursor)
+    except ValueError as exc:
+        raise _handle_value_error(exc) from exc
+    rows, next_cursor = services.page_audit_logs(db, stmt, limit)
+    return serialization.JSONRows(rows, headers={"X-Next-Cursor": next_cursor} if next_cursor else None)
+
+
+@router.get("/audit-logs/archives", response_model=list[schemas.AuditArchiveOut])
+def list_audit_archives(db: Session = Depends(get_read_db)):
+    archive = models.AuditArchive
+    return db.execute(select(archive).order_by(archive.month, archive.part)).scalars().all()
+
+
+@router.get("/audit-logs/archive")
+def read_audit_archive(
+    month: str = Query(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$", description="Archived month, YYYY-MM"),
+    entity_type: str | None = Query(default=None),
+    entity_id: str | None = Query(default=None),
+    db: Session = Depends(get_read_db),
 ):
-    stmt = select(models.AuditLog)
-    if entity_type:
-        stmt = stmt.where(models.AuditLog.entity_type == entity_type)
-    if entity_id:
-        stmt = stmt.where(models.AuditLog.entity_id == entity_id)
-    return db.execute(stmt.order_by(models.AuditLog.created_at.desc())).scalars().all()
+    month_start = dt.date.fromisoformat(f"{month}-01")
+    archive = models.AuditArchive
+    paths = db.execute(select(archive.path).where(archive.month == month_start).order_by(archive.part)).scalars().all()
+    if not paths:
+        raise HTTPException(status_code=404, detail=f"No audit archive for {month}")
+    # Archived records are read straight from the compressed files; the
+    # database is only needed to find them.
+    return StreamingResponse(audit.read_archive(paths, entity_type, entity_id), media_type="application/x-ndjson")
+
+
+@router.get("/audit-logs/outbox", response_model=schemas.AuditOutboxStatsOut)
+def audit_outbox_stats(db: Session = Depends(get_db)):
+    return audit.outbox_stats(db)
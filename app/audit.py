@@ -0,0 +1,285 @@
+"""Deferred audit writes through a transactional outbox.
+
+With ``AUDIT_MODE=deferred`` postings write their audit records to
+``audit_outbox`` in the same transaction as the ledger change. Nothing is lost
+on a crash because the outbox row commits or rolls back with the posting. A
+background worker moves the rows into ``audit_log`` in batches. Each batch is
+copied and deleted in one transaction, so every record lands exactly once.
+
+The retention job moves whole months older than ``AUDIT_RETENTION_MONTHS`` out
+of ``audit_log`` into gzip'd JSON-lines files. These are recorded in
+``audit_archive`` and can still be read on demand. On PostgreSQL, ``audit_log``
+is partitioned by month, so an archived month is dropped as one partition.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import gzip
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+from typing import Iterator
+
+from sqlalchemy import delete, func, insert, select, text
+from sqlalchemy.orm import Session
+
+from app import db as db_module
+from app import models
+
+AUDIT_MODE = os.getenv("AUDIT_MODE", "sync")
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "500"))
+AUDIT_FLUSH_INTERVAL = float(os.getenv("AUDIT_FLUSH_INTERVAL", "1"))
+AUDIT_WORKER_ENABLED = os.getenv("AUDIT_WORKER_ENABLED", "true").lower() in ("1", "true", "yes")
+AUDIT_RETENTION_MONTHS = int(os.getenv("AUDIT_RETENTION_MONTHS", "12"))
+AUDIT_ARCHIVE_DIR = Path(os.getenv("AUDIT_ARCHIVE_DIR", "./audit_archive"))
+AUDIT_PARTITIONS_AHEAD = 3
+
+AUDIT_COLUMNS = ("entity_type", "entity_id", "action", "changed_fields", "reason", "actor", "created_at")
+
+logger = logging.getLogger(__name__)
+
+
+class ArchiveChangedError(RuntimeError):
+    """Rows arrived in a month while it was being archived; the run is rolled back."""
+
+
+def audit_table():
+    """Table that new audit records go to under the current mode."""
+    return models.AuditOutbox if AUDIT_MODE == "deferred" else models.AuditLog
+
+
+def drain_outbox(db: Session, batch_size: int = AUDIT_BATCH_SIZE) -> int:
+    """Move up to ``batch_size`` queued records into ``audit_log``; returns the number moved.
+
+    Rows are locked with SKIP LOCKED on PostgreSQL so several workers can drain
+    concurrently; SQLite serializes writers on its own.
+    """
+    outbox = models.AuditOutbox
+    ids = (
+        db.execute(
+            select(outbox.outbox_id).order_by(outbox.outbox_id).limit(batch_size).with_for_update(skip_locked=True)
+        )
+        .scalars()
+        .all()
+    )
+    if not ids:
+        db.rollback()
+        return 0
+    columns = [getattr(outbox, column) for column in AUDIT_COLUMNS]
+    db.execute(
+        insert(models.AuditLog).from_select(
+            list(AUDIT_COLUMNS),
+            select(*columns).where(outbox.outbox_id.in_(ids)).order_by(outbox.outbox_id),
+        )
+    )
+    db.execute(delete(outbox).where(outbox.outbox_id.in_(ids)))
+    db.commit()
+    return len(ids)
+
+
+def outbox_stats(db: Session, now: dt.datetime | None = None) -> dict:
+    outbox = models.AuditOutbox
+    pending, oldest = db.execute(select(func.count(), func.min(outbox.created_at)).select_from(outbox)).one()
+    now = now or dt.datetime.utcnow()
+    return {
+        "mode": AUDIT_MODE,
+        "pending": pending,
+        "oldest_created_at": oldest,
+        "lag_seconds": max((now - oldest).total_seconds(), 0.0) if oldest else 0.0,
+    }
+
+
+class OutboxWorker:
+    """Background thread that drains the outbox until stopped, then flushes what is left."""
+
+    def __init__(self, interval: float = AUDIT_FLUSH_INTERVAL, batch_size: int = AUDIT_BATCH_SIZE):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="audit-outbox", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def drain(self) -> int:
+        moved = 0
+        with db_module.SessionLocal() as db:
+            while batch := drain_outbox(db, self.batch_size):
+                moved += batch
+        return moved
+
+    def _run(self) -> None:
+        while True:
+            stopping = self._stop.is_set()
+            try:
+                self.drain()
+            except Exception:
+                logger.exception("Audit outbox drain failed; retrying")
+            if stopping:
+                return
+            self._stop.wait(self.interval)
+
+
+def add_months(month: dt.date, count: int) -> dt.date:
+    index = month.year * 12 + month.month - 1 + count
+    return dt.date(index // 12, index % 12 + 1, 1)
+
+
+def _month_bounds(month: dt.date) -> tuple[dt.datetime, dt.datetime]:
+    start = dt.datetime.combine(month, dt.time.min)
+    return start, dt.datetime.combine(add_months(month, 1), dt.time.min)
+
+
+def _partition_name(month: dt.date) -> str:
+    return f"audit_log_{month:%Y%m}"
+
+
+def _is_postgresql(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def ensure_partitions(db: Session, today: dt.date, months_ahead: int = AUDIT_PARTITIONS_AHEAD) -> list[str]:
+    """Create monthly ``audit_log`` partitions from this month on (PostgreSQL only).
+
+    A month that already has rows in the default partition is left there until
+    it is archived, because PostgreSQL refuses to attach an overlapping range.
+    """
+    if not _is_postgresql(db):
+        return []
+    created = []
+    month = today.replace(day=1)
+    for offset in range(months_ahead + 1):
+        current = add_months(month, offset)
+        name = _partition_name(current)
+        start, end = _month_bounds(current)
+        if db.scalar(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}):
+            continue
+        has_default_rows = db.scalar(
+            text("SELECT EXISTS (SELECT 1 FROM audit_log_default WHERE created_at >= :start AND created_at < :end)"),
+            {"start": start, "end": end},
+        )
+        if has_default_rows:
+            continue
+        db.execute(
+            text(f"CREATE TABLE {name} PARTITION OF audit_log FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')")
+        )
+        created.append(name)
+    db.commit()
+    return created
+
+
+def _archive_record(log: models.AuditLog) -> str:
+    return json.dumps(
+        {
+            "audit_id": log.audit_id,
+            "entity_type": log.entity_type,
+            "entity_id": log.entity_id,
+            "action": log.action,
+            "changed_fields": log.changed_fields,
+            "reason": log.reason,
+            "actor": log.actor,
+            "created_at": log.created_at.isoformat(),
+        },
+        ensure_ascii=False,
+        default=str,
+    )
+
+
+def archive_month(db: Session, month: dt.date, archive_dir: Path | None = None) -> models.AuditArchive | None:
+    """Move one month of ``audit_log`` into a compressed file; ``None`` if the month is empty.
+
+    The file is fsync'd and renamed into place before the rows are deleted in
+    the same transaction that records it, so a crash can leave at most an
+    unreferenced file that the next run overwrites.
+
+    A month partition is locked before it is read, so a late outbox drain into
+    it waits and lands in the default partition once it is dropped. Without a
+    partition the delete must match the exported rows exactly, otherwise
+    ``ArchiveChangedError`` is raised and nothing is removed.
+    """
+    archive_dir = archive_dir or AUDIT_ARCHIVE_DIR
+    archive_dir.mkdir(parents=True, exist_ok=True)
+    log = models.AuditLog
+    start, end = _month_bounds(month)
+    in_month = (log.created_at >= start) & (log.created_at < end)
+    part = db.scalar(select(func.count()).select_from(models.AuditArchive).where(models.AuditArchive.month == month)) + 1
+    path = archive_dir / f"{_partition_name(month)}_{part:03d}.jsonl.gz"
+    partial = path.with_name(path.name + ".partial")
+    partition = _partition_name(month)
+    drop_partition = _is_postgresql(db) and db.scalar(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": partition}
+    )
+    if drop_partition:
+        # Taken up front: DROP TABLE needs this lock anyway, and upgrading to it later could deadlock.
+        db.execute(text(f"LOCK TABLE {partition} IN ACCESS EXCLUSIVE MODE"))
+
+    row_count = 0
+    max_id = None
+    with gzip.open(partial, "wt", encoding="utf-8") as handle:
+        rows = db.execute(select(log).where(in_month).order_by(log.audit_id).execution_options(yield_per=1000)).scalars()
+        for row in rows:
+            handle.write(_archive_record(row) + "\n")
+            row_count += 1
+            max_id = row.audit_id
+    if not row_count:
+        partial.unlink()
+        db.rollback()
+        return None
+    with partial.open("rb") as handle:
+        os.fsync(handle.fileno())
+    partial.replace(path)
+
+    if drop_partition:
+        db.execute(text(f"DROP TABLE {partition}"))
+    else:
+        # Ids are not assigned in commit order, so a late row can fall below max_id.
+        deleted = db.execute(delete(log).where(in_month).where(log.audit_id <= max_id)).rowcount
+        if deleted != row_count:
+            db.rollback()
+            path.unlink()
+            raise ArchiveChangedError(f"{month:%Y-%m}: exported {row_count} audit rows but {deleted} matched; retry")
+    archive = models.AuditArchive(month=month, part=part, path=str(path), row_count=row_count)
+    db.add(archive)
+    db.commit()
+    return archive
+
+
+def run_retention(
+    db: Session,
+    today: dt.date,
+    keep_months: int = AUDIT_RETENTION_MONTHS,
+    archive_dir: Path | None = None,
+) -> list[models.AuditArchive]:
+    """Archive every month older than the last ``keep_months`` full months plus the current one."""
+    cutoff = add_months(today.replace(day=1), -keep_months)
+    log = models.AuditLog
+    oldest = db.scalar(select(func.min(log.created_at)).where(log.created_at < dt.datetime.combine(cutoff, dt.time.min)))
+    archives = []
+    if oldest is not None:
+        month = oldest.date().replace(day=1)
+        while month < cutoff:
+            archive = archive_month(db, month, archive_dir)
+            if archive:
+                archives.append(archive)
+            month = add_months(month, 1)
+    return archives
+
+
+def read_archive(paths: list[str], entity_type: str | None = None, entity_id: str | None = None) -> Iterator[str]:
+    """Yield archived records (JSON lines) matching the filters, one file at a time."""
+    for path in paths:
+        with gzip.open(path, "rt", encoding="utf-8") as handle:
+            for line in handle:
+                if entity_type or entity_id:
+                    record = json.loads(line)
+                    if entity_type and record["entity_type"] != entity_type:
+                        continue
+                    if entity_id and record["entity_id"] != entity_id:
+                        continue
+                yield line
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app import models
+
+MASTER_CACHE_SIZE = int(os.getenv("MASTER_CACHE_SIZE", "10000"))
+MASTER_CACHE_TTL = float(os.getenv("MASTER_CACHE_TTL", "300"))
+MASTER_CACHE_VERSION_CHECK = float(os.getenv("MASTER_CACHE_VERSION_CHECK", "1"))
+
+MASTER_DATA_VERSION_KEY = "master"
+
+
+class GroupRef(NamedTuple):
+    group_id: int
+    is_active: bool
+
+
+class ProductRef(NamedTuple):
+    product_id: int
+    group_id: int
+    is_active: bool
+
+
+class LotRef(NamedTuple):
+    lot_id: int
+    product_id: int
+    is_active: bool
+
+
+class LocationRef(NamedTuple):
+    location_id: int
+    is_active: bool
+
+
+_SNAPSHOTS = {
+    models.ProductGroup: lambda group: GroupRef(group.group_id, group.is_active),
+    models.Product: lambda product: ProductRef(product.product_id, product.group_id, product.is_active),
+    models.Lot: lambda lot: LotRef(lot.lot_id, lot.product_id, lot.is_active),
+    models.Location: lambda location: LocationRef(location.location_id, location.is_active),
+}
+
+
+class MasterDataCache:
+    """Bounded TTL/LRU cache of immutable master-data snapshots keyed by id.
+
+    Entries are dropped when the shared ``master_data_version`` row changes, which
+    every worker polls at most once per ``version_check_interval`` seconds.
+    """
+
+    def __init__(self, maxsize: int, ttl: float, version_check_interval: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.version_check_interval = version_check_interval
+        self._entries: OrderedDict[tuple[str, int], tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._version: int | None = None
+        self._version_checked_at = float("-inf")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, db: Session, model: type[models.Base], key: int) -> Any | None:
+        self._sync_version(db)
+        cache_key = (model.__tablename__, key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        obj = db.get(model, key)
+        if obj is None:
+            return None
+        value = _SNAPSHOTS[model](obj)
+        with self._lock:
+            self._entries[cache_key] = (now + self.ttl, value)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return value
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"size": len(self._entries), "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+    def _sync_version(self, db: Session) -> None:
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        version = db.execute(
+            select(models.MasterDataVersion.version).where(models.MasterDataVersion.name == MASTER_DATA_VERSION_KEY)
+        ).scalar_one_or_none()
+        with self._lock:
+            if version != self._version:
+                self._entries.clear()
+                self._version = version
+            self._version_checked_at = now
+
+
+master_cache = MasterDataCache(MASTER_CACHE_SIZE, MASTER_CACHE_TTL, MASTER_CACHE_VERSION_CHECK)
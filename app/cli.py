@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import sys
+import time
+from pathlib import Path
+
+from sqlalchemy import func, select
+
+from app import audit, idempotency, importer, models, services
+from app.db import SessionLocal
+
+
+def rebuild_balances(args: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        first, last = db.execute(select(func.min(models.Product.product_id), func.max(models.Product.product_id))).one()
+        if first is None:
+            print("No products found")
+            return 0
+        first = max(first, args.product_from) if args.product_from is not None else first
+        last = min(last, args.product_to) if args.product_to is not None else last
+
+        drift_count = 0
+        chunk_start = first
+        while chunk_start <= last:
+            chunk_end = min(chunk_start + args.chunk_size - 1, last)
+            drift = services.rebuild_balances(db, chunk_start, chunk_end)
+            for item in drift:
+                print(
+                    f"drift product_id={item['product_id']} lot_id={item['lot_id']} location_id={item['location_id']} "
+                    f"stored={item['stored_qty']} ledger={item['ledger_qty']}"
+                )
+            if args.dry_run:
+                db.rollback()
+            else:
+                db.commit()
+            drift_count += len(drift)
+            chunk_start = chunk_end + 1
+    action = "found" if args.dry_run else "fixed"
+    print(f"{drift_count} drifted balance rows {action}")
+    return 0
+
+
+def _default_snapshot_date(period: str, today: dt.date) -> dt.date:
+    if period == "month":
+        return today.replace(day=1) - dt.timedelta(days=1)
+    return today - dt.timedelta(days=1)
+
+
+def snapshot_balances(args: argparse.Namespace) -> int:
+    snapshot_date = args.date or _default_snapshot_date(args.period, dt.datetime.utcnow().date())
+    with SessionLocal() as db:
+        try:
+            written = services.take_balance_snapshot(db, snapshot_date)
+        except ValueError as exc:
+            print(exc, file=sys.stderr)
+            return 1
+        db.commit()
+    print(f"{written} lots written to balance_snapshot for {snapshot_date.isoformat()}")
+    return 0
+
+
+def run_import(args: argparse.Namespace) -> int:
+    status = importer.run_job(args.job_id, force=args.force)
+    if status is None:
+        print(f"Import job {args.job_id} not found, finished or already running", file=sys.stderr)
+        return 1
+    print(f"Import job {args.job_id}: {status.value}")
+    return 0 if status is models.ImportStatus.DONE else 1
+
+
+def audit_worker(args: argparse.Namespace) -> int:
+    worker = audit.OutboxWorker(interval=args.interval)
+    if args.once:
+        print(f"{worker.drain()} audit records moved")
+        return 0
+    worker.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        worker.stop()
+    return 0
+
+
+def audit_retention(args: argparse.Namespace) -> int:
+    today = dt.datetime.utcnow().date()
+    with SessionLocal() as db:
+        for name in audit.ensure_partitions(db, today):
+            print(f"created partition {name}")
+        try:
+            archives = audit.run_retention(db, today, keep_months=args.keep_months, archive_dir=args.archive_dir)
+        except audit.ArchiveChangedError as exc:
+            print(exc, file=sys.stderr)
+            return 1
+        for archive in archives:
+            print(f"archived {archive.month:%Y-%m}: {archive.row_count} records -> {archive.path}")
+    print(f"{len(archives)} months archived")
+    return 0
+
+
+def purge_idempotency_keys(args: argparse.Namespace) -> int:
+    with SessionLocal() as db:
+        deleted = idempotency.purge_expired(db, dt.datetime.utcnow(), ttl_hours=args.ttl_hours)
+    print(f"{deleted} expired idempotency keys deleted")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rebuild = commands.add_parser("rebuild-balances", help="Recompute inventory_balance from the ledger")
+    rebuild.add_argument("--chunk-size", type=int, default=500, help="Products per transaction")
+    rebuild.add_argument("--product-from", type=int)
+    rebuild.add_argument("--product-to", type=int)
+    rebuild.add_argument("--dry-run", action="store_true", help="Report drift without writing")
+    rebuild.set_defaults(handler=rebuild_balances)
+
+    snapshot = commands.add_parser("snapshot-balances", help="Store end-of-day stock per lot for as-of queries")
+    snapshot.add_argument("--date", type=dt.date.fromisoformat, help="Day to snapshot (default: last completed period)")
+    snapshot.add_argument("--period", choices=("day", "month"), default="day", help="Default to yesterday or last month end")
+    snapshot.set_defaults(handler=snapshot_balances)
+
+    run = commands.add_parser("run-import", help="Run or resume an import job from its last checkpoint")
+    run.add_argument("job_id", type=int)
+    run.add_argument("--force", action="store_true", help="Take over a job left RUNNING by a crashed worker")
+    run.set_defaults(handler=run_import)
+
+    worker = commands.add_parser("audit-worker", help="Move deferred audit records from audit_outbox into audit_log")
+    worker.add_argument("--interval", type=float, default=audit.AUDIT_FLUSH_INTERVAL, help="Seconds between drains")
+    worker.add_argument("--once", action="store_true", help="Drain the outbox once and exit")
+    worker.set_defaults(handler=audit_worker)
+
+    retention = commands.add_parser("audit-retention", help="Archive old audit_log months to compressed files")
+    retention.add_argument("--keep-months", type=int, default=audit.AUDIT_RETENTION_MONTHS, help="Full months kept in audit_log")
+    retention.add_argument("--archive-dir", type=Path, default=audit.AUDIT_ARCHIVE_DIR)
+    retention.set_defaults(handler=audit_retention)
+
+    purge = commands.add_parser("purge-idempotency-keys", help="Delete Idempotency-Key records past their TTL")
+    purge.add_argument("--ttl-hours", type=float, default=idempotency.IDEMPOTENCY_KEY_TTL_HOURS)
+    purge.set_defaults(handler=purge_idempotency_keys)
+    return parser
+
+
+def main(argv: list[str] | None = None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
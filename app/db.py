@@ -1,28 +1,216 @@
 from __future__ import annotations
 
+import math
 import os
-from typing import Generator
+import time
+from http.cookies import SimpleCookie
+from typing import AsyncGenerator, Generator
 
-from sqlalchemy import create_engine
+from fastapi import Request
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.orm import DeclarativeBase, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from starlette.datastructures import MutableHeaders
+
+from app import metrics, profiling
 
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
 
-connect_args = {}
-if DATABASE_URL.startswith("sqlite"):
-    connect_args = {"check_same_thread": False}
 
-engine = create_engine(DATABASE_URL, connect_args=connect_args, future=True)
+def _async_url(url: str) -> str:
+    scheme, _, rest = url.partition("://")
+    backend = scheme.split("+")[0]
+    if backend == "sqlite":
+        return f"sqlite+aiosqlite://{rest}"
+    if backend in ("postgresql", "postgres"):
+        return f"postgresql+asyncpg://{rest}"
+    return url
+
+
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", _async_url(DATABASE_URL))
+
+# Optional replica for list/report reads. Without it every read goes to the primary.
+DATABASE_READ_URL = os.getenv("DATABASE_READ_URL") or None
+ASYNC_DATABASE_READ_URL = os.getenv("ASYNC_DATABASE_READ_URL") or (
+    _async_url(DATABASE_READ_URL) if DATABASE_READ_URL else None
+)
+# Read-your-writes: after a write, the client reads from the primary for this long.
+READ_PIN_SECONDS = float(os.getenv("READ_PIN_SECONDS", "5"))
+PRIMARY_PIN_COOKIE = "db_primary_until"
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+SQLITE_CACHE_SIZE = int(os.getenv("SQLITE_CACHE_SIZE", "-65536"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", "268435456"))
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _engine_options(url: str, **options) -> dict:
+    if _is_sqlite(url) and (":memory:" in url or url.rstrip("/").endswith(":")):
+        # In-memory SQLite uses a single shared connection; pool sizing does not apply.
+        return {}
+    return {
+        **options,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+
+
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.execute(f"PRAGMA cache_size={SQLITE_CACHE_SIZE}")
+    cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+    cursor.close()
+
+
+def _connect_args(url: str) -> dict:
+    return {"check_same_thread": False} if _is_sqlite(url) else {}
+
+
+def _create_engine(url: str):
+    new_engine = create_engine(url, connect_args=_connect_args(url), future=True, **_engine_options(url))
+    if _is_sqlite(url):
+        event.listen(new_engine, "connect", _set_sqlite_pragmas)
+    metrics.instrument_engine(new_engine)
+    profiling.instrument_engine(new_engine)
+    return new_engine
+
+
+def _create_async_engine(url: str):
+    # aiosqlite defaults to NullPool for files; pool it like every other backend.
+    new_engine = create_async_engine(url, **_engine_options(url, poolclass=AsyncAdaptedQueuePool))
+    if _is_sqlite(url):
+        event.listen(new_engine.sync_engine, "connect", _set_sqlite_pragmas)
+    metrics.instrument_engine(new_engine.sync_engine)
+    profiling.instrument_engine(new_engine.sync_engine)
+    return new_engine
+
+
+engine = _create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(bind=engine, autocommit=False, autoflush=False, future=True)
 
+async_engine = _create_async_engine(ASYNC_DATABASE_URL)
+AsyncSessionLocal = async_sessionmaker(bind=async_engine, autoflush=False, expire_on_commit=False)
+
+if DATABASE_READ_URL:
+    read_engine = _create_engine(DATABASE_READ_URL)
+    ReadSessionLocal = sessionmaker(bind=read_engine, autocommit=False, autoflush=False, future=True)
+    async_read_engine = _create_async_engine(ASYNC_DATABASE_READ_URL)
+    AsyncReadSessionLocal = async_sessionmaker(bind=async_read_engine, autoflush=False, expire_on_commit=False)
+else:
+    read_engine, ReadSessionLocal = engine, SessionLocal
+    async_read_engine, AsyncReadSessionLocal = async_engine, AsyncSessionLocal
+
 
 class Base(DeclarativeBase):
     pass
 
 
+def pinned_to_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_PIN_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def primary_pin_cookie() -> str:
+    """``Set-Cookie`` value that sends this client's reads to the primary for ``READ_PIN_SECONDS``."""
+    cookie = SimpleCookie()
+    cookie[PRIMARY_PIN_COOKIE] = f"{time.time() + READ_PIN_SECONDS:.3f}"
+    morsel = cookie[PRIMARY_PIN_COOKIE]
+    morsel["max-age"] = math.ceil(READ_PIN_SECONDS)
+    morsel["path"] = "/"
+    morsel["httponly"] = True
+    morsel["samesite"] = "lax"
+    return morsel.OutputString()
+
+
+class PrimaryPinMiddleware:
+    """Pure ASGI middleware pinning a client to the primary after a successful write.
+
+    ``app.main`` installs it only when a read replica is configured.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http" or scope["method"] not in WRITE_METHODS or READ_PIN_SECONDS <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_pin(message) -> None:
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                MutableHeaders(scope=message).append("set-cookie", primary_pin_cookie())
+            await send(message)
+
+        await self.app(scope, receive, send_with_pin)
+
+
+def read_session_factory(request: Request) -> sessionmaker:
+    return SessionLocal if pinned_to_primary(request) else ReadSessionLocal
+
+
+def async_read_session_factory(request: Request) -> async_sessionmaker:
+    return AsyncSessionLocal if pinned_to_primary(request) else AsyncReadSessionLocal
+
+
+def _checkout(db) -> None:
+    # Check the connection out up front so the pool wait is measured on its own.
+    start = time.perf_counter()
+    db.connection()
+    metrics.POOL_WAIT.observe(time.perf_counter() - start)
+
+
+async def _async_checkout(db) -> None:
+    start = time.perf_counter()
+    await db.connection()
+    metrics.POOL_WAIT.observe(time.perf_counter() - start)
+
+
 def get_db() -> Generator:
     db = SessionLocal()
     try:
+        _checkout(db)
+        yield db
+    finally:
+        db.close()
+
+
+def get_read_db(request: Request) -> Generator:
+    db = read_session_factory(request)()
+    try:
+        _checkout(db)
         yield db
     finally:
         db.close()
+
+
+async def get_async_db() -> AsyncGenerator:
+    async with AsyncSessionLocal() as db:
+        await _async_checkout(db)
+        yield db
+
+
+async def get_async_read_db(request: Request) -> AsyncGenerator:
+    async with async_read_session_factory(request)() as db:
+        await _async_checkout(db)
+        yield db
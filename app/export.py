@@ -0,0 +1,201 @@
+"""Constant-memory CSV and XLSX writers for streamed exports.
+
+Both writers take an iterable of row tuples (typically a ``yield_per`` result)
+and yield encoded chunks as soon as a batch is ready, so memory stays flat no
+matter how many rows are exported. An Excel sheet holds at most
+``XLSX_MAX_ROWS`` rows, so longer XLSX exports continue on further sheets.
+"""
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import io
+import itertools
+import re
+import zipfile
+from typing import Iterable, Iterator, Sequence
+from xml.sax.saxutils import escape
+
+EXPORT_BATCH_SIZE = 1000
+XLSX_MAX_ROWS = 1_048_576  # Excel's row limit per sheet, header row included
+_SHEET_NAME_MAX = 31
+
+CSV_MEDIA_TYPE = "text/csv; charset=utf-8"
+XLSX_MEDIA_TYPE = "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+
+_EXCEL_EPOCH = dt.datetime(1899, 12, 30)
+_XML_ILLEGAL = re.compile(r"[\x00-\x08\x0b\x0c\x0e-\x1f]")
+
+
+def _batches(rows: Iterable[Sequence], size: int) -> Iterator[list[Sequence]]:
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def stream_csv(header: Sequence[str], rows: Iterable[Sequence], batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    # The BOM lets Excel detect UTF-8 (Korean product names).
+    buffer.write("\ufeff")
+    writer.writerow(header)
+    yield buffer.getvalue().encode("utf-8")
+    for batch in _batches(rows, batch_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode("utf-8")
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only, non-seekable sink; zipfile then emits data descriptors."""
+
+    def __init__(self) -> None:
+        self.chunks: list[bytes] = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self.chunks)
+        self.chunks.clear()
+        return data
+
+
+_CONTENT_TYPES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">
+<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>
+<Default Extension="xml" ContentType="application/xml"/>
+<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>
+{sheets}
+<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>
+</Types>"""
+_CONTENT_TYPE_SHEET = (
+    '<Override PartName="/xl/worksheets/sheet{n}.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+)
+
+_ROOT_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>
+</Relationships>"""
+
+_WORKBOOK = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">
+<sheets>{sheets}</sheets>
+</workbook>"""
+_WORKBOOK_SHEET = '<sheet name="{name}" sheetId="{n}" r:id="rId{n}"/>'
+
+_WORKBOOK_RELS = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">
+{sheets}
+<Relationship Id="rId{styles}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>
+</Relationships>"""
+_WORKBOOK_RELS_SHEET = (
+    '<Relationship Id="rId{n}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet{n}.xml"/>'
+)
+
+# Cell styles: 0 = general, 1 = date, 2 = date + time.
+_STYLES = """<?xml version="1.0" encoding="UTF-8" standalone="yes"?>
+<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">
+<numFmts count="1"><numFmt numFmtId="164" formatCode="yyyy-mm-dd hh:mm:ss"/></numFmts>
+<fonts count="1"><font><sz val="11"/><name val="Calibri"/></font></fonts>
+<fills count="2"><fill><patternFill patternType="none"/></fill><fill><patternFill patternType="gray125"/></fill></fills>
+<borders count="1"><border><left/><right/><top/><bottom/><diagonal/></border></borders>
+<cellStyleXfs count="1"><xf numFmtId="0" fontId="0" fillId="0" borderId="0"/></cellStyleXfs>
+<cellXfs count="3">
+<xf numFmtId="0" fontId="0" fillId="0" borderId="0" xfId="0"/>
+<xf numFmtId="14" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+<xf numFmtId="164" fontId="0" fillId="0" borderId="0" xfId="0" applyNumberFormat="1"/>
+</cellXfs>
+</styleSheet>"""
+
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>\n'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = "</sheetData></worksheet>"
+
+
+def _xlsx_cell(value) -> str:
+    if value is None:
+        return "<c/>"
+    if isinstance(value, bool):
+        return f'<c t="b"><v>{int(value)}</v></c>'
+    if isinstance(value, (int, float)):
+        return f"<c><v>{value}</v></c>"
+    if isinstance(value, dt.datetime):
+        serial = (value.replace(tzinfo=None) - _EXCEL_EPOCH).total_seconds() / 86400
+        return f'<c s="2"><v>{serial:.10f}</v></c>'
+    if isinstance(value, dt.date):
+        return f'<c s="1"><v>{(value - _EXCEL_EPOCH.date()).days}</v></c>'
+    text = escape(_XML_ILLEGAL.sub("", str(value)))
+    return f'<c t="inlineStr"><is><t xml:space="preserve">{text}</t></is></c>'
+
+
+def _xlsx_row(values: Sequence) -> str:
+    return "<row>" + "".join(_xlsx_cell(value) for value in values) + "</row>"
+
+
+def _sheet_name(base: str, n: int) -> str:
+    suffix = f" ({n})" if n > 1 else ""
+    return escape(base[: _SHEET_NAME_MAX - len(suffix)] + suffix, {'"': "&quot;"})
+
+
+def stream_xlsx(
+    header: Sequence[str],
+    rows: Iterable[Sequence],
+    sheet_name: str = "Sheet1",
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> Iterator[bytes]:
+    """Yield a workbook using inline strings (no shared-string table).
+
+    Every ``XLSX_MAX_ROWS - 1`` data rows start a new sheet with the header
+    repeated. The sheet count is only known at the end, so the workbook parts
+    that list the sheets are written after them.
+    """
+    rows = iter(rows)
+    sink = _ChunkSink()
+    sheet_count = 0
+    with zipfile.ZipFile(sink, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr("_rels/.rels", _ROOT_RELS)
+        archive.writestr("xl/styles.xml", _STYLES)
+        while True:
+            sheet_count += 1
+            with archive.open(f"xl/worksheets/sheet{sheet_count}.xml", "w", force_zip64=True) as sheet:
+                sheet.write((_SHEET_HEAD + _xlsx_row(header)).encode("utf-8"))
+                for batch in _batches(itertools.islice(rows, XLSX_MAX_ROWS - 1), batch_size):
+                    sheet.write("".join(_xlsx_row(row) for row in batch).encode("utf-8"))
+                    chunk = sink.drain()
+                    if chunk:
+                        yield chunk
+                sheet.write(_SHEET_TAIL.encode("utf-8"))
+            following = next(rows, None)
+            if following is None:
+                break
+            rows = itertools.chain((following,), rows)
+        numbers = range(1, sheet_count + 1)
+        archive.writestr(
+            "[Content_Types].xml", _CONTENT_TYPES.format(sheets="\n".join(_CONTENT_TYPE_SHEET.format(n=n) for n in numbers))
+        )
+        archive.writestr(
+            "xl/workbook.xml",
+            _WORKBOOK.format(sheets="".join(_WORKBOOK_SHEET.format(name=_sheet_name(sheet_name, n), n=n) for n in numbers)),
+        )
+        archive.writestr(
+            "xl/_rels/workbook.xml.rels",
+            _WORKBOOK_RELS.format(
+                sheets="\n".join(_WORKBOOK_RELS_SHEET.format(n=n) for n in numbers), styles=sheet_count + 1
+            ),
+        )
+    yield sink.drain()
@@ -0,0 +1,87 @@
+"""Idempotency keys for posting endpoints (``Idempotency-Key`` header).
+
+Scanners retry a posting when the response times out. ``claim`` inserts the
+key as the first write of the posting's transaction with ON CONFLICT DO
+NOTHING. A concurrent duplicate blocks on that key until the first request
+commits or rolls back, so at most one of them reaches the ledger. The first
+request saves its response with ``store`` before it commits, and a retry gets
+that response back without posting again. If the first request failed, its
+key was rolled back with it and the retry runs normally.
+
+Reusing a key for a different endpoint or payload is rejected. Keys older than
+``IDEMPOTENCY_KEY_TTL_HOURS`` are deleted by ``python -m app.cli
+purge-idempotency-keys``.
+"""
+from __future__ import annotations
+
+import datetime as dt
+import hashlib
+import os
+
+from pydantic import BaseModel
+from sqlalchemy import delete, select, update
+from sqlalchemy.orm import Session
+
+from app import models, services
+
+IDEMPOTENCY_KEY_TTL_HOURS = float(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", "24"))
+PURGE_BATCH_SIZE = 1000
+
+
+class IdempotencyKeyReusedError(ValueError):
+    def __init__(self):
+        super().__init__("Idempotency-Key was already used for a different request")
+
+
+def request_hash(payload: BaseModel) -> str:
+    """Digest of the validated payload, so formatting and omitted defaults do not matter."""
+    return hashlib.sha256(payload.model_dump_json().encode("utf-8")).hexdigest()
+
+
+def claim(db: Session, key: str, endpoint: str, payload: BaseModel) -> models.IdempotencyKey | None:
+    """Reserve ``key`` for this request, or return the record of the request that already used it."""
+    record = models.IdempotencyKey
+    digest = request_hash(payload)
+    stmt = services.dialect_insert(db)(record).values(
+        idempotency_key=key, endpoint=endpoint, request_hash=digest, created_at=dt.datetime.utcnow()
+    )
+    claimed = db.execute(
+        stmt.on_conflict_do_nothing(index_elements=[record.idempotency_key]).returning(record.idempotency_key)
+    ).first()
+    if claimed:
+        return None
+    existing = db.execute(select(record).where(record.idempotency_key == key)).scalar_one()
+    if existing.endpoint != endpoint or existing.request_hash != digest:
+        raise IdempotencyKeyReusedError()
+    return existing
+
+
+def store(db: Session, key: str, status_code: int, body) -> None:
+    """Save the response for replay; call it in the same transaction as ``claim``."""
+    record = models.IdempotencyKey
+    db.execute(
+        update(record).where(record.idempotency_key == key).values(status_code=status_code, response_body=body)
+    )
+
+
+def purge_expired(
+    db: Session,
+    now: dt.datetime,
+    ttl_hours: float = IDEMPOTENCY_KEY_TTL_HOURS,
+    batch_size: int = PURGE_BATCH_SIZE,
+) -> int:
+    """Delete keys older than ``ttl_hours`` in committed batches; returns the number deleted."""
+    record = models.IdempotencyKey
+    cutoff = now - dt.timedelta(hours=ttl_hours)
+    deleted = 0
+    while True:
+        keys = (
+            db.execute(select(record.idempotency_key).where(record.created_at < cutoff).limit(batch_size))
+            .scalars()
+            .all()
+        )
+        if not keys:
+            return deleted
+        db.execute(delete(record).where(record.idempotency_key.in_(keys)))
+        db.commit()
+        deleted += len(keys)
@@ -0,0 +1,481 @@
+"""Bulk CSV/XLSX import of master data and opening stock.
+
+One flat sheet describes everything. Each row names a product group and can go
+further down the hierarchy:
+
+    group_name, product_code, product_name, spec, mfg_date, lot_no, opening_qty
+
+Rows are processed in chunks. Natural keys are resolved with one query per
+level, new rows are inserted with ``executemany`` and existing ones are left in
+place or updated. The job row is checkpointed in the same transaction as each
+chunk, so an interrupted job resumes where it stopped. Re-running a file is a
+no-op, and opening stock is posted at most once per lot. A product or lot that
+another writer creates between the lookup and the insert is reported as a row
+error and skipped; the stats count only rows this import inserted.
+"""
+from __future__ import annotations
+
+import csv
+import datetime as dt
+import itertools
+import os
+import re
+import shutil
+import zipfile
+from collections import Counter
+from pathlib import Path
+from typing import BinaryIO, Iterable, Iterator, NamedTuple
+from xml.etree.ElementTree import iterparse
+
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.orm import Session
+
+from app import db as db_module
+from app import models, schemas, services
+
+IMPORT_DIR = Path(os.getenv("IMPORT_DIR", "./imports"))
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "1000"))
+MAX_STORED_ERRORS = 1000
+SUPPORTED_SUFFIXES = (".csv", ".xlsx")
+OPENING_REF_DOC = "OPENING"
+
+_XLSX_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_EXCEL_EPOCH = dt.date(1899, 12, 30)
+_CELL_COLUMN = re.compile(r"[A-Z]+")
+
+
+class ImportRow(NamedTuple):
+    row_no: int
+    group_name: str
+    product_code: str | None
+    product_name: str | None
+    spec: str | None
+    mfg_date: dt.date | None
+    lot_no: str | None
+    opening_qty: int
+
+
+def read_rows(path: Path) -> Iterator[tuple[int, dict]]:
+    """Yield ``(sheet row number, {column: value})`` for every data row."""
+    if path.suffix.lower() == ".xlsx":
+        return _read_xlsx(path)
+    return _read_csv(path)
+
+
+def _header(values: Iterable) -> list[str]:
+    header = [str(value or "").strip().lower() for value in values]
+    if "group_name" not in header:
+        raise ValueError("Missing column group_name")
+    return header
+
+
+def _read_csv(path: Path) -> Iterator[tuple[int, dict]]:
+    with path.open(newline="", encoding="utf-8-sig") as handle:
+        reader = csv.reader(handle)
+        header = _header(next(reader, []))
+        for row in reader:
+            if any(cell.strip() for cell in row):
+                yield reader.line_num, dict(zip(header, row))
+
+
+def _shared_strings(archive: zipfile.ZipFile) -> list[str]:
+    if "xl/sharedStrings.xml" not in archive.namelist():
+        return []
+    strings = []
+    with archive.open("xl/sharedStrings.xml") as handle:
+        for _, elem in iterparse(handle):
+            if elem.tag == f"{_XLSX_NS}si":
+                strings.append("".join(elem.itertext()))
+                elem.clear()
+    return strings
+
+
+def _column_index(ref: str) -> int:
+    index = 0
+    for char in _CELL_COLUMN.match(ref).group():
+        index = index * 26 + ord(char) - 64
+    return index - 1
+
+
+def _cell_value(cell, shared: list[str]):
+    kind = cell.get("t")
+    if kind == "inlineStr":
+        return "".join(cell.find(f"{_XLSX_NS}is").itertext())
+    value = cell.find(f"{_XLSX_NS}v")
+    if value is None or value.text is None:
+        return None
+    if kind == "s":
+        return shared[int(value.text)]
+    return value.text
+
+
+def _read_xlsx(path: Path) -> Iterator[tuple[int, dict]]:
+    with zipfile.ZipFile(path) as archive:
+        shared = _shared_strings(archive)
+        sheet_name = min(name for name in archive.namelist() if name.startswith("xl/worksheets/sheet"))
+        header = None
+        with archive.open(sheet_name) as sheet:
+            for _, elem in iterparse(sheet):
+                if elem.tag != f"{_XLSX_NS}row":
+                    continue
+                values = {}
+                for position, cell in enumerate(elem.iter(f"{_XLSX_NS}c")):
+                    ref = cell.get("r")
+                    values[_column_index(ref) if ref else position] = _cell_value(cell, shared)
+                row_no = int(elem.get("r", 0)) or None
+                elem.clear()
+                row = [values.get(index) for index in range(max(values, default=-1) + 1)]
+                if header is None:
+                    header = _header(row)
+                elif any(value not in (None, "") for value in row):
+                    yield row_no, dict(zip(header, row))
+
+
+def _text(raw: dict, column: str) -> str | None:
+    value = raw.get(column)
+    if value is None:
+        return None
+    value = str(value).strip()
+    return value or None
+
+
+def _parse_date(value: str) -> dt.date:
+    try:
+        return dt.date.fromisoformat(value[:10])
+    except ValueError:
+        pass
+    try:
+        # Excel stores dates as day serials when the cell is date-formatted.
+        return _EXCEL_EPOCH + dt.timedelta(days=int(float(value)))
+    except ValueError:
+        raise ValueError(f"Invalid mfg_date: {value}") from None
+
+
+def _parse_qty(value: str | None) -> int:
+    if value is None:
+        return 0
+    try:
+        qty = float(value)
+    except ValueError:
+        raise ValueError(f"Invalid opening_qty: {value}") from None
+    if qty < 0 or qty != int(qty):
+        raise ValueError(f"Invalid opening_qty: {value}")
+    return int(qty)
+
+
+def parse_row(row_no: int, raw: dict) -> ImportRow:
+    group_name = _text(raw, "group_name")
+    product_code = _text(raw, "product_code")
+    product_name = _text(raw, "product_name")
+    mfg_date = _text(raw, "mfg_date")
+    lot_no = _text(raw, "lot_no")
+    opening_qty = _parse_qty(_text(raw, "opening_qty"))
+    if not group_name:
+        raise ValueError("group_name is required")
+    if product_code and not product_name:
+        raise ValueError("product_name is required with product_code")
+    if (mfg_date or lot_no) and not (mfg_date and lot_no and product_code):
+        raise ValueError("A lot needs product_code, mfg_date and lot_no")
+    if opening_qty and not lot_no:
+        raise ValueError("opening_qty needs a lot")
+    return ImportRow(
+        row_no=row_no,
+        group_name=group_name,
+        product_code=product_code,
+        product_name=product_name,
+        spec=_text(raw, "spec"),
+        mfg_date=_parse_date(mfg_date) if mfg_date else None,
+        lot_no=lot_no,
+        opening_qty=opening_qty,
+    )
+
+
+def _add(stats: dict, key: str, count: int) -> None:
+    if count:
+        stats[key] = stats.get(key, 0) + count
+
+
+def _group_ids(db: Session, rows: list[ImportRow], stats: dict) -> dict[str, int]:
+    group = models.ProductGroup
+    names = {row.group_name for row in rows}
+    existing = dict(db.execute(select(group.group_name, group.group_id).where(group.group_name.in_(names))).all())
+    missing = sorted(names - existing.keys())
+    if missing:
+        created = dict(
+            db.execute(
+                services.dialect_insert(db)(group)
+                .on_conflict_do_nothing(index_elements=[group.group_name])
+                .returning(group.group_name, group.group_id),
+                [{"group_name": name, "is_active": True} for name in missing],
+            ).all()
+        )
+        existing.update(created)
+        # A group is only its name, so one created meanwhile by someone else is simply used.
+        if len(created) < len(missing):
+            existing.update(
+                db.execute(
+                    select(group.group_name, group.group_id).where(group.group_name.in_(set(missing) - created.keys()))
+                ).all()
+            )
+        _add(stats, "groups_created", len(created))
+    return existing
+
+
+def _product_ids(
+    db: Session, rows: list[ImportRow], group_ids: dict[str, int], stats: dict, errors: list[dict]
+) -> dict[str, int]:
+    product = models.Product
+    wanted: dict[str, ImportRow] = {}
+    for row in rows:
+        if not row.product_code:
+            continue
+        first = wanted.setdefault(row.product_code, row)
+        if first.group_name != row.group_name:
+            errors.append({"row": row.row_no, "message": f"Product {row.product_code} listed under two groups"})
+    existing = {
+        item.product_code: item
+        for item in db.execute(
+            select(product.product_id, product.product_code, product.group_id, product.product_name, product.spec).where(
+                product.product_code.in_(wanted)
+            )
+        )
+    }
+    ids: dict[str, int] = {}
+    changed = []
+    for code, row in wanted.items():
+        current = existing.get(code)
+        if current is None:
+            continue
+        if current.group_id != group_ids[row.group_name]:
+            errors.append({"row": row.row_no, "message": f"Product {code} belongs to another group"})
+            continue
+        ids[code] = current.product_id
+        if (current.product_name, current.spec) != (row.product_name, row.spec):
+            changed.append({"product_id": current.product_id, "product_name": row.product_name, "spec": row.spec})
+    if changed:
+        db.execute(update(product), changed)
+        _add(stats, "products_updated", len(changed))
+
+    missing = [row for code, row in wanted.items() if code not in existing]
+    if missing:
+        created = db.execute(
+            services.dialect_insert(db)(product)
+            .on_conflict_do_nothing(index_elements=[product.product_code])
+            .returning(product.product_code, product.product_id, product.group_id),
+            [
+                {
+                    "group_id": group_ids[row.group_name],
+                    "product_code": row.product_code,
+                    "product_name": row.product_name,
+                    "spec": row.spec,
+                    "is_active": True,
+                }
+                for row in missing
+            ],
+        ).all()
+        ids.update((item.product_code, item.product_id) for item in created)
+        services.apply_master_count_deltas(
+            db, {group_id: (count, 0) for group_id, count in Counter(item.group_id for item in created).items()}
+        )
+        _add(stats, "products_created", len(created))
+        # Created by someone else since the lookup: skip the rows rather than guess at the merge.
+        skipped = {row.product_code for row in missing} - ids.keys()
+        errors.extend(
+            {"row": row.row_no, "message": f"Product {row.product_code} already exists; row skipped"}
+            for row in rows
+            if row.product_code in skipped
+        )
+    return ids
+
+
+def _lot_ids(
+    db: Session, rows: list[ImportRow], product_ids: dict[str, int], stats: dict, errors: list[dict]
+) -> dict[tuple, int]:
+    lot = models.Lot
+    keys = {
+        (product_ids[row.product_code], row.mfg_date, row.lot_no)
+        for row in rows
+        if row.lot_no and row.product_code in product_ids
+    }
+    if not keys:
+        return {}
+    lot_key = tuple_(lot.product_id, lot.mfg_date, lot.lot_no)
+
+    def lookup(wanted) -> dict[tuple, int]:
+        stmt = select(lot.product_id, lot.mfg_date, lot.lot_no, lot.lot_id).where(lot_key.in_(list(wanted)))
+        return {(item.product_id, item.mfg_date, item.lot_no): item.lot_id for item in db.execute(stmt)}
+
+    ids = lookup(keys)
+    missing = sorted(keys - ids.keys())
+    if missing:
+        created = {
+            (item.product_id, item.mfg_date, item.lot_no): item.lot_id
+            for item in db.execute(
+                services.dialect_insert(db)(lot)
+                .on_conflict_do_nothing(index_elements=[lot.product_id, lot.mfg_date, lot.lot_no])
+                .returning(lot.product_id, lot.mfg_date, lot.lot_no, lot.lot_id),
+                [
+                    {"product_id": product_id, "mfg_date": mfg_date, "lot_no": lot_no, "is_active": True}
+                    for product_id, mfg_date, lot_no in missing
+                ],
+            )
+        }
+        ids.update(created)
+        per_product = Counter(product_id for product_id, _, _ in created)
+        group_of = dict(
+            db.execute(
+                select(models.Product.product_id, models.Product.group_id).where(models.Product.product_id.in_(per_product))
+            ).all()
+        )
+        deltas: Counter[int] = Counter()
+        for product_id, count in per_product.items():
+            deltas[group_of[product_id]] += count
+        services.apply_master_count_deltas(db, {group_id: (0, count) for group_id, count in deltas.items()})
+        _add(stats, "lots_created", len(created))
+        skipped = set(missing) - created.keys()
+        errors.extend(
+            {"row": row.row_no, "message": f"Lot {row.lot_no} of {row.product_code} already exists; row skipped"}
+            for row in rows
+            if row.lot_no
+            and row.product_code in product_ids
+            and (product_ids[row.product_code], row.mfg_date, row.lot_no) in skipped
+        )
+    return ids
+
+
+def _post_opening_stock(db: Session, lines: list[tuple[int, schemas.InventoryBatchLine]], stats: dict, errors: list[dict]) -> None:
+    lot_ids = {line.lot_id for _, line in lines}
+    already = set(
+        db.execute(
+            select(models.InventoryTx.lot_id)
+            .where(models.InventoryTx.lot_id.in_(lot_ids))
+            .where(models.InventoryTx.ref_doc == OPENING_REF_DOC)
+            .distinct()
+        ).scalars()
+    )
+    pending = []
+    for row_no, line in lines:
+        if line.lot_id in already:
+            _add(stats, "opening_skipped", 1)
+            continue
+        already.add(line.lot_id)
+        pending.append((row_no, line))
+    if not pending:
+        return
+    try:
+        services.post_inventory_batch(db, [line for _, line in pending])
+    except services.BatchValidationError as exc:
+        rejected = {error["line"] for error in exc.errors}
+        errors.extend({"row": pending[error["line"]][0], "message": error["message"]} for error in exc.errors)
+        pending = [item for index, item in enumerate(pending) if index not in rejected]
+        if pending:
+            services.post_inventory_batch(db, [line for _, line in pending])
+    _add(stats, "opening_posted", len(pending))
+
+
+def import_chunk(db: Session, raw_rows: list[tuple[int, dict]]) -> tuple[dict, list[dict]]:
+    """Import one chunk without committing; returns (stats, row errors)."""
+    stats: dict = {}
+    errors: list[dict] = []
+    rows = []
+    for row_no, raw in raw_rows:
+        try:
+            rows.append(parse_row(row_no, raw))
+        except ValueError as exc:
+            errors.append({"row": row_no, "message": str(exc)})
+    if not rows:
+        return stats, errors
+
+    group_ids = _group_ids(db, rows, stats)
+    product_ids = _product_ids(db, rows, group_ids, stats, errors)
+    rejected = {error["row"] for error in errors}
+    rows = [row for row in rows if row.row_no not in rejected]
+    lot_ids = _lot_ids(db, rows, product_ids, stats, errors)
+    rejected = {error["row"] for error in errors}
+    rows = [row for row in rows if row.row_no not in rejected]
+    if stats:
+        services.invalidate_master_data(db)
+
+    opening = []
+    for row in rows:
+        if row.opening_qty <= 0 or row.product_code not in product_ids:
+            continue
+        product_id = product_ids[row.product_code]
+        line = schemas.InventoryBatchLine(
+            tx_type=models.TxType.IN.value,
+            product_id=product_id,
+            lot_id=lot_ids[(product_id, row.mfg_date, row.lot_no)],
+            qty=row.opening_qty,
+            ref_doc=OPENING_REF_DOC,
+        )
+        opening.append((row.row_no, line))
+    if opening:
+        _post_opening_stock(db, opening, stats, errors)
+    return stats, errors
+
+
+def create_job(db: Session, filename: str, source: BinaryIO) -> models.ImportJob:
+    suffix = Path(filename).suffix.lower()
+    if suffix not in SUPPORTED_SUFFIXES:
+        raise ValueError("Only .csv and .xlsx files can be imported")
+    job = models.ImportJob(filename=filename, status=models.ImportStatus.PENDING.value, stats={}, errors=[])
+    db.add(job)
+    db.flush()
+    IMPORT_DIR.mkdir(parents=True, exist_ok=True)
+    stored = IMPORT_DIR / f"{job.job_id}{suffix}"
+    with stored.open("wb") as target:
+        shutil.copyfileobj(source, target, length=1024 * 1024)
+    job.stored_path = str(stored)
+    return job
+
+
+def _claim(db: Session, job_id: int, force: bool) -> bool:
+    job = models.ImportJob
+    claimable = [models.ImportStatus.PENDING.value, models.ImportStatus.FAILED.value]
+    if force:
+        claimable.append(models.ImportStatus.RUNNING.value)
+    claimed = db.execute(
+        update(job)
+        .where(job.job_id == job_id)
+        .where(job.status.in_(claimable))
+        .values(status=models.ImportStatus.RUNNING.value, message=None)
+    ).rowcount
+    db.commit()
+    return claimed == 1
+
+
+def run_job(job_id: int, *, force: bool = False) -> models.ImportStatus | None:
+    """Run or resume a job from its last checkpoint.
+
+    Returns the final status, or ``None`` when the job is missing, finished or
+    already running elsewhere (``force`` takes over a job left RUNNING by a crash).
+    """
+    with db_module.SessionLocal() as db:
+        if not _claim(db, job_id, force):
+            return None
+        job = db.get(models.ImportJob, job_id)
+        try:
+            path = Path(job.stored_path)
+            if job.total_rows is None:
+                job.total_rows = sum(1 for _ in read_rows(path))
+                db.commit()
+            rows = itertools.islice(read_rows(path), job.processed_rows, None)
+            while chunk := list(itertools.islice(rows, IMPORT_CHUNK_SIZE)):
+                stats, errors = import_chunk(db, chunk)
+                merged = dict(job.stats)
+                for key, count in stats.items():
+                    _add(merged, key, count)
+                job.stats = merged
+                job.errors = (job.errors + errors)[:MAX_STORED_ERRORS]
+                job.error_count += len(errors)
+                job.processed_rows += len(chunk)
+                db.commit()
+            job.status = models.ImportStatus.DONE.value
+            job.finished_at = dt.datetime.utcnow()
+        except Exception as exc:
+            db.rollback()
+            job = db.get(models.ImportJob, job_id)
+            job.status = models.ImportStatus.FAILED.value
+            job.message = str(exc)
+        db.commit()
+        return models.ImportStatus(job.status)
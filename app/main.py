@@ -1,11 +1,60 @@
 from __future__ import annotations
 
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
+from app import audit, metrics, profiling
+from app import db as db_module
+from app.api.async_routes import async_router
 from app.api.routes import router
 
-app = FastAPI(title="Inventory MVP-1")
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    worker = None
+    if audit.AUDIT_MODE == "deferred" and audit.AUDIT_WORKER_ENABLED:
+        worker = audit.OutboxWorker()
+        worker.start()
+    yield
+    if worker:
+        worker.stop()
+
+
+app = FastAPI(title="Inventory MVP-1", lifespan=lifespan)
 app.include_router(router)
+app.include_router(async_router)
+
+
+if db_module.DATABASE_READ_URL:
+    # Without a replica every read already goes to the primary; skip the extra layer.
+    app.add_middleware(db_module.PrimaryPinMiddleware)
+
+
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
+
+if profiling.QUERY_PROFILING:
+    app.add_middleware(profiling.QueryProfilingMiddleware)
+
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def prometheus_metrics():
+    pool = db_module.engine.pool
+    extra = []
+    if hasattr(pool, "checkedout"):
+        extra += metrics.gauge("inventory_db_pool_checked_out", "Connections currently checked out.", pool.checkedout())
+    with db_module.SessionLocal() as db:
+        outbox = audit.outbox_stats(db)
+    extra += metrics.gauge("inventory_audit_outbox_pending", "Audit records waiting in the outbox.", outbox["pending"])
+    extra += metrics.gauge(
+        "inventory_audit_outbox_lag_seconds", "Age of the oldest audit record in the outbox.", outbox["lag_seconds"]
+    )
+    return PlainTextResponse(metrics.render(extra), media_type=PROMETHEUS_CONTENT_TYPE)
 
 
 @app.get("/")
@@ -13,5 +62,5 @@ def root():
     return {
         "message": "Inventory MVP-1 API",
         "docs": "/docs",
-        "expansion_notes": "REVERSAL and other extensions documented in README",
+        "expansion_notes": "Planned extensions documented in README",
     }
@@ -0,0 +1,253 @@
+"""In-process metrics in the Prometheus text format, served at ``/metrics``.
+
+Counters and histograms are plain dicts keyed by label values behind one lock.
+An observation is a ``bisect`` plus a few list updates, so instrumenting a
+request or a statement costs a couple of microseconds.
+
+Recorded:
+- request counts and latency per route template, method and status;
+- time spent waiting for a pooled connection;
+- count and duration of SQL statements per operation and table, from the
+  ``before_cursor_execute``/``after_cursor_execute`` engine events;
+- commit duration (flush included), from the ``Session`` commit events;
+- committed postings and quantity per ``tx_type``.
+
+Each process keeps its own numbers; run one scrape target per worker.
+"""
+from __future__ import annotations
+
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Iterable
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+_STATEMENT_TARGET = re.compile(
+    r"^\s*(?:WITH\b.*?\)\s*)?(?:(SELECT)\b.*?\bFROM|(INSERT)\b.*?\bINTO|(UPDATE)|(DELETE)\s+FROM)\s+\"?(\w+)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def _format_labels(names: tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self._values: dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            items = sorted(self._values.items())
+        for labels, value in items:
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {value:g}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labelnames: tuple[str, ...] = (), buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # Per label set: [count per bucket (last one is +Inf)..., sum]
+        self._series: dict[tuple, list[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[:-1]) if series else 0
+
+    def clear(self) -> None:
+        with self._lock:
+            self._series.clear()
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for bound, hits in zip((*self.buckets, "+Inf"), series[:-1]):
+                cumulative += hits
+                le = 'le="+Inf"' if bound == "+Inf" else f'le="{bound:g}"'
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, labels)} {series[-1]:g}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, labels)} {cumulative}"
+
+
+HTTP_REQUESTS = Counter("inventory_http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+HTTP_LATENCY = Histogram(
+    "inventory_http_request_duration_seconds", "Time from request to response headers.", ("method", "route")
+)
+POOL_WAIT = Histogram(
+    "inventory_db_pool_wait_seconds", "Time a session waited to check out a pooled connection.", (), QUERY_BUCKETS
+)
+QUERY_LATENCY = Histogram(
+    "inventory_db_query_duration_seconds", "SQL statement execution time.", ("operation", "table"), QUERY_BUCKETS
+)
+COMMIT_LATENCY = Histogram("inventory_db_commit_duration_seconds", "Session commit time, flush included.", (), QUERY_BUCKETS)
+POSTINGS = Counter("inventory_postings_total", "Committed inventory transactions.", ("tx_type",))
+POSTED_QTY = Counter("inventory_posted_qty_total", "Quantity moved by committed inventory transactions.", ("tx_type",))
+
+REGISTRY = (HTTP_REQUESTS, HTTP_LATENCY, POOL_WAIT, QUERY_LATENCY, COMMIT_LATENCY, POSTINGS, POSTED_QTY)
+
+_statement_labels: dict[str, tuple[str, str]] = {}
+
+
+def statement_labels(statement: str) -> tuple[str, str]:
+    """``(operation, table)`` for a SQL string; compiled statements repeat, so the parse is cached."""
+    labels = _statement_labels.get(statement)
+    if labels is None:
+        match = _STATEMENT_TARGET.match(statement)
+        if match:
+            operation = next(group for group in match.groups()[:4] if group)
+            labels = (operation.upper(), match.group(5).lower())
+        else:
+            labels = ("OTHER", "")
+        if len(_statement_labels) < 10_000:
+            _statement_labels[statement] = labels
+    return labels
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    # Kept on the execution context, so a failed statement leaves nothing behind.
+    if context is not None:
+        context._metrics_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    start = getattr(context, "_metrics_start", None)
+    if start is not None:
+        QUERY_LATENCY.observe(time.perf_counter() - start, *statement_labels(statement))
+
+
+def instrument_engine(engine) -> None:
+    """Time every statement executed through ``engine`` (sync engine of an async engine included)."""
+    if not METRICS_ENABLED or event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def record_posting(db: Session, tx_type: str, tx_count: int, qty: int) -> None:
+    """Queue a posting for the throughput counters; it is counted only if the session commits."""
+    if METRICS_ENABLED and tx_count > 0:
+        db.info.setdefault("metrics_postings", []).append((tx_type, tx_count, qty))
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session: Session) -> None:
+    session.info["metrics_commit_start"] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session: Session) -> None:
+    start = session.info.pop("metrics_commit_start", None)
+    if start is not None:
+        COMMIT_LATENCY.observe(time.perf_counter() - start)
+    for tx_type, tx_count, qty in session.info.pop("metrics_postings", ()):
+        POSTINGS.inc(tx_type, amount=tx_count)
+        POSTED_QTY.inc(tx_type, amount=qty)
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session: Session) -> None:
+    session.info.pop("metrics_commit_start", None)
+    session.info.pop("metrics_postings", None)
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording request count and latency up to the response headers.
+
+    The route template, not the raw path, is the label, which keeps cardinality
+    bounded. The router stores the matched route in the shared ``scope``.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        recorded = False
+
+        def record(status: int) -> None:
+            nonlocal recorded
+            recorded = True
+            route = scope.get("route")
+            path = route.path if route is not None else "unmatched"
+            HTTP_REQUESTS.inc(scope["method"], path, status)
+            HTTP_LATENCY.observe(time.perf_counter() - start, scope["method"], path)
+
+        async def send_with_metrics(message) -> None:
+            if message["type"] == "http.response.start":
+                record(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_metrics)
+        except Exception:
+            if not recorded:
+                record(500)
+            raise
+
+
+def render(extra: Iterable[str] = ()) -> str:
+    lines = [line for metric in REGISTRY for line in metric.render()]
+    lines.extend(extra)
+    return "\n".join(lines) + "\n"
+
+
+def gauge(name: str, help: str, value: float) -> list[str]:
+    """Exposition lines for a value read at scrape time (pool size, outbox lag)."""
+    return [f"# HELP {name} {help}", f"# TYPE {name} gauge", f"{name} {value:g}"]
+
+
+def reset() -> None:
+    for metric in REGISTRY:
+        metric.clear()
@@ -3,13 +3,16 @@ from __future__ import annotations
 import datetime as dt
 from enum import Enum
 
-from sqlalchemy import Boolean, Date, DateTime, ForeignKey, Integer, String, Text, UniqueConstraint, func
+from sqlalchemy import DDL, Boolean, Date, DateTime, ForeignKey, Index, Integer, String, Text, UniqueConstraint, event, func, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.types import JSON
 
 from app.db import Base
 
+# Created by migration 0012 (and on create_all); postings without a location go here.
+DEFAULT_LOCATION_ID = 1
+
 
 class ProductGroup(Base):
     __tablename__ = "product_group"
@@ -55,45 +58,266 @@ class Lot(Base):
     balances: Mapped[list[InventoryBalance]] = relationship(back_populates="lot")
 
 
+class Location(Base):
+    """A warehouse or storage location that holds stock."""
+
+    __tablename__ = "location"
+
+    location_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    location_code: Mapped[str] = mapped_column(String(50), unique=True, nullable=False)
+    location_name: Mapped[str] = mapped_column(String(200), nullable=False)
+    is_active: Mapped[bool] = mapped_column(Boolean, nullable=False, default=True)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+
+event.listen(
+    Location.__table__,
+    "after_create",
+    DDL(
+        "INSERT INTO location (location_id, location_code, location_name, is_active) "
+        f"VALUES ({DEFAULT_LOCATION_ID}, 'MAIN', 'Main warehouse', true)"
+    ),
+)
+
+
+def _sqlite_ddl(statement: str) -> DDL:
+    return DDL(statement).execute_if(dialect="sqlite")
+
+
+def _postgresql_ddl(statement: str) -> DDL:
+    return DDL(statement).execute_if(dialect="postgresql")
+
+
+# Substring search: trigram FTS5 shadow tables on SQLite, pg_trgm GIN indexes on PostgreSQL.
+for _ddl in (
+    _sqlite_ddl(
+        "CREATE VIRTUAL TABLE product_search USING fts5("
+        "product_code, product_name, content='product', content_rowid='product_id', tokenize='trigram')"
+    ),
+    _sqlite_ddl(
+        """
+        CREATE TRIGGER product_search_ai AFTER INSERT ON product BEGIN
+            INSERT INTO product_search (rowid, product_code, product_name)
+            VALUES (new.product_id, new.product_code, new.product_name);
+        END;
+        """
+    ),
+    _sqlite_ddl(
+        """
+        CREATE TRIGGER product_search_ad AFTER DELETE ON product BEGIN
+            INSERT INTO product_search (product_search, rowid, product_code, product_name)
+            VALUES ('delete', old.product_id, old.product_code, old.product_name);
+        END;
+        """
+    ),
+    _sqlite_ddl(
+        """
+        CREATE TRIGGER product_search_au AFTER UPDATE OF product_code, product_name ON product BEGIN
+            INSERT INTO product_search (product_search, rowid, product_code, product_name)
+            VALUES ('delete', old.product_id, old.product_code, old.product_name);
+            INSERT INTO product_search (rowid, product_code, product_name)
+            VALUES (new.product_id, new.product_code, new.product_name);
+        END;
+        """
+    ),
+    _postgresql_ddl("CREATE EXTENSION IF NOT EXISTS pg_trgm"),
+    _postgresql_ddl("CREATE INDEX ix_product_code_trgm ON product USING gin (product_code gin_trgm_ops)"),
+    _postgresql_ddl("CREATE INDEX ix_product_name_trgm ON product USING gin (product_name gin_trgm_ops)"),
+):
+    event.listen(Product.__table__, "after_create", _ddl)
+
+for _ddl in (
+    _sqlite_ddl("CREATE VIRTUAL TABLE lot_search USING fts5(lot_no, content='lot', content_rowid='lot_id', tokenize='trigram')"),
+    _sqlite_ddl(
+        """
+        CREATE TRIGGER lot_search_ai AFTER INSERT ON lot BEGIN
+            INSERT INTO lot_search (rowid, lot_no) VALUES (new.lot_id, new.lot_no);
+        END;
+        """
+    ),
+    _sqlite_ddl(
+        """
+        CREATE TRIGGER lot_search_ad AFTER DELETE ON lot BEGIN
+            INSERT INTO lot_search (lot_search, rowid, lot_no) VALUES ('delete', old.lot_id, old.lot_no);
+        END;
+        """
+    ),
+    _sqlite_ddl(
+        """
+        CREATE TRIGGER lot_search_au AFTER UPDATE OF lot_no ON lot BEGIN
+            INSERT INTO lot_search (lot_search, rowid, lot_no) VALUES ('delete', old.lot_id, old.lot_no);
+            INSERT INTO lot_search (rowid, lot_no) VALUES (new.lot_id, new.lot_no);
+        END;
+        """
+    ),
+    _postgresql_ddl("CREATE INDEX ix_lot_no_trgm ON lot USING gin (lot_no gin_trgm_ops)"),
+):
+    event.listen(Lot.__table__, "after_create", _ddl)
+
+
 class TxType(str, Enum):
     IN = "IN"
     OUT = "OUT"
+    REVERSAL = "REV"
+    TRANSFER_OUT = "TRO"
+    TRANSFER_IN = "TRI"
+
+
+# Transaction types that add stock to their location; every other live type removes it.
+INBOUND_TX_TYPES = (TxType.IN.value, TxType.TRANSFER_IN.value)
 
 
 class InventoryTx(Base):
     __tablename__ = "inventory_tx"
+    __table_args__ = (
+        Index("ix_inventory_tx_datetime_id", "tx_datetime", "tx_id"),
+        Index("ix_inventory_tx_lot_datetime", "lot_id", "tx_datetime", "tx_id"),
+        Index("ix_inventory_tx_location_datetime", "location_id", "tx_datetime", "tx_id"),
+        Index(
+            "ix_inventory_tx_product_lot",
+            "product_id",
+            "lot_id",
+            "location_id",
+            "tx_type",
+            "qty",
+            "tx_datetime",
+            "is_void",
+        ),
+    )
 
     tx_id: Mapped[int] = mapped_column(Integer, primary_key=True)
     tx_type: Mapped[TxType] = mapped_column(String(3), nullable=False, index=True)
-    tx_datetime: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, index=True)
-    product_id: Mapped[int] = mapped_column(ForeignKey("product.product_id"), nullable=False, index=True)
-    lot_id: Mapped[int] = mapped_column(ForeignKey("lot.lot_id"), nullable=False, index=True)
+    tx_datetime: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False)
+    product_id: Mapped[int] = mapped_column(ForeignKey("product.product_id"), nullable=False)
+    lot_id: Mapped[int] = mapped_column(ForeignKey("lot.lot_id"), nullable=False)
+    location_id: Mapped[int] = mapped_column(
+        ForeignKey("location.location_id"), nullable=False, default=DEFAULT_LOCATION_ID, server_default=str(DEFAULT_LOCATION_ID)
+    )
     qty: Mapped[int] = mapped_column(Integer, nullable=False)
     ref_doc: Mapped[str | None] = mapped_column(String(200))
     note: Mapped[str | None] = mapped_column(Text)
     created_by: Mapped[str | None] = mapped_column(String(100))
     created_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
     updated_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+    # A corrected transaction is voided together with the REVERSAL row that
+    # cancels it; void rows are left out of every stock aggregate.
     is_void: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    # Set on REVERSAL and replacement rows: the transaction they correct.
+    original_tx_id: Mapped[int | None] = mapped_column(ForeignKey("inventory_tx.tx_id"))
 
     product: Mapped[Product] = relationship()
     lot: Mapped[Lot] = relationship()
 
 
+event.listen(
+    InventoryTx.__table__,
+    "after_create",
+    _sqlite_ddl(
+        """
+        CREATE TRIGGER inventory_tx_no_delete
+        BEFORE DELETE ON inventory_tx
+        BEGIN
+            SELECT RAISE(ABORT, 'inventory_tx deletion is not allowed');
+        END;
+        """
+    ),
+)
+
+
 class InventoryBalance(Base):
+    """Stock of one lot at one location.
+
+    The primary key leads with ``(product_id, lot_id)`` so rolled-up per-lot
+    totals are a grouped read of the key; per-location listings use
+    ``ix_inventory_balance_location``. Outbound allocation reads only the rows
+    with stock through the partial ``ix_inventory_balance_in_stock``; the dashboard
+    counts short lots through the partial ``ix_inventory_balance_negative``.
+    """
+
     __tablename__ = "inventory_balance"
+    __table_args__ = (
+        Index("ix_inventory_balance_location", "location_id", "product_id", "lot_id"),
+        Index("ix_inventory_balance_lot", "lot_id", "location_id"),
+        Index(
+            "ix_inventory_balance_in_stock",
+            "product_id",
+            "location_id",
+            "lot_id",
+            "qty_on_hand",
+            sqlite_where=text("qty_on_hand > 0"),
+            postgresql_where=text("qty_on_hand > 0"),
+        ),
+        Index(
+            "ix_inventory_balance_negative",
+            "product_id",
+            "lot_id",
+            sqlite_where=text("qty_on_hand < 0"),
+            postgresql_where=text("qty_on_hand < 0"),
+        ),
+    )
 
     product_id: Mapped[int] = mapped_column(ForeignKey("product.product_id"), primary_key=True)
     lot_id: Mapped[int] = mapped_column(ForeignKey("lot.lot_id"), primary_key=True)
+    location_id: Mapped[int] = mapped_column(
+        ForeignKey("location.location_id"), primary_key=True, default=DEFAULT_LOCATION_ID
+    )
     qty_on_hand: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_tx_datetime: Mapped[dt.datetime | None] = mapped_column(DateTime)
     updated_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
 
     product: Mapped[Product] = relationship()
     lot: Mapped[Lot] = relationship(back_populates="balances")
+    location: Mapped[Location] = relationship()
+
+
+class BalanceSnapshot(Base):
+    """Stock per lot and location at the end of ``snapshot_date`` (all transactions before the next day)."""
+
+    __tablename__ = "balance_snapshot"
+
+    snapshot_date: Mapped[dt.date] = mapped_column(Date, primary_key=True)
+    lot_id: Mapped[int] = mapped_column(ForeignKey("lot.lot_id"), primary_key=True)
+    location_id: Mapped[int] = mapped_column(ForeignKey("location.location_id"), primary_key=True)
+    product_id: Mapped[int] = mapped_column(ForeignKey("product.product_id"), nullable=False)
+    qty_on_hand: Mapped[int] = mapped_column(Integer, nullable=False)
+    last_tx_datetime: Mapped[dt.datetime | None] = mapped_column(DateTime)
+
+
+class GroupStockSummary(Base):
+    __tablename__ = "group_stock_summary"
+
+    group_id: Mapped[int] = mapped_column(ForeignKey("product_group.group_id"), primary_key=True)
+    qty_on_hand: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    # Active products of the group and active lots of its products.
+    product_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    lot_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+
+
+class DailyTxSummary(Base):
+    __tablename__ = "daily_tx_summary"
+
+    tx_date: Mapped[dt.date] = mapped_column(Date, primary_key=True)
+    tx_type: Mapped[str] = mapped_column(String(3), primary_key=True)
+    tx_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    qty: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+
+
+class MasterDataVersion(Base):
+    __tablename__ = "master_data_version"
+
+    name: Mapped[str] = mapped_column(String(50), primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
 
 
 class AuditLog(Base):
     __tablename__ = "audit_log"
+    # On PostgreSQL migration 0010 turns this into a table partitioned by month on created_at.
+    __table_args__ = (
+        Index("ix_audit_log_entity", "entity_type", "entity_id", "created_at", "audit_id"),
+        Index("ix_audit_log_created", "created_at", "audit_id"),
+    )
 
     audit_id: Mapped[int] = mapped_column(Integer, primary_key=True)
     entity_type: Mapped[str] = mapped_column(String(100), nullable=False)
@@ -103,3 +327,78 @@ class AuditLog(Base):
     reason: Mapped[str | None] = mapped_column(String(200))
     actor: Mapped[str | None] = mapped_column(String(100))
     created_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
+
+
+class AuditArchive(Base):
+    """A month of ``audit_log`` moved out to a gzip'd JSON-lines file by the retention job."""
+
+    __tablename__ = "audit_archive"
+
+    archive_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    month: Mapped[dt.date] = mapped_column(Date, nullable=False, index=True)
+    part: Mapped[int] = mapped_column(Integer, nullable=False)
+    path: Mapped[str] = mapped_column(String(500), nullable=False)
+    row_count: Mapped[int] = mapped_column(Integer, nullable=False)
+    archived_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
+
+
+class AuditOutbox(Base):
+    """Audit records committed with the ledger change, waiting to be moved into ``audit_log``.
+
+    Append-only with no secondary indexes, so the posting path pays for one cheap insert.
+    """
+
+    __tablename__ = "audit_outbox"
+
+    outbox_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    entity_type: Mapped[str] = mapped_column(String(100), nullable=False)
+    entity_id: Mapped[str] = mapped_column(String(100), nullable=False)
+    action: Mapped[str] = mapped_column(String(20), nullable=False)
+    changed_fields: Mapped[dict] = mapped_column(JSON().with_variant(JSONB, "postgresql"), nullable=False)
+    reason: Mapped[str | None] = mapped_column(String(200))
+    actor: Mapped[str | None] = mapped_column(String(100))
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
+
+
+class ImportStatus(str, Enum):
+    PENDING = "PENDING"
+    RUNNING = "RUNNING"
+    DONE = "DONE"
+    FAILED = "FAILED"
+
+
+class ImportJob(Base):
+    __tablename__ = "import_job"
+
+    job_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    filename: Mapped[str] = mapped_column(String(255), nullable=False)
+    stored_path: Mapped[str | None] = mapped_column(String(500))
+    status: Mapped[str] = mapped_column(String(10), nullable=False, default=ImportStatus.PENDING.value)
+    total_rows: Mapped[int | None] = mapped_column(Integer)
+    processed_rows: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    error_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    stats: Mapped[dict] = mapped_column(JSON().with_variant(JSONB, "postgresql"), nullable=False, default=dict)
+    errors: Mapped[list] = mapped_column(JSON().with_variant(JSONB, "postgresql"), nullable=False, default=list)
+    message: Mapped[str | None] = mapped_column(Text)
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now())
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False, server_default=func.now(), onupdate=func.now())
+    finished_at: Mapped[dt.datetime | None] = mapped_column(DateTime)
+
+
+class IdempotencyKey(Base):
+    """A client's ``Idempotency-Key`` and the response its first request got.
+
+    The row is inserted in the posting's transaction before the ledger is
+    touched and filled in before commit, so a retry either waits for the first
+    request and replays its response or, if that request failed, runs again.
+    """
+
+    __tablename__ = "idempotency_key"
+    __table_args__ = (Index("ix_idempotency_key_created", "created_at"),)
+
+    idempotency_key: Mapped[str] = mapped_column(String(255), primary_key=True)
+    endpoint: Mapped[str] = mapped_column(String(100), nullable=False)
+    request_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    status_code: Mapped[int | None] = mapped_column(Integer)
+    response_body: Mapped[dict | None] = mapped_column(JSON().with_variant(JSONB, "postgresql"))
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime, nullable=False)
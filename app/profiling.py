@@ -0,0 +1,136 @@
+"""Query profiling for development and tests (``QUERY_PROFILING=true``).
+
+Every request gets a ``QueryProfile`` listing the statements it ran.
+``QueryProfilingMiddleware`` reports the count in ``X-Query-Count``. If one
+statement repeats ``REPEATED_QUERY_THRESHOLD`` times or more, the middleware
+logs a warning and sets ``X-Query-Repeated``; that repeat is the usual sign of
+an N+1 loop. A statement slower than ``SLOW_QUERY_MS`` is logged with its bound
+parameters and the database's plan for it.
+
+Statements executed while a streaming response body is sent happen after the
+headers go out and are not counted.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator
+
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+
+QUERY_PROFILING = os.getenv("QUERY_PROFILING", "false").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "100"))
+REPEATED_QUERY_THRESHOLD = int(os.getenv("REPEATED_QUERY_THRESHOLD", "5"))
+
+logger = logging.getLogger(__name__)
+
+
+class QueryProfile:
+    def __init__(self):
+        self.statements: list[tuple[str, Any, float]] = []
+
+    @property
+    def count(self) -> int:
+        return len(self.statements)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(elapsed for _, _, elapsed in self.statements)
+
+    def repeated(self, threshold: int = REPEATED_QUERY_THRESHOLD) -> dict[str, int]:
+        """Statements (SQL text, parameters aside) run at least ``threshold`` times."""
+        counts = Counter(statement for statement, _, _ in self.statements)
+        return {statement: count for statement, count in counts.items() if count >= threshold}
+
+
+_current_profile: ContextVar[QueryProfile | None] = ContextVar("query_profile", default=None)
+
+
+@contextmanager
+def profile_queries() -> Iterator[QueryProfile]:
+    """Collect the statements run in this context (threadpool and ``run_sync`` calls inherit it)."""
+    profile = QueryProfile()
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+class QueryProfilingMiddleware:
+    """Pure ASGI middleware adding ``X-Query-Count``/``X-Query-Repeated`` to every response.
+
+    ``app.main`` installs it only when ``QUERY_PROFILING`` is on.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        with profile_queries() as profile:
+
+            async def send_with_profile(message) -> None:
+                if message["type"] == "http.response.start":
+                    headers = MutableHeaders(scope=message)
+                    headers["X-Query-Count"] = str(profile.count)
+                    repeated = profile.repeated()
+                    if repeated:
+                        headers["X-Query-Repeated"] = str(max(repeated.values()))
+                        for statement, count in repeated.items():
+                            logger.warning("Possible N+1 in %s %s: %d x %s", scope["method"], scope["path"], count, statement)
+                await send(message)
+
+            await self.app(scope, receive, send_with_profile)
+
+
+def explain(conn, statement: str, parameters) -> str:
+    """The plan for ``statement``, read on a raw DBAPI cursor so the engine events do not see it."""
+    prefix = "EXPLAIN QUERY PLAN " if conn.dialect.name == "sqlite" else "EXPLAIN "
+    try:
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(prefix + statement, parameters)
+            return "\n".join(str(row[-1]) for row in cursor.fetchall())
+        finally:
+            cursor.close()
+    except Exception as exc:  # the plan is best effort; never fail the statement being profiled
+        return f"(no plan: {exc})"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None:
+        context._profiling_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    start = getattr(context, "_profiling_start", None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    profile = _current_profile.get()
+    if profile is not None:
+        profile.statements.append((statement, parameters, elapsed))
+    if elapsed * 1000 >= SLOW_QUERY_MS:
+        plannable = not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH", "UPDATE", "DELETE"))
+        logger.warning(
+            "Slow query (%.1f ms): %s params=%r\n%s",
+            elapsed * 1000,
+            statement,
+            parameters,
+            explain(conn, statement, parameters) if plannable else "",
+        )
+
+
+def instrument_engine(engine) -> None:
+    if not QUERY_PROFILING or event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        return
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
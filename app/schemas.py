@@ -1,10 +1,12 @@
 from __future__ import annotations
 
 import datetime as dt
-from typing import Any
+from typing import Any, Literal
 
 from pydantic import BaseModel, Field
 
+from app.models import DEFAULT_LOCATION_ID
+
 
 class ProductGroupBase(BaseModel):
     group_name: str
@@ -85,9 +87,35 @@ class LotOut(LotBase):
         from_attributes = True
 
 
+class LocationBase(BaseModel):
+    location_code: str
+    location_name: str
+    is_active: bool = True
+
+
+class LocationCreate(LocationBase):
+    pass
+
+
+class LocationUpdate(BaseModel):
+    location_code: str | None = None
+    location_name: str | None = None
+    is_active: bool | None = None
+
+
+class LocationOut(LocationBase):
+    location_id: int
+    created_at: dt.datetime
+    updated_at: dt.datetime
+
+    class Config:
+        from_attributes = True
+
+
 class InventoryTxBase(BaseModel):
     product_id: int
     lot_id: int
+    location_id: int = DEFAULT_LOCATION_ID
     qty: int = Field(..., ge=1)
     ref_doc: str | None = None
     note: str | None = None
@@ -101,23 +129,60 @@ class InventoryOutCreate(InventoryTxBase):
     confirm_shortage: bool = False
 
 
+class InventoryBatchLine(InventoryTxBase):
+    tx_type: Literal["IN", "OUT"]
+    confirm_shortage: bool = False
+
+
+class InventoryBatchCreate(BaseModel):
+    lines: list[InventoryBatchLine] = Field(..., min_length=1, max_length=1000)
+
+
+class InventoryAllocateCreate(BaseModel):
+    product_id: int
+    location_id: int = DEFAULT_LOCATION_ID
+    qty: int = Field(..., ge=1)
+    strategy: Literal["FEFO", "FIFO"] = "FEFO"
+    ref_doc: str | None = None
+    note: str | None = None
+
+
+class InventoryTransferCreate(BaseModel):
+    product_id: int
+    lot_id: int
+    from_location_id: int
+    to_location_id: int
+    qty: int = Field(..., ge=1)
+    ref_doc: str | None = None
+    note: str | None = None
+    confirm_shortage: bool = False
+
+
 class InventoryTxUpdate(BaseModel):
     lot_id: int | None = None
+    location_id: int | None = None
     qty: int | None = Field(default=None, ge=1)
     ref_doc: str | None = None
     note: str | None = None
     reason: str | None = None
 
 
+class InventoryTxReverse(BaseModel):
+    reason: str | None = None
+
+
 class InventoryTxOut(BaseModel):
     tx_id: int
     tx_type: str
     tx_datetime: dt.datetime
     product_id: int
     lot_id: int
+    location_id: int
     qty: int
     ref_doc: str | None
     note: str | None
+    is_void: bool
+    original_tx_id: int | None
     created_at: dt.datetime
     updated_at: dt.datetime
 
@@ -133,6 +198,65 @@ class BalanceOut(BaseModel):
     lot_no: str
     qty_on_hand: int
     last_tx_datetime: dt.datetime | None
+    location_code: str | None = None
+
+
+class SearchHitOut(BaseModel):
+    entity_type: str
+    entity_id: int
+    product_id: int
+    code: str
+    name: str | None
+    score: float
+
+
+class GroupSummaryOut(BaseModel):
+    group_id: int
+    group_name: str
+    qty_on_hand: int
+    negative_lot_count: int
+
+
+class DashboardSummaryOut(BaseModel):
+    product_count: int
+    lot_count: int
+    total_qty: int
+    negative_lot_count: int
+    today_in_qty: int
+    today_out_qty: int
+    groups: list[GroupSummaryOut]
+
+
+class CacheStatsOut(BaseModel):
+    size: int
+    hits: int
+    misses: int
+    evictions: int
+
+
+class AuditOutboxStatsOut(BaseModel):
+    mode: str
+    pending: int
+    oldest_created_at: dt.datetime | None
+    lag_seconds: float
+
+
+class ImportJobOut(BaseModel):
+    job_id: int
+    filename: str
+    status: str
+    total_rows: int | None
+    processed_rows: int
+    error_count: int
+    stats: dict[str, int]
+    errors: list[dict[str, Any]]
+    message: str | None
+    created_at: dt.datetime
+    updated_at: dt.datetime
+    finished_at: dt.datetime | None
+
+    class Config:
+        from_attributes = True
 
 
 class AuditLogOut(BaseModel):
@@ -147,3 +271,14 @@ class AuditLogOut(BaseModel):
 
     class Config:
         from_attributes = True
+
+
+class AuditArchiveOut(BaseModel):
+    archive_id: int
+    month: dt.date
+    part: int
+    row_count: int
+    archived_at: dt.datetime
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+from sqlalchemy import bindparam, func, literal, literal_column, or_, select, table
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.elements import ColumnElement
+
+from app import models, schemas
+
+# Trigram indexes cannot answer patterns shorter than one trigram.
+MIN_INDEXED_QUERY_LENGTH = 3
+
+_SQLITE_FTS = {
+    models.Product.product_code: ("product_search", "product_code", models.Product.product_id),
+    models.Product.product_name: ("product_search", "product_name", models.Product.product_id),
+    models.Lot.lot_no: ("lot_search", "lot_no", models.Lot.lot_id),
+}
+
+
+def _is_sqlite(db: Session) -> bool:
+    return db.get_bind().dialect.name == "sqlite"
+
+
+def _fts_phrase(q: str, column: str | None = None) -> str:
+    phrase = '"' + q.replace('"', '""') + '"'
+    return f"{column} : {phrase}" if column else phrase
+
+
+def _fts_match(fts_table: str, expression: str) -> ColumnElement[bool]:
+    return literal_column(fts_table).op("MATCH")(bindparam(None, expression))
+
+
+def contains(db: Session, column, q: str) -> ColumnElement[bool]:
+    """Case-insensitive substring filter on ``column`` that an index can serve.
+
+    On PostgreSQL the plain ILIKE is answered by the pg_trgm GIN index; on SQLite
+    indexed columns are matched through their FTS5 trigram shadow table.
+    """
+    if not _is_sqlite(db) or column not in _SQLITE_FTS or len(q) < MIN_INDEXED_QUERY_LENGTH:
+        return column.ilike(f"%{q}%")
+    fts_table, fts_column, primary_key = _SQLITE_FTS[column]
+    matches = select(literal_column("rowid")).select_from(table(fts_table)).where(
+        _fts_match(fts_table, _fts_phrase(q, fts_column))
+    )
+    return primary_key.in_(matches)
+
+
+def search(db: Session, q: str, entity_type: str | None, limit: int) -> list[schemas.SearchHitOut]:
+    hits: list[schemas.SearchHitOut] = []
+    if entity_type in (None, "product"):
+        hits.extend(_search_products(db, q, limit))
+    if entity_type in (None, "lot"):
+        hits.extend(_search_lots(db, q, limit))
+    hits.sort(key=lambda hit: hit.score, reverse=True)
+    return hits[:limit]
+
+
+def _search_products(db: Session, q: str, limit: int) -> list[schemas.SearchHitOut]:
+    product = models.Product
+    if _is_sqlite(db) and len(q) >= MIN_INDEXED_QUERY_LENGTH:
+        score = -func.bm25(literal_column("product_search"), 5.0, 1.0)
+        stmt = (
+            select(product.product_id, product.product_code, product.product_name, score.label("score"))
+            .select_from(table("product_search"))
+            .join(product, product.product_id == literal_column("product_search.rowid"))
+            .where(_fts_match("product_search", _fts_phrase(q)))
+        )
+    else:
+        stmt = select(
+            product.product_id,
+            product.product_code,
+            product.product_name,
+            _rank(db, q, product.product_code, product.product_name).label("score"),
+        ).where(or_(contains(db, product.product_code, q), contains(db, product.product_name, q)))
+    rows = db.execute(stmt.order_by(literal_column("score").desc()).limit(limit)).all()
+    return [
+        schemas.SearchHitOut(
+            entity_type="product",
+            entity_id=row.product_id,
+            product_id=row.product_id,
+            code=row.product_code,
+            name=row.product_name,
+            score=float(row.score),
+        )
+        for row in rows
+    ]
+
+
+def _search_lots(db: Session, q: str, limit: int) -> list[schemas.SearchHitOut]:
+    lot = models.Lot
+    if _is_sqlite(db) and len(q) >= MIN_INDEXED_QUERY_LENGTH:
+        score = -func.bm25(literal_column("lot_search"))
+        stmt = (
+            select(lot.lot_id, lot.product_id, lot.lot_no, score.label("score"))
+            .select_from(table("lot_search"))
+            .join(lot, lot.lot_id == literal_column("lot_search.rowid"))
+            .where(_fts_match("lot_search", _fts_phrase(q)))
+        )
+    else:
+        stmt = select(lot.lot_id, lot.product_id, lot.lot_no, _rank(db, q, lot.lot_no).label("score")).where(
+            contains(db, lot.lot_no, q)
+        )
+    rows = db.execute(stmt.order_by(literal_column("score").desc()).limit(limit)).all()
+    return [
+        schemas.SearchHitOut(
+            entity_type="lot",
+            entity_id=row.lot_id,
+            product_id=row.product_id,
+            code=row.lot_no,
+            name=None,
+            score=float(row.score),
+        )
+        for row in rows
+    ]
+
+
+def _rank(db: Session, q: str, *columns) -> ColumnElement[float]:
+    if _is_sqlite(db):
+        # Short patterns on SQLite fall back to a scan; rank prefix matches first.
+        return func.max(literal(0), *(column.ilike(f"{q}%") for column in columns))
+    return func.greatest(*(func.similarity(column, q) for column in columns))
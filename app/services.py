@@ -1,15 +1,36 @@
 from __future__ import annotations
 
+import base64
 import datetime as dt
+import json
 
-from sqlalchemy import func, select
+from sqlalchemy import Date, DateTime, Integer, Select, and_, case, false, func, insert, literal, literal_column, null, or_, select, true, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.orm import Session
 
-from app import models
+from app import audit, metrics, models, schemas, search, serialization
+from app.cache import MASTER_DATA_VERSION_KEY, GroupRef, LocationRef, LotRef, ProductRef, master_cache
 
 
-def assert_group_active(db: Session, group_id: int) -> models.ProductGroup:
-    group = db.get(models.ProductGroup, group_id)
+class InsufficientStockError(ValueError):
+    def __init__(self, current_qty: int):
+        super().__init__("Insufficient stock")
+        self.current_qty = current_qty
+
+
+class TransactionVoidError(ValueError):
+    def __init__(self):
+        super().__init__("Transaction is already reversed")
+
+
+class BatchValidationError(ValueError):
+    def __init__(self, errors: list[dict]):
+        super().__init__("Batch rejected")
+        self.errors = errors
+
+
+def assert_group_active(db: Session, group_id: int) -> GroupRef:
+    group = master_cache.get(db, models.ProductGroup, group_id)
     if not group:
         raise ValueError("Product group not found")
     if not group.is_active:
@@ -17,8 +38,8 @@ def assert_group_active(db: Session, group_id: int) -> models.ProductGroup:
     return group
 
 
-def assert_product_active(db: Session, product_id: int) -> models.Product:
-    product = db.get(models.Product, product_id)
+def assert_product_active(db: Session, product_id: int) -> ProductRef:
+    product = master_cache.get(db, models.Product, product_id)
     if not product:
         raise ValueError("Product not found")
     if not product.is_active:
@@ -26,47 +47,1248 @@ def assert_product_active(db: Session, product_id: int) -> models.Product:
     return product
 
 
-def assert_lot_active(db: Session, lot_id: int) -> models.Lot:
-    lot = db.get(models.Lot, lot_id)
+def assert_lot_active(db: Session, lot_id: int) -> LotRef:
+    lot = master_cache.get(db, models.Lot, lot_id)
     if not lot:
         raise ValueError("Lot not found")
     if not lot.is_active:
         raise ValueError("Lot is inactive")
-    product = db.get(models.Product, lot.product_id)
+    product = master_cache.get(db, models.Product, lot.product_id)
     if not product or not product.is_active:
         raise ValueError("Product is inactive")
-    group = db.get(models.ProductGroup, product.group_id)
+    group = master_cache.get(db, models.ProductGroup, product.group_id)
     if not group or not group.is_active:
         raise ValueError("Product group is inactive")
     return lot
 
 
-def get_balance_qty(db: Session, product_id: int, lot_id: int) -> int:
-    balance = db.get(models.InventoryBalance, {"product_id": product_id, "lot_id": lot_id})
-    return balance.qty_on_hand if balance else 0
+def assert_location_active(db: Session, location_id: int) -> LocationRef:
+    location = master_cache.get(db, models.Location, location_id)
+    if not location:
+        raise ValueError("Location not found")
+    if not location.is_active:
+        raise ValueError("Location is inactive")
+    return location
+
+
+def invalidate_master_data(db: Session) -> None:
+    """Bump the shared master-data version so every worker drops its cached lookups."""
+    version = models.MasterDataVersion
+    stmt = dialect_insert(db)(version).values(name=MASTER_DATA_VERSION_KEY, version=1)
+    db.execute(
+        stmt.on_conflict_do_update(index_elements=[version.name], set_={"version": version.version + 1})
+    )
+    master_cache.clear()
+
+
+def post_inbound(db: Session, payload: schemas.InventoryInCreate) -> models.InventoryTx:
+    lot = assert_lot_active(db, payload.lot_id)
+    if lot.product_id != payload.product_id:
+        raise ValueError("Lot does not match product")
+    assert_location_active(db, payload.location_id)
+    now = dt.datetime.utcnow()
+    tx = models.InventoryTx(
+        tx_type=models.TxType.IN.value,
+        tx_datetime=now,
+        product_id=payload.product_id,
+        lot_id=payload.lot_id,
+        location_id=payload.location_id,
+        qty=payload.qty,
+        ref_doc=payload.ref_doc,
+        note=payload.note,
+    )
+    db.add(tx)
+    db.flush()
+    apply_balance_delta(db, payload.product_id, payload.lot_id, payload.qty, now, location_id=payload.location_id)
+    record_daily_volume(db, now.date(), models.TxType.IN.value, payload.qty)
+    create_audit_log(
+        db,
+        entity_type="inventory_tx",
+        entity_id=str(tx.tx_id),
+        action="CREATE",
+        changed_fields={"after": payload.model_dump()},
+    )
+    return tx
+
+
+def post_outbound(db: Session, payload: schemas.InventoryOutCreate) -> models.InventoryTx:
+    lot = assert_lot_active(db, payload.lot_id)
+    if lot.product_id != payload.product_id:
+        raise ValueError("Lot does not match product")
+    assert_location_active(db, payload.location_id)
+    now = dt.datetime.utcnow()
+    new_qty = apply_balance_delta(
+        db,
+        payload.product_id,
+        payload.lot_id,
+        -payload.qty,
+        now,
+        location_id=payload.location_id,
+        min_qty=None if payload.confirm_shortage else payload.qty,
+    )
+    if new_qty is None:
+        raise InsufficientStockError(get_balance_qty(db, payload.product_id, payload.lot_id, payload.location_id))
+    record_daily_volume(db, now.date(), models.TxType.OUT.value, payload.qty)
+    tx = models.InventoryTx(
+        tx_type=models.TxType.OUT.value,
+        tx_datetime=now,
+        product_id=payload.product_id,
+        lot_id=payload.lot_id,
+        location_id=payload.location_id,
+        qty=payload.qty,
+        ref_doc=payload.ref_doc,
+        note=payload.note,
+    )
+    db.add(tx)
+    db.flush()
+    create_audit_log(
+        db,
+        entity_type="inventory_tx",
+        entity_id=str(tx.tx_id),
+        action="CREATE",
+        changed_fields={"after": payload.model_dump()},
+    )
+    return tx
+
+
+def post_transfer(db: Session, payload: schemas.InventoryTransferCreate) -> list[models.InventoryTx]:
+    """Move stock of one lot between locations; returns the TRO and TRI rows.
+
+    Both legs and both balance updates happen in the caller's transaction. The
+    source leg is a guarded decrement, as for an outbound posting.
+    """
+    if payload.from_location_id == payload.to_location_id:
+        raise ValueError("Transfer needs two different locations")
+    lot = assert_lot_active(db, payload.lot_id)
+    if lot.product_id != payload.product_id:
+        raise ValueError("Lot does not match product")
+    assert_location_active(db, payload.from_location_id)
+    assert_location_active(db, payload.to_location_id)
+    now = dt.datetime.utcnow()
+    new_qty = apply_balance_delta(
+        db,
+        payload.product_id,
+        payload.lot_id,
+        -payload.qty,
+        now,
+        location_id=payload.from_location_id,
+        min_qty=None if payload.confirm_shortage else payload.qty,
+    )
+    if new_qty is None:
+        raise InsufficientStockError(get_balance_qty(db, payload.product_id, payload.lot_id, payload.from_location_id))
+    apply_balance_delta(db, payload.product_id, payload.lot_id, payload.qty, now, location_id=payload.to_location_id)
+    txs = [
+        models.InventoryTx(
+            tx_type=tx_type.value,
+            tx_datetime=now,
+            product_id=payload.product_id,
+            lot_id=payload.lot_id,
+            location_id=location_id,
+            qty=payload.qty,
+            ref_doc=payload.ref_doc,
+            note=payload.note,
+        )
+        for tx_type, location_id in (
+            (models.TxType.TRANSFER_OUT, payload.from_location_id),
+            (models.TxType.TRANSFER_IN, payload.to_location_id),
+        )
+    ]
+    db.add_all(txs)
+    db.flush()
+    for tx in txs:
+        record_daily_volume(db, now.date(), tx.tx_type, tx.qty)
+        create_audit_log(
+            db,
+            entity_type="inventory_tx",
+            entity_id=str(tx.tx_id),
+            action="CREATE",
+            changed_fields={"after": payload.model_dump()},
+        )
+    return txs
+
+
+# When a balance row's lot first arrived at its location: the earliest live inbound
+# posting there. ix_inventory_tx_lot_datetime walks the lot's ledger in time order,
+# so the lookup stops at the first match.
+_RECEIVED_AT = (
+    select(models.InventoryTx.tx_datetime)
+    .where(models.InventoryTx.lot_id == models.InventoryBalance.lot_id)
+    .where(models.InventoryTx.location_id == models.InventoryBalance.location_id)
+    .where(models.InventoryTx.tx_type.in_(models.INBOUND_TX_TYPES))
+    .where(models.InventoryTx.is_void.is_(False))
+    .order_by(models.InventoryTx.tx_datetime, models.InventoryTx.tx_id)
+    .limit(1)
+    .scalar_subquery()
+)
+
+# Lot order per allocation strategy. FIFO follows receipt at the location, not lot registration.
+ALLOCATION_ORDER = {
+    "FEFO": (models.Lot.mfg_date, models.Lot.lot_id),
+    "FIFO": (_RECEIVED_AT, models.Lot.lot_id),
+}
+
+
+def allocation_candidates(db: Session, product_id: int, location_id: int, strategy: str) -> list[tuple[int, int]]:
+    """``(lot_id, qty_on_hand)`` of the product's active lots with stock at ``location_id``, in picking order.
+
+    The literal ``> 0`` lets the planner use the partial ``ix_inventory_balance_in_stock``,
+    so the read touches only lots that hold stock. The rows are locked on
+    PostgreSQL so a concurrent allocation waits instead of planning on the same stock.
+    """
+    balance = models.InventoryBalance
+    lot = models.Lot
+    stmt = (
+        select(balance.lot_id, balance.qty_on_hand)
+        .join(lot, lot.lot_id == balance.lot_id)
+        .where(balance.product_id == product_id)
+        .where(balance.location_id == location_id)
+        .where(balance.qty_on_hand > literal_column("0"))
+        .where(lot.is_active.is_(True))
+        .order_by(*ALLOCATION_ORDER[strategy])
+        .with_for_update(of=balance)
+    )
+    return [tuple(row) for row in db.execute(stmt)]
+
+
+def post_allocated_outbound(db: Session, payload: schemas.InventoryAllocateCreate) -> list[models.InventoryTx]:
+    """Post ``payload.qty`` as OUT lines split across lots in FEFO or FIFO order.
+
+    Every line is a guarded decrement, as for a single outbound posting. If
+    another allocation took stock after the candidates were read, the lot is
+    re-read and only what is left is taken. When the lots cannot cover the
+    quantity, ``InsufficientStockError`` reports what could be allocated and
+    the caller rolls everything back.
+    """
+    product = assert_product_active(db, payload.product_id)
+    assert_group_active(db, product.group_id)
+    assert_location_active(db, payload.location_id)
+    now = dt.datetime.utcnow()
+    balance = models.InventoryBalance
+    remaining = payload.qty
+    txs = []
+    for lot_id, available in allocation_candidates(db, payload.product_id, payload.location_id, payload.strategy):
+        take = min(remaining, available)
+        while take > 0:
+            applied = apply_balance_delta(
+                db, payload.product_id, lot_id, -take, now, location_id=payload.location_id, min_qty=take
+            )
+            if applied is not None:
+                break
+            current = db.scalar(
+                select(balance.qty_on_hand)
+                .where(balance.product_id == payload.product_id)
+                .where(balance.lot_id == lot_id)
+                .where(balance.location_id == payload.location_id)
+            )
+            take = min(remaining, current or 0)
+        if take <= 0:
+            continue
+        txs.append(
+            models.InventoryTx(
+                tx_type=models.TxType.OUT.value,
+                tx_datetime=now,
+                product_id=payload.product_id,
+                lot_id=lot_id,
+                location_id=payload.location_id,
+                qty=take,
+                ref_doc=payload.ref_doc,
+                note=payload.note,
+            )
+        )
+        remaining -= take
+        if not remaining:
+            break
+    if remaining:
+        raise InsufficientStockError(payload.qty - remaining)
+    db.add_all(txs)
+    db.flush()
+    record_daily_volume(db, now.date(), models.TxType.OUT.value, payload.qty, len(txs))
+    for tx in txs:
+        create_audit_log(
+            db,
+            entity_type="inventory_tx",
+            entity_id=str(tx.tx_id),
+            action="CREATE",
+            changed_fields={"after": {**payload.model_dump(), "lot_id": tx.lot_id, "qty": tx.qty}},
+        )
+    return txs
+
+
+def _signed(tx_type: str, qty: int) -> int:
+    return qty if tx_type in models.INBOUND_TX_TYPES else -qty
+
+
+def _void(db: Session, tx: models.InventoryTx, now: dt.datetime) -> models.InventoryTx:
+    """Void ``tx`` and insert the REVERSAL row that records it; returns the REVERSAL row.
+
+    The void is a guarded single-row UPDATE, so two concurrent corrections of the
+    same transaction cannot both succeed.
+    """
+    if tx.tx_type == models.TxType.REVERSAL.value:
+        raise ValueError("A reversal cannot be reversed")
+    if tx.tx_type in (models.TxType.TRANSFER_OUT.value, models.TxType.TRANSFER_IN.value):
+        raise ValueError("Transfers are corrected with a transfer back")
+    voided = db.execute(
+        update(models.InventoryTx)
+        .where(models.InventoryTx.tx_id == tx.tx_id)
+        .where(models.InventoryTx.is_void.is_(False))
+        .values(is_void=True, updated_at=now)
+    ).rowcount
+    if not voided:
+        raise TransactionVoidError()
+    reversal = models.InventoryTx(
+        tx_type=models.TxType.REVERSAL.value,
+        tx_datetime=now,
+        product_id=tx.product_id,
+        lot_id=tx.lot_id,
+        location_id=tx.location_id,
+        qty=tx.qty,
+        ref_doc=tx.ref_doc,
+        is_void=True,
+        original_tx_id=tx.tx_id,
+    )
+    db.add(reversal)
+    return reversal
+
+
+def _apply_correction(
+    db: Session,
+    tx: models.InventoryTx,
+    replacement: models.InventoryTx | None,
+    now: dt.datetime,
+) -> None:
+    """Move the stock effect of ``tx`` onto ``replacement`` (or drop it) with O(1) deltas."""
+    deltas = {(tx.lot_id, tx.location_id): -_signed(tx.tx_type, tx.qty)}
+    if replacement is not None:
+        key = (replacement.lot_id, replacement.location_id)
+        deltas[key] = deltas.get(key, 0) + _signed(replacement.tx_type, replacement.qty)
+    for (lot_id, location_id), delta in deltas.items():
+        if delta:
+            apply_balance_delta(db, tx.product_id, lot_id, delta, tx.tx_datetime, location_id=location_id)
+        adjust_balance_snapshots(db, tx.product_id, lot_id, location_id, tx.tx_datetime.date(), delta)
+    new_qty = replacement.qty if replacement is not None else 0
+    record_daily_volume(db, tx.tx_datetime.date(), tx.tx_type, new_qty - tx.qty, tx_count=0 if replacement else -1)
+
+
+def _tx_fields(tx: models.InventoryTx) -> dict:
+    return {
+        "tx_id": tx.tx_id,
+        "lot_id": tx.lot_id,
+        "location_id": tx.location_id,
+        "qty": tx.qty,
+        "ref_doc": tx.ref_doc,
+        "note": tx.note,
+    }
+
+
+def reverse_transaction(db: Session, tx: models.InventoryTx, *, reason: str | None = None) -> models.InventoryTx:
+    """Cancel a posted transaction with a REVERSAL posting; returns the REVERSAL row."""
+    now = dt.datetime.utcnow()
+    reversal = _void(db, tx, now)
+    db.flush()
+    _apply_correction(db, tx, None, now)
+    create_audit_log(
+        db,
+        entity_type="inventory_tx",
+        entity_id=str(tx.tx_id),
+        action="REVERSE",
+        changed_fields={"before": _tx_fields(tx), "reversal_tx_id": reversal.tx_id},
+        reason=reason,
+    )
+    return reversal
+
+
+def correct_transaction(
+    db: Session,
+    tx: models.InventoryTx,
+    changes: dict,
+    *,
+    reason: str | None = None,
+) -> models.InventoryTx:
+    """Replace a posted transaction: REVERSAL of the original plus a corrected copy.
+
+    The copy keeps the original ``tx_datetime`` so history and snapshots read as
+    if it had been posted correctly. Balances move by the difference only; the
+    lot's ledger is never re-summed.
+    """
+    lot = assert_lot_active(db, changes.get("lot_id", tx.lot_id))
+    if lot.product_id != tx.product_id:
+        raise ValueError("Lot does not match product")
+    assert_location_active(db, changes.get("location_id", tx.location_id))
+    now = dt.datetime.utcnow()
+    reversal = _void(db, tx, now)
+    replacement = models.InventoryTx(
+        tx_type=tx.tx_type,
+        tx_datetime=tx.tx_datetime,
+        product_id=tx.product_id,
+        lot_id=changes.get("lot_id", tx.lot_id),
+        location_id=changes.get("location_id", tx.location_id),
+        qty=changes.get("qty", tx.qty),
+        ref_doc=changes.get("ref_doc", tx.ref_doc),
+        note=changes.get("note", tx.note),
+        created_by=tx.created_by,
+        original_tx_id=tx.tx_id,
+    )
+    db.add(replacement)
+    db.flush()
+    _apply_correction(db, tx, replacement, now)
+    create_audit_log(
+        db,
+        entity_type="inventory_tx",
+        entity_id=str(tx.tx_id),
+        action="UPDATE",
+        changed_fields={
+            "before": _tx_fields(tx),
+            "after": _tx_fields(replacement),
+            "reversal_tx_id": reversal.tx_id,
+        },
+        reason=reason,
+    )
+    return replacement
+
+
+def _lot_status_error(row, product_id: int) -> str | None:
+    if row is None:
+        return "Lot not found"
+    if not row.lot_active:
+        return "Lot is inactive"
+    if not row.product_active:
+        return "Product is inactive"
+    if not row.group_active:
+        return "Product group is inactive"
+    if row.product_id != product_id:
+        return "Lot does not match product"
+    return None
+
+
+def post_inventory_batch(db: Session, lines: list[schemas.InventoryBatchLine]) -> list[models.InventoryTx]:
+    lot_ids = {line.lot_id for line in lines}
+    lot_rows = {
+        row.lot_id: row
+        for row in db.execute(
+            select(
+                models.Lot.lot_id,
+                models.Lot.product_id,
+                models.Product.group_id,
+                models.Lot.is_active.label("lot_active"),
+                models.Product.is_active.label("product_active"),
+                models.ProductGroup.is_active.label("group_active"),
+            )
+            .join(models.Product, models.Lot.product_id == models.Product.product_id)
+            .join(models.ProductGroup, models.Product.group_id == models.ProductGroup.group_id)
+            .where(models.Lot.lot_id.in_(lot_ids))
+        )
+    }
+    location_errors = {}
+    for location_id in {line.location_id for line in lines}:
+        try:
+            assert_location_active(db, location_id)
+        except ValueError as exc:
+            location_errors[location_id] = str(exc)
+    balance = models.InventoryBalance
+    start_qty = {
+        (row.product_id, row.lot_id, row.location_id): row.qty_on_hand
+        for row in db.execute(
+            select(balance.product_id, balance.lot_id, balance.location_id, balance.qty_on_hand).where(
+                balance.lot_id.in_(lot_ids)
+            )
+        )
+    }
+    running = dict(start_qty)
+    deltas: dict[tuple[int, int, int], int] = {}
+    min_qty: dict[tuple[int, int, int], int] = {}
+    line_keys: dict[tuple[int, int, int], list[int]] = {}
+    errors = []
+    for index, line in enumerate(lines):
+        message = _lot_status_error(lot_rows.get(line.lot_id), line.product_id) or location_errors.get(line.location_id)
+        if message:
+            errors.append({"line": index, "message": message})
+            continue
+        key = (line.product_id, line.lot_id, line.location_id)
+        delta = line.qty if line.tx_type == models.TxType.IN.value else -line.qty
+        current_qty = running.get(key, 0)
+        if delta < 0 and not line.confirm_shortage:
+            if current_qty + delta < 0:
+                errors.append(
+                    {"line": index, "message": "Insufficient stock", "current_qty": current_qty, "requires_confirm": True}
+                )
+                continue
+            # Starting stock this line relies on, re-checked atomically when the delta is applied.
+            required = -(deltas.get(key, 0) + delta)
+            min_qty[key] = max(min_qty.get(key, required), required)
+        running[key] = current_qty + delta
+        deltas[key] = deltas.get(key, 0) + delta
+        line_keys.setdefault(key, []).append(index)
+    if errors:
+        raise BatchValidationError(errors)
+
+    now = dt.datetime.utcnow()
+    for key in min_qty:
+        product_id, lot_id, location_id = key
+        new_qty = apply_balance_delta(
+            db, product_id, lot_id, deltas.pop(key), now, location_id=location_id, min_qty=min_qty[key]
+        )
+        if new_qty is None:
+            errors.extend(
+                {"line": index, "message": "Insufficient stock", "requires_confirm": True} for index in line_keys[key]
+            )
+    if errors:
+        raise BatchValidationError(errors)
+    if deltas:
+        group_ids = {key: lot_rows[key[1]].group_id for key in deltas}
+        _upsert_balance_deltas(db, deltas, group_ids, now)
+
+    # On SQLite sort_by_parameter_order would fall back to one INSERT per line, and
+    # SQLite does not guarantee RETURNING order, so the rows are re-sorted by tx_id.
+    ordered = db.get_bind().dialect.name != "sqlite"
+    txs = (
+        db.execute(
+            insert(models.InventoryTx).returning(models.InventoryTx, sort_by_parameter_order=ordered),
+            [
+                {
+                    "tx_type": line.tx_type,
+                    "tx_datetime": now,
+                    "product_id": line.product_id,
+                    "lot_id": line.lot_id,
+                    "location_id": line.location_id,
+                    "qty": line.qty,
+                    "ref_doc": line.ref_doc,
+                    "note": line.note,
+                }
+                for line in lines
+            ],
+        )
+        .scalars()
+        .all()
+    )
+    if not ordered:
+        txs.sort(key=lambda tx: tx.tx_id)
+    volume: dict[str, tuple[int, int]] = {}
+    for line in lines:
+        qty, tx_count = volume.get(line.tx_type, (0, 0))
+        volume[line.tx_type] = (qty + line.qty, tx_count + 1)
+    for tx_type, (qty, tx_count) in volume.items():
+        record_daily_volume(db, now.date(), tx_type, qty, tx_count)
+    db.execute(
+        insert(audit.audit_table()),
+        [
+            {
+                "entity_type": "inventory_tx",
+                "entity_id": str(tx.tx_id),
+                "action": "CREATE",
+                "changed_fields": {"after": line.model_dump()},
+                "created_at": now,
+            }
+            for tx, line in zip(txs, lines)
+        ],
+    )
+    return txs
+
+
+def dialect_insert(db: Session):
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+def apply_balance_delta(
+    db: Session,
+    product_id: int,
+    lot_id: int,
+    delta: int,
+    tx_datetime: dt.datetime,
+    *,
+    location_id: int = models.DEFAULT_LOCATION_ID,
+    min_qty: int | None = None,
+) -> int | None:
+    """Atomically add ``delta`` to a lot's balance at ``location_id`` and return the new quantity.
+
+    ``tx_datetime`` is recorded as the lot's last movement in the same statement
+    unless a later one is already stored (corrections post at the original time).
+
+    When ``min_qty`` is given the delta is only applied if the stored quantity is
+    at least ``min_qty``; otherwise nothing is written and ``None`` is returned.
+    The check and the write are a single statement, so concurrent postings can
+    neither lose updates nor both pass the same shortage check.
+    """
+    now = dt.datetime.utcnow()
+    balance = models.InventoryBalance
+    if min_qty is not None and min_qty > 0:
+        # A missing row counts as zero stock and can never satisfy the guard.
+        new_qty = db.execute(
+            update(balance)
+            .where(balance.product_id == product_id)
+            .where(balance.lot_id == lot_id)
+            .where(balance.location_id == location_id)
+            .where(balance.qty_on_hand >= min_qty)
+            .values(qty_on_hand=balance.qty_on_hand + delta, last_tx_datetime=_later(tx_datetime), updated_at=now)
+            .returning(balance.qty_on_hand)
+        ).scalar_one_or_none()
+    else:
+        new_qty = _upsert_balance_delta(db, product_id, lot_id, location_id, delta, tx_datetime, min_qty, now)
+    if new_qty is not None:
+        apply_stock_summary_delta(db, product_id, delta)
+    return new_qty
+
+
+def _upsert_balance_delta(
+    db: Session,
+    product_id: int,
+    lot_id: int,
+    location_id: int,
+    delta: int,
+    tx_datetime: dt.datetime,
+    min_qty: int | None,
+    now: dt.datetime,
+) -> int | None:
+    balance = models.InventoryBalance
+    stmt = dialect_insert(db)(balance).values(
+        product_id=product_id,
+        lot_id=lot_id,
+        location_id=location_id,
+        qty_on_hand=delta,
+        last_tx_datetime=tx_datetime,
+        updated_at=now,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[balance.product_id, balance.lot_id, balance.location_id],
+        set_={
+            "qty_on_hand": balance.qty_on_hand + stmt.excluded.qty_on_hand,
+            "last_tx_datetime": _later(stmt.excluded.last_tx_datetime),
+            "updated_at": stmt.excluded.updated_at,
+        },
+        where=balance.qty_on_hand >= min_qty if min_qty is not None else None,
+    )
+    return db.execute(stmt.returning(balance.qty_on_hand)).scalar_one_or_none()
+
+
+def _later(tx_datetime):
+    stored = models.InventoryBalance.last_tx_datetime
+    return case((stored > tx_datetime, stored), else_=tx_datetime)
+
+
+def _upsert_balance_deltas(
+    db: Session,
+    deltas: dict[tuple[int, int, int], int],
+    group_ids: dict[tuple[int, int, int], int],
+    now: dt.datetime,
+) -> None:
+    """Apply unguarded balance deltas for many lots with one executemany upsert.
+
+    Dialect upserts are not statement-cached, so batching them matters for
+    large postings; the group counters are folded per group the same way.
+    """
+    balance = models.InventoryBalance
+    stmt = dialect_insert(db)(balance)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[balance.product_id, balance.lot_id, balance.location_id],
+        set_={
+            "qty_on_hand": balance.qty_on_hand + stmt.excluded.qty_on_hand,
+            "last_tx_datetime": stmt.excluded.last_tx_datetime,
+            "updated_at": stmt.excluded.updated_at,
+        },
+    ).returning(balance.product_id, balance.lot_id, balance.location_id, balance.qty_on_hand, sort_by_parameter_order=True)
+    rows = db.execute(
+        stmt,
+        [
+            {
+                "product_id": product_id,
+                "lot_id": lot_id,
+                "location_id": location_id,
+                "qty_on_hand": delta,
+                "last_tx_datetime": now,
+                "updated_at": now,
+            }
+            for (product_id, lot_id, location_id), delta in deltas.items()
+        ],
+    ).all()
+    group_deltas: dict[int, int] = {}
+    for row in rows:
+        key = (row.product_id, row.lot_id, row.location_id)
+        group_deltas[group_ids[key]] = group_deltas.get(group_ids[key], 0) + deltas[key]
+    summary = models.GroupStockSummary
+    stmt = dialect_insert(db)(summary)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[summary.group_id],
+            set_={
+                "qty_on_hand": summary.qty_on_hand + stmt.excluded.qty_on_hand,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ),
+        [{"group_id": group_id, "qty_on_hand": qty, "updated_at": now} for group_id, qty in group_deltas.items()],
+    )
+
+
+def apply_stock_summary_delta(db: Session, product_id: int, qty_delta: int) -> None:
+    """Fold a balance change of ``product_id`` into its group's dashboard counters."""
+    if not qty_delta:
+        return
+    summary = models.GroupStockSummary
+    stmt = dialect_insert(db)(summary).from_select(
+        ["group_id", "qty_on_hand", "updated_at"],
+        select(
+            models.Product.group_id,
+            literal(qty_delta, Integer),
+            literal(dt.datetime.utcnow(), DateTime),
+        ).where(models.Product.product_id == product_id),
+    )
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[summary.group_id],
+            set_={
+                "qty_on_hand": summary.qty_on_hand + stmt.excluded.qty_on_hand,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        )
+    )
 
 
-def recalc_balance_for_lot(db: Session, product_id: int, lot_id: int) -> int:
-    in_qty = db.execute(
-        select(func.coalesce(func.sum(models.InventoryTx.qty), 0))
-        .where(models.InventoryTx.product_id == product_id)
-        .where(models.InventoryTx.lot_id == lot_id)
-        .where(models.InventoryTx.tx_type == models.TxType.IN.value)
+def move_product_stock_summary(db: Session, product_id: int, from_group_id: int, to_group_id: int) -> None:
+    """Shift a product's stock between group counters when it changes group."""
+    balance = models.InventoryBalance
+    qty_on_hand = db.execute(
+        select(func.coalesce(func.sum(balance.qty_on_hand), 0)).where(balance.product_id == product_id)
     ).scalar_one()
-    out_qty = db.execute(
-        select(func.coalesce(func.sum(models.InventoryTx.qty), 0))
-        .where(models.InventoryTx.product_id == product_id)
-        .where(models.InventoryTx.lot_id == lot_id)
-        .where(models.InventoryTx.tx_type == models.TxType.OUT.value)
+    if not qty_on_hand:
+        return
+    summary = models.GroupStockSummary
+    now = dt.datetime.utcnow()
+    for group_id, sign in ((from_group_id, -1), (to_group_id, 1)):
+        stmt = dialect_insert(db)(summary).values(group_id=group_id, qty_on_hand=sign * int(qty_on_hand), updated_at=now)
+        db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=[summary.group_id],
+                set_={
+                    "qty_on_hand": summary.qty_on_hand + stmt.excluded.qty_on_hand,
+                    "updated_at": stmt.excluded.updated_at,
+                },
+            )
+        )
+
+
+def apply_master_count_deltas(db: Session, deltas: dict[int, tuple[int, int]]) -> None:
+    """Fold ``{group_id: (product_delta, lot_delta)}`` into the groups' active product and lot counters."""
+    now = dt.datetime.utcnow()
+    rows = [
+        {
+            "group_id": group_id,
+            "qty_on_hand": 0,
+            "product_count": products,
+            "lot_count": lots,
+            "updated_at": now,
+        }
+        for group_id, (products, lots) in sorted(deltas.items())
+        if products or lots
+    ]
+    if not rows:
+        return
+    summary = models.GroupStockSummary
+    stmt = dialect_insert(db)(summary)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[summary.group_id],
+            set_={
+                "product_count": summary.product_count + stmt.excluded.product_count,
+                "lot_count": summary.lot_count + stmt.excluded.lot_count,
+                "updated_at": stmt.excluded.updated_at,
+            },
+        ),
+        rows,
+    )
+
+
+def update_product_master_counts(
+    db: Session, product_id: int, old_group_id: int, old_active: bool, new_group_id: int, new_active: bool
+) -> None:
+    """Adjust the group counters for a product that changed group or was (de)activated."""
+    if old_group_id == new_group_id:
+        apply_master_count_deltas(db, {new_group_id: (int(new_active) - int(old_active), 0)})
+        return
+    lot = models.Lot
+    active_lots = db.execute(
+        select(func.count()).select_from(lot).where(lot.product_id == product_id).where(lot.is_active.is_(True))
     ).scalar_one()
-    qty_on_hand = int(in_qty) - int(out_qty)
-    balance = db.get(models.InventoryBalance, {"product_id": product_id, "lot_id": lot_id})
-    if balance:
-        balance.qty_on_hand = qty_on_hand
+    apply_master_count_deltas(
+        db, {old_group_id: (-int(old_active), -active_lots), new_group_id: (int(new_active), active_lots)}
+    )
+
+
+def update_lot_master_counts(
+    db: Session, old_product_id: int, old_active: bool, new_product_id: int, new_active: bool
+) -> None:
+    """Adjust the group counters for a lot that moved to another product or was (de)activated."""
+    if (old_product_id, old_active) == (new_product_id, new_active):
+        return
+    product = models.Product
+    group_of = dict(
+        db.execute(
+            select(product.product_id, product.group_id).where(product.product_id.in_({old_product_id, new_product_id}))
+        ).all()
+    )
+    deltas: dict[int, tuple[int, int]] = {}
+    for product_id, lots in ((old_product_id, -int(old_active)), (new_product_id, int(new_active))):
+        group_id = group_of[product_id]
+        deltas[group_id] = (0, deltas.get(group_id, (0, 0))[1] + lots)
+    apply_master_count_deltas(db, deltas)
+
+
+def record_daily_volume(db: Session, tx_date: dt.date, tx_type: str, qty: int, tx_count: int = 1) -> None:
+    if not qty and not tx_count:
+        return
+    metrics.record_posting(db, tx_type, tx_count, qty)
+    summary = models.DailyTxSummary
+    stmt = dialect_insert(db)(summary).values(tx_date=tx_date, tx_type=tx_type, tx_count=tx_count, qty=qty)
+    db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[summary.tx_date, summary.tx_type],
+            set_={
+                "tx_count": summary.tx_count + stmt.excluded.tx_count,
+                "qty": summary.qty + stmt.excluded.qty,
+            },
+        )
+    )
+
+
+def get_dashboard_summary(db: Session, today: dt.date) -> schemas.DashboardSummaryOut:
+    groups = db.execute(
+        select(
+            models.ProductGroup.group_id,
+            models.ProductGroup.group_name,
+            func.coalesce(models.GroupStockSummary.qty_on_hand, 0).label("qty_on_hand"),
+            func.coalesce(models.GroupStockSummary.product_count, 0).label("product_count"),
+            func.coalesce(models.GroupStockSummary.lot_count, 0).label("lot_count"),
+        )
+        .outerjoin(models.GroupStockSummary, models.GroupStockSummary.group_id == models.ProductGroup.group_id)
+        .order_by(models.ProductGroup.group_name)
+    ).all()
+    # A lot short at several locations counts once. Negative rows are rare and the
+    # partial ix_inventory_balance_negative holds only them.
+    balance = models.InventoryBalance
+    negative_lots = dict(
+        db.execute(
+            select(models.Product.group_id, func.count(balance.lot_id.distinct()))
+            .select_from(balance)
+            .join(models.Product, models.Product.product_id == balance.product_id)
+            .where(balance.qty_on_hand < literal_column("0"))
+            .group_by(models.Product.group_id)
+        ).all()
+    )
+    volume = {
+        row.tx_type: row.qty
+        for row in db.execute(
+            select(models.DailyTxSummary.tx_type, models.DailyTxSummary.qty).where(models.DailyTxSummary.tx_date == today)
+        )
+    }
+    return schemas.DashboardSummaryOut(
+        product_count=sum(row.product_count for row in groups),
+        lot_count=sum(row.lot_count for row in groups),
+        total_qty=sum(row.qty_on_hand for row in groups),
+        negative_lot_count=sum(negative_lots.values()),
+        today_in_qty=volume.get(models.TxType.IN.value, 0),
+        today_out_qty=volume.get(models.TxType.OUT.value, 0),
+        groups=[
+            schemas.GroupSummaryOut(
+                group_id=row.group_id,
+                group_name=row.group_name,
+                qty_on_hand=row.qty_on_hand,
+                negative_lot_count=negative_lots.get(row.group_id, 0),
+            )
+            for row in groups
+        ],
+    )
+
+
+def get_balance_qty(db: Session, product_id: int, lot_id: int, location_id: int = models.DEFAULT_LOCATION_ID) -> int:
+    balance = db.get(models.InventoryBalance, {"product_id": product_id, "lot_id": lot_id, "location_id": location_id})
+    return balance.qty_on_hand if balance else 0
+
+
+def encode_cursor(at: dt.datetime, row_id: int) -> str:
+    """Opaque keyset cursor for listings ordered by ``(timestamp, id)`` descending."""
+    raw = json.dumps([at.isoformat(), row_id]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[dt.datetime, int]:
+    try:
+        raw_datetime, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return dt.datetime.fromisoformat(raw_datetime), int(row_id)
+    except (ValueError, TypeError) as exc:
+        raise ValueError("Invalid cursor") from exc
+
+
+def transactions_stmt(
+    db: Session,
+    *,
+    start_datetime: dt.datetime | None = None,
+    end_datetime: dt.datetime | None = None,
+    product_code: str | None = None,
+    lot_id: int | None = None,
+    location_id: int | None = None,
+    cursor: str | None = None,
+) -> Select:
+    tx = models.InventoryTx
+    stmt = select(tx)
+    if start_datetime:
+        stmt = stmt.where(tx.tx_datetime >= start_datetime)
+    if end_datetime:
+        stmt = stmt.where(tx.tx_datetime <= end_datetime)
+    if lot_id:
+        stmt = stmt.where(tx.lot_id == lot_id)
+    if location_id:
+        stmt = stmt.where(tx.location_id == location_id)
+    if product_code:
+        stmt = stmt.join(models.Product, tx.product_id == models.Product.product_id).where(
+            search.contains(db, models.Product.product_code, product_code)
+        )
+    if cursor:
+        cursor_datetime, cursor_tx_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            or_(
+                tx.tx_datetime < cursor_datetime,
+                and_(tx.tx_datetime == cursor_datetime, tx.tx_id < cursor_tx_id),
+            )
+        )
+    return stmt.order_by(tx.tx_datetime.desc(), tx.tx_id.desc())
+
+
+TX_OUT_COLUMNS = serialization.columns(models.InventoryTx, schemas.InventoryTxOut)
+AUDIT_LOG_OUT_COLUMNS = serialization.columns(models.AuditLog, schemas.AuditLogOut)
+
+
+def page_transactions(db: Session, stmt: Select, limit: int) -> tuple[list[dict], str | None]:
+    """One page of ``transactions_stmt`` as ``InventoryTxOut``-shaped dicts, plus the next cursor."""
+    rows = serialization.row_dicts(db.execute(stmt.with_only_columns(*TX_OUT_COLUMNS).limit(limit + 1)))
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]["tx_datetime"], rows[-1]["tx_id"])
+
+
+def audit_logs_stmt(
+    *,
+    entity_type: str | None = None,
+    entity_id: str | None = None,
+    cursor: str | None = None,
+) -> Select:
+    log = models.AuditLog
+    stmt = select(log)
+    if entity_type:
+        stmt = stmt.where(log.entity_type == entity_type)
+    if entity_id:
+        stmt = stmt.where(log.entity_id == entity_id)
+    if cursor:
+        cursor_created_at, cursor_audit_id = decode_cursor(cursor)
+        stmt = stmt.where(
+            or_(
+                log.created_at < cursor_created_at,
+                and_(log.created_at == cursor_created_at, log.audit_id < cursor_audit_id),
+            )
+        )
+    return stmt.order_by(log.created_at.desc(), log.audit_id.desc())
+
+
+def page_audit_logs(db: Session, stmt: Select, limit: int) -> tuple[list[dict], str | None]:
+    rows = serialization.row_dicts(db.execute(stmt.with_only_columns(*AUDIT_LOG_OUT_COLUMNS).limit(limit + 1)))
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, encode_cursor(rows[-1]["created_at"], rows[-1]["audit_id"])
+
+
+def balance_stmt(
+    db: Session,
+    *,
+    group_id: int | None = None,
+    product_code: str | None = None,
+    mfg_date_from: dt.date | None = None,
+    mfg_date_to: dt.date | None = None,
+    lot_no: str | None = None,
+    location_id: int | None = None,
+    by_location: bool = False,
+    as_of: dt.date | None = None,
+) -> Select:
+    """Stock per lot, rolled up across locations unless ``location_id`` or ``by_location`` is given.
+
+    Filters are applied to the balance rows before they are grouped, so a
+    filtered roll-up reads only the matching lots.
+    """
+    source = balance_as_of(db, as_of) if as_of else models.InventoryBalance.__table__
+    names = (
+        models.ProductGroup.group_name,
+        models.Product.product_code,
+        models.Product.product_name,
+        models.Lot.mfg_date,
+        models.Lot.lot_no,
+    )
+    if location_id or by_location:
+        stmt = select(
+            *names,
+            source.c.qty_on_hand,
+            source.c.last_tx_datetime,
+            models.Location.location_code,
+        ).join(models.Location, source.c.location_id == models.Location.location_id)
     else:
-        balance = models.InventoryBalance(product_id=product_id, lot_id=lot_id, qty_on_hand=qty_on_hand)
-        db.add(balance)
-    return qty_on_hand
+        stmt = select(
+            *names,
+            func.sum(source.c.qty_on_hand).label("qty_on_hand"),
+            func.max(source.c.last_tx_datetime).label("last_tx_datetime"),
+            null().label("location_code"),
+        ).group_by(source.c.product_id, source.c.lot_id, *names)
+    stmt = (
+        stmt.select_from(source)
+        .join(models.Product, source.c.product_id == models.Product.product_id)
+        .join(models.ProductGroup, models.Product.group_id == models.ProductGroup.group_id)
+        .join(models.Lot, source.c.lot_id == models.Lot.lot_id)
+    )
+
+    filters = []
+    if location_id:
+        filters.append(source.c.location_id == location_id)
+    if group_id:
+        filters.append(models.Product.group_id == group_id)
+    if product_code:
+        filters.append(search.contains(db, models.Product.product_code, product_code))
+    if mfg_date_from:
+        filters.append(models.Lot.mfg_date >= mfg_date_from)
+    if mfg_date_to:
+        filters.append(models.Lot.mfg_date <= mfg_date_to)
+    if lot_no:
+        filters.append(search.contains(db, models.Lot.lot_no, lot_no))
+    if filters:
+        stmt = stmt.where(and_(*filters))
+    return stmt.order_by(models.Product.product_code, models.Lot.mfg_date, models.Lot.lot_no, "location_code")
+
+
+BALANCE_OUT_FIELDS = tuple(schemas.BalanceOut.model_fields)
+
+
+def list_balance(db: Session, **filters) -> list[dict]:
+    """``BalanceOut``-shaped dicts; ``balance_stmt`` selects its columns in the schema's field order."""
+    return [dict(zip(BALANCE_OUT_FIELDS, row)) for row in db.execute(balance_stmt(db, **filters))]
+
+
+def _day_start(day: dt.date) -> dt.datetime:
+    return dt.datetime.combine(day, dt.time.min)
+
+
+def balance_as_of(db: Session, as_of: dt.date):
+    """Stock per lot and location at the end of ``as_of`` (UTC) as a subquery.
+
+    Starts from the latest snapshot on or before ``as_of`` and adds only the
+    ledger rows after it, so the cost is one snapshot period of activity.
+    """
+    snapshot = models.BalanceSnapshot
+    base_date = db.scalar(select(func.max(snapshot.snapshot_date)).where(snapshot.snapshot_date <= as_of))
+    return _balance_from_snapshot(base_date, as_of)
+
+
+def _balance_from_snapshot(base_date: dt.date | None, as_of: dt.date):
+    snapshot = models.BalanceSnapshot
+    tx = models.InventoryTx
+    delta = (
+        select(
+            tx.product_id,
+            tx.lot_id,
+            tx.location_id,
+            func.sum(_signed_qty()).label("qty_on_hand"),
+            func.max(tx.tx_datetime).label("last_tx_datetime"),
+        )
+        .where(tx.tx_datetime < _day_start(as_of + dt.timedelta(days=1)))
+        .where(tx.is_void.is_(False))
+        .group_by(tx.product_id, tx.lot_id, tx.location_id)
+    )
+    parts = [delta]
+    if base_date is not None:
+        parts[0] = delta.where(tx.tx_datetime >= _day_start(base_date + dt.timedelta(days=1)))
+        parts.append(
+            select(
+                snapshot.product_id,
+                snapshot.lot_id,
+                snapshot.location_id,
+                snapshot.qty_on_hand,
+                snapshot.last_tx_datetime,
+            ).where(snapshot.snapshot_date == base_date)
+        )
+    combined = union_all(*parts).subquery()
+    return (
+        select(
+            combined.c.product_id,
+            combined.c.lot_id,
+            combined.c.location_id,
+            func.sum(combined.c.qty_on_hand).label("qty_on_hand"),
+            func.max(combined.c.last_tx_datetime).label("last_tx_datetime"),
+        )
+        .group_by(combined.c.product_id, combined.c.lot_id, combined.c.location_id)
+        .subquery()
+    )
+
+
+def take_balance_snapshot(db: Session, snapshot_date: dt.date) -> int:
+    """Write (or rewrite) the end-of-day stock of every lot and location for ``snapshot_date``.
+
+    Only completed UTC days can be snapshotted. The previous snapshot is used as
+    the starting point, so a daily or monthly job reads one period of ledger.
+    """
+    if snapshot_date >= dt.datetime.utcnow().date():
+        raise ValueError("Snapshot date must be a completed day")
+    snapshot = models.BalanceSnapshot
+    base_date = db.scalar(select(func.max(snapshot.snapshot_date)).where(snapshot.snapshot_date < snapshot_date))
+    source = _balance_from_snapshot(base_date, snapshot_date)
+    stmt = dialect_insert(db)(snapshot).from_select(
+        ["snapshot_date", "product_id", "lot_id", "location_id", "qty_on_hand", "last_tx_datetime"],
+        select(
+            literal(snapshot_date, Date),
+            source.c.product_id,
+            source.c.lot_id,
+            source.c.location_id,
+            source.c.qty_on_hand,
+            source.c.last_tx_datetime,
+        ).where(true()),
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[snapshot.snapshot_date, snapshot.lot_id, snapshot.location_id],
+        set_={
+            "qty_on_hand": stmt.excluded.qty_on_hand,
+            "last_tx_datetime": stmt.excluded.last_tx_datetime,
+        },
+    )
+    return db.execute(stmt).rowcount
+
+
+def adjust_balance_snapshots(
+    db: Session,
+    product_id: int,
+    lot_id: int,
+    location_id: int,
+    from_date: dt.date,
+    delta: int,
+) -> None:
+    """Carry a correction to a past transaction into the snapshots taken on or after its day."""
+    if delta == 0:
+        return
+    snapshot = models.BalanceSnapshot
+    affected = (
+        select(
+            snapshot.snapshot_date,
+            literal(product_id, Integer),
+            literal(lot_id, Integer),
+            literal(location_id, Integer),
+            literal(delta, Integer),
+        )
+        .where(snapshot.snapshot_date >= from_date)
+        .distinct()
+    )
+    stmt = dialect_insert(db)(snapshot).from_select(
+        ["snapshot_date", "product_id", "lot_id", "location_id", "qty_on_hand"], affected
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[snapshot.snapshot_date, snapshot.lot_id, snapshot.location_id],
+        set_={"qty_on_hand": snapshot.qty_on_hand + stmt.excluded.qty_on_hand},
+    )
+    db.execute(stmt)
+
+
+def _signed_qty():
+    return case(
+        (models.InventoryTx.tx_type.in_(models.INBOUND_TX_TYPES), models.InventoryTx.qty),
+        else_=-models.InventoryTx.qty,
+    )
+
+
+def rebuild_balances(db: Session, product_from: int, product_to: int) -> list[dict]:
+    """Recompute every balance row for products in ``[product_from, product_to]``.
+
+    Postings to the range wait until the caller's transaction ends. On
+    PostgreSQL the product rows are locked FOR UPDATE, which conflicts with the
+    key-share lock a ledger insert takes on its product, and the balance rows
+    are locked against corrections. SQLite takes its single write lock up
+    front. The stored quantities and the one ``INSERT ... SELECT`` over the
+    ledger therefore see the same data.
+
+    Returns the lots whose stored quantity disagreed with the ledger.
+    """
+    tx = models.InventoryTx
+    balance = models.InventoryBalance
+    product = models.Product
+    in_range = balance.product_id.between(product_from, product_to)
+    if db.get_bind().dialect.name == "sqlite":
+        # A write that matches nothing still begins the write transaction.
+        db.execute(update(balance).where(false()).values(updated_at=balance.updated_at))
+    db.execute(select(product.product_id).where(product.product_id.between(product_from, product_to)).with_for_update())
+    stored = {
+        (row.product_id, row.lot_id, row.location_id): row.qty_on_hand
+        for row in db.execute(
+            select(balance.product_id, balance.lot_id, balance.location_id, balance.qty_on_hand)
+            .where(in_range)
+            .with_for_update()
+        )
+    }
+    now = dt.datetime.utcnow()
+    ledger_qty = (
+        select(
+            tx.product_id,
+            tx.lot_id,
+            tx.location_id,
+            func.sum(_signed_qty()).label("qty_on_hand"),
+            func.max(tx.tx_datetime).label("last_tx_datetime"),
+            literal(now, DateTime).label("updated_at"),
+        )
+        .where(tx.product_id.between(product_from, product_to))
+        .where(tx.is_void.is_(False))
+        .group_by(tx.product_id, tx.lot_id, tx.location_id)
+    )
+    stmt = dialect_insert(db)(balance).from_select(
+        ["product_id", "lot_id", "location_id", "qty_on_hand", "last_tx_datetime", "updated_at"], ledger_qty
+    )
+    key_and_qty = (balance.product_id, balance.lot_id, balance.location_id, balance.qty_on_hand)
+    rewritten = db.execute(
+        stmt.on_conflict_do_update(
+            index_elements=[balance.product_id, balance.lot_id, balance.location_id],
+            set_={
+                "qty_on_hand": stmt.excluded.qty_on_hand,
+                "last_tx_datetime": stmt.excluded.last_tx_datetime,
+                "updated_at": stmt.excluded.updated_at,
+            },
+            where=or_(
+                balance.qty_on_hand != stmt.excluded.qty_on_hand,
+                balance.last_tx_datetime.is_distinct_from(stmt.excluded.last_tx_datetime),
+            ),
+        ).returning(*key_and_qty)
+    ).all()
+    # Rows whose ledger is gone (all voided) are kept, empty and with no last movement.
+    has_ledger = (
+        select(tx.tx_id)
+        .where(tx.product_id == balance.product_id)
+        .where(tx.lot_id == balance.lot_id)
+        .where(tx.location_id == balance.location_id)
+        .where(tx.is_void.is_(False))
+        .exists()
+    )
+    emptied = db.execute(
+        update(balance)
+        .where(in_range)
+        .where(~has_ledger)
+        .where(or_(balance.qty_on_hand != 0, balance.last_tx_datetime.is_not(None)))
+        .values(qty_on_hand=0, last_tx_datetime=None, updated_at=now)
+        .returning(*key_and_qty)
+        .execution_options(synchronize_session=False)
+    ).all()
+    drift = [
+        {
+            "product_id": row.product_id,
+            "lot_id": row.lot_id,
+            "location_id": row.location_id,
+            "stored_qty": stored.get((row.product_id, row.lot_id, row.location_id)),
+            "ledger_qty": row.qty_on_hand,
+        }
+        for row in sorted(rewritten + emptied)
+        if stored.get((row.product_id, row.lot_id, row.location_id)) != row.qty_on_hand
+    ]
+    for item in drift:
+        apply_stock_summary_delta(db, item["product_id"], item["ledger_qty"] - (item["stored_qty"] or 0))
+    return drift
 
 
 def create_audit_log(
@@ -80,7 +1302,7 @@ def create_audit_log(
     actor: str | None = None,
 ) -> None:
     db.add(
-        models.AuditLog(
+        audit.audit_table()(
             entity_type=entity_type,
             entity_id=entity_id,
             action=action,
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+import datetime as dt
+import importlib
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture()
+def client(tmp_path, monkeypatch):
+    db_path = tmp_path / "test.db"
+    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{db_path}")
+    monkeypatch.setenv("IMPORT_DIR", str(tmp_path / "imports"))
+    monkeypatch.setenv("AUDIT_ARCHIVE_DIR", str(tmp_path / "audit_archive"))
+
+    import app.main  # noqa: F401  ensure every module is imported before reloading
+
+    from app import profiling as profiling_module
+
+    importlib.reload(profiling_module)
+
+    from app import db as db_module
+
+    importlib.reload(db_module)
+
+    from app import models as models_module
+
+    importlib.reload(models_module)
+
+    from app import audit as audit_module
+
+    importlib.reload(audit_module)
+
+    from app import cache as cache_module
+
+    importlib.reload(cache_module)
+
+    from app import search as search_module
+
+    importlib.reload(search_module)
+
+    from app import services as services_module
+
+    importlib.reload(services_module)
+
+    from app import importer as importer_module
+
+    importlib.reload(importer_module)
+
+    from app.api import routes as routes_module
+
+    importlib.reload(routes_module)
+
+    from app.api import async_routes as async_routes_module
+
+    importlib.reload(async_routes_module)
+
+    from app import main as main_module
+
+    importlib.reload(main_module)
+
+    db_module.Base.metadata.create_all(bind=db_module.engine)
+    if db_module.read_engine is not db_module.engine:
+        db_module.Base.metadata.create_all(bind=db_module.read_engine)
+
+    with TestClient(main_module.app) as test_client:
+        yield test_client
+
+
+@pytest.fixture()
+def master_data(client: TestClient):
+    group = client.post("/product-groups", json={"group_name": "Food"}).json()
+    product = client.post(
+        "/products",
+        json={
+            "group_id": group["group_id"],
+            "product_code": "P001",
+            "product_name": "Apple",
+            "spec": "Spec",
+        },
+    ).json()
+    lot = client.post(
+        "/lots",
+        json={
+            "product_id": product["product_id"],
+            "mfg_date": dt.date.today().isoformat(),
+            "lot_no": "L001",
+        },
+    ).json()
+    return {"group": group, "product": product, "lot": lot}
@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import json
+
+from fastapi.testclient import TestClient
+
+
+def test_async_posting_and_listing(client: TestClient, master_data):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+
+    inbound = client.post("/async/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 10})
+    assert inbound.status_code == 201
+    assert inbound.json()["created_at"]
+    assert client.post("/async/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 4}).status_code == 201
+    shortage = client.post("/async/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 40})
+    assert shortage.status_code == 409
+    assert shortage.json()["detail"]["current_qty"] == 6
+    batch = client.post(
+        "/async/inventory/batch",
+        json={"lines": [{"tx_type": "IN", "product_id": product_id, "lot_id": lot_id, "qty": 1}]},
+    )
+    assert batch.status_code == 201
+
+    balance = client.get("/async/inventory/balance", params={"product_code": "P001"}).json()
+    assert [row["qty_on_hand"] for row in balance] == [7]
+    assert client.get("/inventory/balance").json() == balance
+
+    page = client.get("/async/inventory/transactions", params={"limit": 2})
+    assert len(page.json()) == 2
+    rest = client.get("/async/inventory/transactions", params={"cursor": page.headers["X-Next-Cursor"]}).json()
+    stream = client.get("/async/inventory/transactions", params={"format": "ndjson", "product_code": "P00"})
+    streamed = [json.loads(line)["tx_id"] for line in stream.text.splitlines()]
+    assert streamed == [tx["tx_id"] for tx in page.json() + rest]
+    bad_cursor = client.get("/async/inventory/transactions", params={"cursor": "bogus"})
+    assert bad_cursor.status_code == 400
+    assert bad_cursor.json() == client.get("/inventory/transactions", params={"cursor": "bogus"}).json()
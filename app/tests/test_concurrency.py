@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+
+from fastapi.testclient import TestClient
+
+WORKERS = 8
+POSTINGS_PER_WORKER = 15
+
+
+def _balance(client: TestClient) -> int:
+    return client.get("/inventory/balance").json()[0]["qty_on_hand"]
+
+
+def test_concurrent_postings_keep_balance_exact(client: TestClient, master_data):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    assert client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 1000}).status_code == 201
+
+    def worker(index: int) -> list[int]:
+        statuses = []
+        for _ in range(POSTINGS_PER_WORKER):
+            path = "/inventory/in" if index % 2 else "/inventory/out"
+            response = client.post(path, json={"product_id": product_id, "lot_id": lot_id, "qty": 3})
+            statuses.append(response.status_code)
+        return statuses
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = [status for statuses in pool.map(worker, range(WORKERS)) for status in statuses]
+
+    assert results == [201] * (WORKERS * POSTINGS_PER_WORKER)
+    assert _balance(client) == 1000
+
+
+def test_concurrent_outbound_cannot_oversell(client: TestClient, master_data):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    assert client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 10}).status_code == 201
+
+    def take(_: int) -> int:
+        return client.post("/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 1}).status_code
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(take, range(40)))
+
+    assert results.count(201) == 10
+    assert results.count(409) == 30
+    assert _balance(client) == 0
+    outbound = client.get("/inventory/transactions", params={"limit": 1000}).json()
+    assert sum(1 for tx in outbound if tx["tx_type"] == "OUT") == 10
+
+
+def test_sqlite_connections_use_wal_and_busy_timeout(client: TestClient):
+    from sqlalchemy import text
+
+    from app import db as db_module
+
+    with db_module.engine.connect() as conn:
+        assert conn.execute(text("PRAGMA journal_mode")).scalar() == "wal"
+        assert conn.execute(text("PRAGMA synchronous")).scalar() == 1  # NORMAL
+        assert conn.execute(text("PRAGMA busy_timeout")).scalar() == db_module.SQLITE_BUSY_TIMEOUT_MS
+    assert db_module.engine.pool.size() == db_module.DB_POOL_SIZE
+
+
+def test_concurrent_allocations_cannot_double_allocate(client: TestClient, master_data):
+    product_id = master_data["product"]["product_id"]
+    for lot_no, mfg_date in (("A", "2024-01-01"), ("B", "2024-02-01"), ("C", "2024-03-01")):
+        lot = client.post("/lots", json={"product_id": product_id, "mfg_date": mfg_date, "lot_no": lot_no}).json()
+        client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot["lot_id"], "qty": 5})
+
+    def allocate(_: int) -> int:
+        return client.post("/inventory/out/allocate", json={"product_id": product_id, "qty": 2}).status_code
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(allocate, range(12)))
+
+    assert results.count(201) == 7
+    assert results.count(409) == 5
+    assert sum(row["qty_on_hand"] for row in client.get("/inventory/balance").json()) == 1
+    outbound = client.get("/inventory/transactions", params={"limit": 1000}).json()
+    assert sum(tx["qty"] for tx in outbound if tx["tx_type"] == "OUT") == 14
+
+
+def test_concurrent_retries_with_one_idempotency_key_post_once(client: TestClient, master_data):
+    body = {"product_id": master_data["product"]["product_id"], "lot_id": master_data["lot"]["lot_id"], "qty": 7}
+
+    def post(index: int):
+        path = "/async/inventory/in" if index % 2 else "/inventory/in"
+        response = client.post(path, json=body, headers={"Idempotency-Key": "scanner-42/0001"})
+        return response.status_code, response.json()["tx_id"]
+
+    with ThreadPoolExecutor(max_workers=WORKERS) as pool:
+        results = list(pool.map(post, range(24)))
+
+    assert {status for status, _ in results} == {201}
+    assert len({tx_id for _, tx_id in results}) == 1
+    assert _balance(client) == 7
+    assert len(client.get("/inventory/transactions").json()) == 1
+
+
+def test_posting_during_rebuild_is_kept(client: TestClient, master_data):
+    import threading
+
+    from sqlalchemy import event, text
+
+    from app import db as db_module
+    from app import services
+
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    assert client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 10}).status_code == 201
+    with db_module.engine.begin() as conn:
+        conn.execute(text("UPDATE inventory_balance SET qty_on_hand = 99"))
+        conn.execute(text("UPDATE group_stock_summary SET qty_on_hand = 99"))
+
+    posted = []
+    posting = threading.Thread(
+        target=lambda: posted.append(
+            client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 5}).status_code
+        )
+    )
+
+    def post_mid_rebuild(conn, cursor, statement, parameters, context, executemany) -> None:
+        # Once the rebuild has read the stored balances, another client posts to the same lot.
+        if statement.startswith("SELECT inventory_balance.product_id") and not posting.is_alive() and not posted:
+            posting.start()
+            posting.join(timeout=0.5)
+
+    event.listen(db_module.engine, "after_cursor_execute", post_mid_rebuild)
+    try:
+        with db_module.SessionLocal() as db:
+            services.rebuild_balances(db, product_id, product_id)
+            db.commit()
+        posting.join()
+    finally:
+        event.remove(db_module.engine, "after_cursor_execute", post_mid_rebuild)
+
+    assert posted == [201]
+    assert _balance(client) == 15
+    assert client.get("/dashboard/summary").json()["total_qty"] == 15
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import datetime as dt
+
+from fastapi.testclient import TestClient
+
+CSV_ROWS = [
+    "group_name,product_code,product_name,spec,mfg_date,lot_no,opening_qty",
+    "Food,,,,,,",
+    "Food,P001,Apple,Red,2024-01-01,L001,10",
+    "Food,P001,Apple,Red,2024-01-02,L002,5",
+    "Drink,P002,Water,,2024-02-01,W001,",
+    "Drink,P003,,,,,",
+    "Drink,P004,Juice,,2024-13-01,J001,3",
+    "Food,P002,Water,,,,",
+]
+
+
+def _upload(client: TestClient, name: str, content: bytes) -> dict:
+    response = client.post("/imports", files={"file": (name, content)})
+    assert response.status_code == 202
+    return client.get(f"/imports/{response.json()['job_id']}").json()
+
+
+def _stock(client: TestClient) -> dict[str, int]:
+    return {row["lot_no"]: row["qty_on_hand"] for row in client.get("/inventory/balance").json()}
+
+
+def test_csv_import_is_idempotent(client: TestClient):
+    content = "\n".join(CSV_ROWS).encode("utf-8")
+    job = _upload(client, "master.csv", content)
+    assert job["status"] == "DONE"
+    assert job["total_rows"] == job["processed_rows"] == 7
+    assert job["stats"] == {
+        "groups_created": 2,
+        "products_created": 2,
+        "lots_created": 3,
+        "opening_posted": 2,
+    }
+    assert [(error["row"], error["message"]) for error in job["errors"]] == [
+        (6, "product_name is required with product_code"),
+        (7, "Invalid mfg_date: 2024-13-01"),
+        (8, "Product P002 listed under two groups"),
+    ]
+    assert _stock(client) == {"L001": 10, "L002": 5}
+    assert client.get("/search", params={"q": "Apple"}).json()[0]["code"] == "P001"
+    summary = client.get("/dashboard/summary").json()
+    assert (summary["product_count"], summary["lot_count"]) == (2, 3)
+
+    again = _upload(client, "master.csv", content.replace(b"Apple,Red", b"Apple,Green"))
+    assert again["status"] == "DONE"
+    assert again["stats"] == {"products_updated": 1, "opening_skipped": 2}
+    summary = client.get("/dashboard/summary").json()
+    assert (summary["product_count"], summary["lot_count"]) == (2, 3)
+    assert _stock(client) == {"L001": 10, "L002": 5}
+    assert client.get("/products", params={"product_code": "P001"}).json()[0]["spec"] == "Green"
+
+
+def test_xlsx_import_reads_date_serials(client: TestClient):
+    from app import export
+
+    header = ("group_name", "product_code", "product_name", "mfg_date", "lot_no", "opening_qty")
+    rows = [("Food", "P010", "Pear", dt.date(2024, 3, 5), "X1", 7)]
+    job = _upload(client, "master.xlsx", b"".join(export.stream_xlsx(header, rows)))
+    assert job["status"] == "DONE", job["message"]
+    lot = client.get("/lots").json()[0]
+    assert (lot["mfg_date"], lot["lot_no"]) == ("2024-03-05", "X1")
+    assert _stock(client) == {"X1": 7}
+
+
+def test_failed_import_resumes_from_checkpoint(client: TestClient, monkeypatch):
+    from app import importer
+
+    monkeypatch.setattr(importer, "IMPORT_CHUNK_SIZE", 2)
+    lines = ["group_name,product_code,product_name,mfg_date,lot_no,opening_qty"]
+    lines += [f"G,P{n},Product {n},2024-01-01,L{n},{n}" for n in range(1, 6)]
+    real_import_chunk = importer.import_chunk
+    calls = []
+
+    def crash_on_second_chunk(db, chunk):
+        calls.append(len(chunk))
+        if len(calls) == 2:
+            raise RuntimeError("worker died")
+        return real_import_chunk(db, chunk)
+
+    monkeypatch.setattr(importer, "import_chunk", crash_on_second_chunk)
+    job = _upload(client, "big.csv", "\n".join(lines).encode())
+    assert (job["status"], job["processed_rows"], job["message"]) == ("FAILED", 2, "worker died")
+    assert _stock(client) == {"L1": 1, "L2": 2}
+
+    assert client.post(f"/imports/{job['job_id']}/resume").status_code == 202
+    job = client.get(f"/imports/{job['job_id']}").json()
+    assert (job["status"], job["processed_rows"]) == ("DONE", 5)
+    assert job["stats"]["opening_posted"] == 5
+    assert _stock(client) == {f"L{n}": n for n in range(1, 6)}
+    assert client.post(f"/imports/{job['job_id']}/resume").status_code == 409
+
+
+def test_import_rejects_unsupported_files(client: TestClient):
+    response = client.post("/imports", files={"file": ("master.txt", b"x")})
+    assert response.status_code == 400
+    job = _upload(client, "bad.csv", b"name\nFood\n")
+    assert (job["status"], job["message"]) == ("FAILED", "Missing column group_name")
+
+
+def test_rows_created_concurrently_are_reported(client: TestClient):
+    from sqlalchemy import event, insert, select
+
+    from app import db as db_module
+    from app import models
+
+    assert client.post("/product-groups", json={"group_name": "Food"}).status_code == 201
+    engine = db_module.engine
+    fired = []
+
+    def create_p001_meanwhile(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith("INSERT INTO product (") and not fired:
+            fired.append(statement)
+            with engine.begin() as other:
+                group_id = other.execute(select(models.ProductGroup.group_id)).scalar_one()
+                other.execute(
+                    insert(models.Product).values(
+                        group_id=group_id, product_code="P001", product_name="Apple", is_active=True
+                    )
+                )
+
+    event.listen(engine, "before_cursor_execute", create_p001_meanwhile)
+    lines = [
+        "group_name,product_code,product_name,mfg_date,lot_no,opening_qty",
+        "Food,P001,Apple,2024-01-01,L001,10",
+        "Food,P002,Pear,2024-01-01,L002,5",
+    ]
+    try:
+        job = _upload(client, "race.csv", "\n".join(lines).encode())
+    finally:
+        event.remove(engine, "before_cursor_execute", create_p001_meanwhile)
+    assert job["status"] == "DONE", job["message"]
+    assert job["stats"] == {"products_created": 1, "lots_created": 1, "opening_posted": 1}
+    assert [(error["row"], error["message"]) for error in job["errors"]] == [
+        (2, "Product P001 already exists; row skipped")
+    ]
+    assert _stock(client) == {"L002": 5}
@@ -2,66 +2,13 @@ from __future__ import annotations
 
 import datetime as dt
 import importlib
+import json
 
 import pytest
 import sqlalchemy as sa
 from fastapi.testclient import TestClient
 
 
-@pytest.fixture()
-def client(tmp_path, monkeypatch):
-    db_path = tmp_path / "test.db"
-    monkeypatch.setenv("DATABASE_URL", f"sqlite:///{db_path}")
-
-    from app import db as db_module
-
-    importlib.reload(db_module)
-
-    from app import models as models_module
-
-    importlib.reload(models_module)
-
-    from app import services as services_module
-
-    importlib.reload(services_module)
-
-    from app.api import routes as routes_module
-
-    importlib.reload(routes_module)
-
-    from app import main as main_module
-
-    importlib.reload(main_module)
-
-    db_module.Base.metadata.create_all(bind=db_module.engine)
-
-    with TestClient(main_module.app) as test_client:
-        yield test_client
-
-
-@pytest.fixture()
-def master_data(client: TestClient):
-    group = client.post("/product-groups", json={"group_name": "Food"}).json()
-    product = client.post(
-        "/products",
-        json={
-            "group_id": group["group_id"],
-            "product_code": "P001",
-            "product_name": "Apple",
-            "spec": "Spec",
-        },
-    ).json()
-    lot = client.post(
-        "/lots",
-        json={
-            "product_id": product["product_id"],
-            "mfg_date": dt.date.today().isoformat(),
-            "lot_no": "L001",
-        },
-    ).json()
-    return {"group": group, "product": product, "lot": lot}
-
-
 def _get_balance(client: TestClient) -> int:
     response = client.get("/inventory/balance")
     assert response.status_code == 200
@@ -133,3 +80,560 @@ def test_inventory_flow(client: TestClient, master_data):
         json={"product_id": product_id, "lot_id": lot_id, "qty": 1},
     )
     assert inactive.status_code == 400
+
+
+def test_transactions_keyset_pagination(client: TestClient, master_data):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    for qty in range(1, 6):
+        response = client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": qty})
+        assert response.status_code == 201
+
+    seen = []
+    cursor = None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        page = client.get("/inventory/transactions", params=params)
+        assert page.status_code == 200
+        assert len(page.json()) <= 2
+        seen.extend(tx["tx_id"] for tx in page.json())
+        cursor = page.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    assert len(seen) == 5
+    assert len(set(seen)) == 5
+
+    bad_cursor = client.get("/inventory/transactions", params={"cursor": "not-a-cursor"})
+    assert bad_cursor.status_code == 400
+
+    stream = client.get("/inventory/transactions", params={"format": "ndjson"})
+    assert stream.status_code == 200
+    assert stream.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in stream.text.splitlines()]
+    assert [tx["tx_id"] for tx in lines] == seen
+
+
+def test_list_endpoints_match_response_models(client: TestClient, master_data):
+    from app import db as db_module
+    from app import models, schemas
+
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 5, "note": "입고 메모"})
+    client.post("/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 2, "ref_doc": "SO-1"})
+
+    # The fast path must send exactly what validating the ORM rows through the response model would.
+    with db_module.SessionLocal() as db:
+        expected = {
+            "/products": [schemas.ProductOut.model_validate(row) for row in db.scalars(sa.select(models.Product))],
+            "/lots": [schemas.LotOut.model_validate(row) for row in db.scalars(sa.select(models.Lot))],
+            "/inventory/transactions": [
+                schemas.InventoryTxOut.model_validate(row)
+                for row in db.scalars(sa.select(models.InventoryTx).order_by(models.InventoryTx.tx_id.desc()))
+            ],
+            "/audit-logs": [
+                schemas.AuditLogOut.model_validate(row)
+                for row in db.scalars(sa.select(models.AuditLog).order_by(models.AuditLog.audit_id.desc()))
+            ],
+        }
+    for path, models_out in expected.items():
+        response = client.get(path)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.json() == [item.model_dump(mode="json") for item in models_out], path
+    stream = client.get("/inventory/transactions", params={"format": "ndjson"})
+    assert [json.loads(line) for line in stream.text.splitlines()] == client.get("/inventory/transactions").json()
+    balance = client.get("/inventory/balance", params={"by_location": True}).json()
+    assert balance == [schemas.BalanceOut(**row).model_dump(mode="json") for row in balance]
+    assert balance[0]["qty_on_hand"] == 3
+
+
+def test_inventory_batch(client: TestClient, master_data):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+
+    batch = client.post(
+        "/inventory/batch",
+        json={
+            "lines": [
+                {"tx_type": "IN", "product_id": product_id, "lot_id": lot_id, "qty": 10, "ref_doc": "B-1"},
+                {"tx_type": "IN", "product_id": product_id, "lot_id": lot_id, "qty": 5, "ref_doc": "B-1"},
+                {"tx_type": "OUT", "product_id": product_id, "lot_id": lot_id, "qty": 12, "ref_doc": "B-1"},
+            ]
+        },
+    )
+    assert batch.status_code == 201
+    assert [tx["tx_type"] for tx in batch.json()] == ["IN", "IN", "OUT"]
+    assert _get_balance(client) == 3
+
+    audit_logs = client.get(
+        "/audit-logs",
+        params={"entity_type": "inventory_tx", "entity_id": str(batch.json()[2]["tx_id"])},
+    )
+    assert [log["action"] for log in audit_logs.json()] == ["CREATE"]
+
+    rejected = client.post(
+        "/inventory/batch",
+        json={
+            "lines": [
+                {"tx_type": "IN", "product_id": product_id, "lot_id": lot_id, "qty": 1},
+                {"tx_type": "IN", "product_id": product_id, "lot_id": 999, "qty": 1},
+                {"tx_type": "OUT", "product_id": product_id, "lot_id": lot_id, "qty": 50},
+            ]
+        },
+    )
+    assert rejected.status_code == 400
+    errors = rejected.json()["detail"]["errors"]
+    assert [error["line"] for error in errors] == [1, 2]
+    assert errors[0]["message"] == "Lot not found"
+    assert errors[1]["requires_confirm"] is True
+    assert _get_balance(client) == 3
+    assert len(client.get("/inventory/transactions").json()) == 3
+
+
+def test_rebuild_balances_cli(client: TestClient, master_data, capsys):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 10})
+    client.post("/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 4})
+
+    from app import cli
+    from app import db as db_module
+
+    importlib.reload(cli)
+    with db_module.engine.begin() as conn:
+        conn.execute(sa.text("UPDATE inventory_balance SET qty_on_hand = 99"))
+
+    assert cli.main(["rebuild-balances", "--dry-run"]) == 0
+    assert "stored=99 ledger=6" in capsys.readouterr().out
+    assert _get_balance(client) == 99
+
+    assert cli.main(["rebuild-balances", "--chunk-size", "1"]) == 0
+    assert "1 drifted balance rows fixed" in capsys.readouterr().out
+    assert _get_balance(client) == 6
+
+    assert cli.main(["rebuild-balances"]) == 0
+    assert "0 drifted balance rows fixed" in capsys.readouterr().out
+
+    # A balance whose ledger rows are all voided is emptied, last movement included.
+    with db_module.engine.begin() as conn:
+        conn.execute(sa.text("UPDATE inventory_tx SET is_void = 1"))
+    assert cli.main(["rebuild-balances"]) == 0
+    assert "1 drifted balance rows fixed" in capsys.readouterr().out
+    with db_module.engine.connect() as conn:
+        row = conn.execute(sa.text("SELECT qty_on_hand, last_tx_datetime FROM inventory_balance")).one()
+    assert tuple(row) == (0, None)
+
+
+def test_idempotency_key_replays_original_response(client: TestClient, master_data, capsys):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    line = {"product_id": product_id, "lot_id": lot_id}
+
+    first = client.post("/inventory/in", json={**line, "qty": 10}, headers={"Idempotency-Key": "scan-1"})
+    assert first.status_code == 201
+    assert "Idempotency-Replayed" not in first.headers
+    # A retry (formatted differently, or on the async stack) gets the same response and posts nothing.
+    for path in ("/inventory/in", "/async/inventory/in"):
+        retry = client.post(path, json={"qty": 10, **line, "location_id": 1}, headers={"Idempotency-Key": "scan-1"})
+        assert retry.status_code == 201
+        assert retry.headers["Idempotency-Replayed"] == "true"
+        assert retry.json() == first.json()
+    assert _get_balance(client) == 10
+    assert len(client.get("/inventory/transactions").json()) == 1
+
+    reused = client.post("/inventory/in", json={**line, "qty": 11}, headers={"Idempotency-Key": "scan-1"})
+    assert reused.status_code == 422
+    assert client.post("/inventory/out", json={**line, "qty": 10}, headers={"Idempotency-Key": "scan-1"}).status_code == 422
+
+    # A failed request leaves no key behind, so its retry is processed normally.
+    short = {**line, "qty": 15}
+    assert client.post("/inventory/out", json=short, headers={"Idempotency-Key": "scan-2"}).status_code == 409
+    assert client.post("/inventory/out", json=short, headers={"Idempotency-Key": "scan-2"}).status_code == 409
+    confirmed = {**short, "confirm_shortage": True}
+    assert client.post("/inventory/out", json=confirmed, headers={"Idempotency-Key": "scan-3"}).status_code == 201
+    assert client.post("/inventory/out", json=confirmed, headers={"Idempotency-Key": "scan-3"}).status_code == 201
+    assert _get_balance(client) == -5
+    assert client.post("/inventory/in", json={**line, "qty": 1}, headers={"Idempotency-Key": "x" * 256}).status_code == 422
+
+    from app import cli
+    from app import db as db_module
+
+    importlib.reload(cli)
+    with db_module.engine.begin() as conn:
+        conn.execute(
+            sa.text("UPDATE idempotency_key SET created_at = :old WHERE idempotency_key = 'scan-1'"),
+            {"old": dt.datetime.utcnow() - dt.timedelta(hours=25)},
+        )
+    assert cli.main(["purge-idempotency-keys", "--ttl-hours", "24"]) == 0
+    assert "1 expired idempotency keys deleted" in capsys.readouterr().out
+    with db_module.engine.connect() as conn:
+        assert conn.execute(sa.text("SELECT idempotency_key FROM idempotency_key")).scalars().all() == ["scan-3"]
+
+
+def test_correction_posts_reversal_and_replacement(client: TestClient, master_data, capsys):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    other_lot = client.post(
+        "/lots", json={"product_id": product_id, "mfg_date": "2024-02-01", "lot_no": "LOT-B"}
+    ).json()["lot_id"]
+    original = client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 10}).json()
+    client.post("/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 4})
+
+    replacement = client.put(
+        f"/inventory/transactions/{original['tx_id']}", json={"qty": 7, "lot_id": other_lot, "reason": "Wrong lot"}
+    ).json()
+    assert (replacement["lot_id"], replacement["qty"], replacement["original_tx_id"]) == (other_lot, 7, original["tx_id"])
+    assert replacement["tx_datetime"] == original["tx_datetime"]
+    balances = {row["lot_no"]: row["qty_on_hand"] for row in client.get("/inventory/balance").json()}
+    assert balances == {"L001": -4, "LOT-B": 7}
+
+    ledger = client.get("/inventory/transactions").json()
+    assert [(tx["tx_type"], tx["is_void"]) for tx in sorted(ledger, key=lambda tx: tx["tx_id"])] == [
+        ("IN", True),
+        ("OUT", False),
+        ("REV", True),
+        ("IN", False),
+    ]
+    retry = client.put(f"/inventory/transactions/{original['tx_id']}", json={"qty": 8})
+    assert retry.status_code == 409
+
+    reversal = client.post(f"/inventory/transactions/{replacement['tx_id']}/reverse", json={"reason": "Cancelled"})
+    assert reversal.status_code == 201
+    assert reversal.json()["tx_type"] == "REV"
+    balances = {row["lot_no"]: row["qty_on_hand"] for row in client.get("/inventory/balance").json()}
+    assert balances == {"L001": -4, "LOT-B": 0}
+    assert client.post(f"/inventory/transactions/{reversal.json()['tx_id']}/reverse", json={}).status_code == 400
+    summary = client.get("/dashboard/summary").json()
+    assert (summary["total_qty"], summary["today_in_qty"], summary["today_out_qty"]) == (-4, 0, 4)
+
+    from app import cli
+
+    importlib.reload(cli)
+    assert cli.main(["rebuild-balances", "--dry-run"]) == 0
+    assert "0 drifted balance rows" in capsys.readouterr().out
+
+
+def test_locations_and_transfers(client: TestClient, master_data, capsys):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    store = client.post("/locations", json={"location_code": "STORE", "location_name": "Store"})
+    assert store.status_code == 201
+    store_id = store.json()["location_id"]
+    assert client.post("/locations", json={"location_code": "STORE", "location_name": "Again"}).status_code == 400
+    assert [loc["location_code"] for loc in client.get("/locations").json()] == ["MAIN", "STORE"]
+
+    client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 10})
+    transfer = {"product_id": product_id, "lot_id": lot_id, "from_location_id": 1, "to_location_id": store_id, "qty": 4}
+    response = client.post("/inventory/transfer", json=transfer)
+    assert response.status_code == 201
+    assert [(tx["tx_type"], tx["location_id"]) for tx in response.json()] == [("TRO", 1), ("TRI", store_id)]
+    assert client.post("/inventory/transfer", json={**transfer, "qty": 7}).status_code == 409
+    assert client.post("/inventory/transfer", json={**transfer, "to_location_id": 1}).status_code == 400
+
+    per_location = client.get("/inventory/balance", params={"by_location": True}).json()
+    assert [(row["location_code"], row["qty_on_hand"]) for row in per_location] == [("MAIN", 6), ("STORE", 4)]
+    store_only = client.get("/inventory/balance", params={"location_id": store_id}).json()
+    assert [(row["location_code"], row["qty_on_hand"]) for row in store_only] == [("STORE", 4)]
+    rolled_up = client.get("/inventory/balance").json()
+    assert [(row["location_code"], row["qty_on_hand"]) for row in rolled_up] == [(None, 10)]
+    assert client.get("/dashboard/summary").json()["total_qty"] == 10
+
+    client.post("/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "location_id": store_id, "qty": 4})
+    assert client.post(
+        "/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "location_id": store_id, "qty": 1}
+    ).status_code == 409
+    assert len(client.get("/inventory/transactions", params={"location_id": store_id}).json()) == 2
+
+    client.put(f"/locations/{store_id}", json={"is_active": False})
+    assert client.post("/inventory/transfer", json={**transfer, "qty": 1}).status_code == 400
+
+    from app import cli
+
+    importlib.reload(cli)
+    assert cli.main(["rebuild-balances", "--dry-run"]) == 0
+    assert "0 drifted balance rows" in capsys.readouterr().out
+
+
+def test_allocated_outbound_fefo_and_fifo(client: TestClient, master_data):
+    product_id = master_data["product"]["product_id"]
+    # Received newest-expiry first, so FEFO and FIFO pick in opposite orders.
+    lots = {}
+    for lot_no, mfg_date in (("LATE", "2024-03-01"), ("EARLY", "2024-01-01"), ("EMPTY", "2023-12-01")):
+        lots[lot_no] = client.post("/lots", json={"product_id": product_id, "mfg_date": mfg_date, "lot_no": lot_no}).json()["lot_id"]
+    for lot_no, qty in (("LATE", 6), ("EARLY", 4)):
+        client.post("/inventory/in", json={"product_id": product_id, "lot_id": lots[lot_no], "qty": qty})
+
+    fefo = client.post("/inventory/out/allocate", json={"product_id": product_id, "qty": 5, "ref_doc": "SO-1"})
+    assert fefo.status_code == 201
+    assert [(tx["lot_id"], tx["qty"], tx["ref_doc"]) for tx in fefo.json()] == [
+        (lots["EARLY"], 4, "SO-1"),
+        (lots["LATE"], 1, "SO-1"),
+    ]
+
+    client.post("/inventory/in", json={"product_id": product_id, "lot_id": lots["EARLY"], "qty": 3})
+    fifo = client.post("/inventory/out/allocate", json={"product_id": product_id, "qty": 2, "strategy": "FIFO"})
+    assert [(tx["lot_id"], tx["qty"]) for tx in fifo.json()] == [(lots["LATE"], 2)]
+
+    shortage = client.post("/inventory/out/allocate", json={"product_id": product_id, "qty": 9})
+    assert shortage.status_code == 409
+    assert shortage.json()["detail"]["current_qty"] == 6
+    balances = {row["lot_no"]: row["qty_on_hand"] for row in client.get("/inventory/balance").json()}
+    assert balances == {"EARLY": 3, "LATE": 3}
+
+    client.put(f"/lots/{lots['EARLY']}", json={"is_active": False})
+    assert client.post("/inventory/out/allocate", json={"product_id": product_id, "qty": 4}).status_code == 409
+    summary = client.get("/dashboard/summary").json()
+    assert (summary["total_qty"], summary["today_out_qty"]) == (6, 7)
+
+
+def test_fifo_allocation_follows_receipt_order(client: TestClient, master_data):
+    product_id = master_data["product"]["product_id"]
+    lots = {}
+    for lot_no in ("REGISTERED-FIRST", "REGISTERED-SECOND"):
+        lots[lot_no] = client.post("/lots", json={"product_id": product_id, "mfg_date": "2024-01-01", "lot_no": lot_no}).json()["lot_id"]
+    # Stock of the lot registered second arrives first.
+    for lot_no in ("REGISTERED-SECOND", "REGISTERED-FIRST"):
+        client.post("/inventory/in", json={"product_id": product_id, "lot_id": lots[lot_no], "qty": 5})
+
+    fifo = client.post("/inventory/out/allocate", json={"product_id": product_id, "qty": 6, "strategy": "FIFO"})
+    assert fifo.status_code == 201
+    assert [(tx["lot_id"], tx["qty"]) for tx in fifo.json()] == [(lots["REGISTERED-SECOND"], 5), (lots["REGISTERED-FIRST"], 1)]
+
+
+def _as_of(client: TestClient, day: str) -> list[int]:
+    return [row["qty_on_hand"] for row in client.get("/inventory/balance", params={"as_of": day}).json()]
+
+
+def test_balance_as_of_uses_snapshots(client: TestClient, master_data, capsys):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    first = client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 10}).json()
+    second = client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 5}).json()
+    third = client.post("/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 3}).json()
+
+    from app import cli
+    from app import db as db_module
+
+    importlib.reload(cli)
+    with db_module.engine.begin() as conn:
+        for tx, stamp in ((first, "2024-01-10 09:00:00"), (second, "2024-01-31 23:59:00"), (third, "2024-02-05 10:00:00")):
+            conn.execute(sa.text("UPDATE inventory_tx SET tx_datetime = :stamp WHERE tx_id = :tx_id"), {"stamp": stamp, "tx_id": tx["tx_id"]})
+
+    assert _as_of(client, "2024-01-09") == []
+    assert _as_of(client, "2024-01-15") == [10]
+
+    assert cli.main(["snapshot-balances", "--date", "2024-01-31"]) == 0
+    assert "1 lots written" in capsys.readouterr().out
+    assert cli.main(["snapshot-balances", "--date", "2024-02-29"]) == 0
+    assert _as_of(client, "2024-01-31") == [15]
+    assert _as_of(client, "2024-02-10") == [12]
+    assert cli.main(["snapshot-balances", "--date", dt.datetime.utcnow().date().isoformat()]) == 1
+
+    # Correcting a past transaction carries into every later snapshot.
+    assert client.put(f"/inventory/transactions/{first['tx_id']}", json={"qty": 20, "reason": "fix"}).status_code == 200
+    assert _as_of(client, "2024-01-31") == [25]
+    assert _as_of(client, "2024-03-01") == [22]
+    assert _get_balance(client) == 22
+
+    # Only ledger rows after the nearest snapshot are replayed.
+    with db_module.engine.begin() as conn:
+        conn.execute(sa.text("UPDATE balance_snapshot SET qty_on_hand = 1000 WHERE snapshot_date = '2024-01-31'"))
+    assert _as_of(client, "2024-02-10") == [997]
+
+
+def test_export_balance_and_transactions(client: TestClient, master_data):
+    import csv
+    import io
+    import zipfile
+    from xml.etree import ElementTree
+
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 10, "note": "a, \"b\" <c>"})
+    client.post("/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 4})
+
+    response = client.get("/export/balance", params={"product_code": "P00"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.content.decode("utf-8-sig"))))
+    assert rows[0][:6] == ["product_group", "product_code", "product_name", "mfg_date", "lot_no", "qty_on_hand"]
+    assert rows[1][1] == "P001" and rows[1][5] == "6"
+
+    rows = list(csv.reader(io.StringIO(client.get("/export/transactions").content.decode("utf-8-sig"))))
+    assert [row[1] for row in rows[1:]] == ["IN", "OUT"]
+    assert rows[1][7] == 'a, "b" <c>'
+
+    response = client.get("/export/transactions", params={"format": "xlsx", "lot_id": lot_id})
+    assert response.headers["content-disposition"] == 'attachment; filename="transactions.xlsx"'
+    with zipfile.ZipFile(io.BytesIO(response.content)) as archive:
+        assert archive.testzip() is None
+        sheet = ElementTree.fromstring(archive.read("xl/worksheets/sheet1.xml"))
+    ns = {"s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main"}
+    sheet_rows = sheet.findall("s:sheetData/s:row", ns)
+    assert len(sheet_rows) == 3
+    assert sheet_rows[1][5].find("s:v", ns).text == "10"
+    assert "".join(sheet_rows[1][7].itertext()) == 'a, "b" <c>'
+
+    assert client.get("/export/balance", params={"format": "pdf"}).status_code == 422
+
+
+def test_xlsx_export_rolls_over_to_new_sheets(monkeypatch):
+    import io
+    import zipfile
+    from xml.etree import ElementTree
+
+    from app import export
+
+    monkeypatch.setattr(export, "XLSX_MAX_ROWS", 3)
+    body = b"".join(export.stream_xlsx(("n",), [(n,) for n in range(1, 6)], sheet_name="transactions", batch_size=2))
+    ns = {
+        "s": "http://schemas.openxmlformats.org/spreadsheetml/2006/main",
+        "r": "http://schemas.openxmlformats.org/officeDocument/2006/relationships",
+        "p": "http://schemas.openxmlformats.org/package/2006/relationships",
+        "t": "http://schemas.openxmlformats.org/package/2006/content-types",
+    }
+    with zipfile.ZipFile(io.BytesIO(body)) as archive:
+        assert archive.testzip() is None
+        workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+        rels = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+        types = ElementTree.fromstring(archive.read("[Content_Types].xml"))
+        targets = {rel.get("Id"): rel.get("Target") for rel in rels.findall("p:Relationship", ns)}
+        sheets = [
+            (sheet.get("name"), targets[sheet.get(f"{{{ns['r']}}}id")]) for sheet in workbook.findall("s:sheets/s:sheet", ns)
+        ]
+        assert sheets == [
+            ("transactions", "worksheets/sheet1.xml"),
+            ("transactions (2)", "worksheets/sheet2.xml"),
+            ("transactions (3)", "worksheets/sheet3.xml"),
+        ]
+        overrides = {item.get("PartName") for item in types.findall("t:Override", ns)}
+        values = []
+        for _, target in sheets:
+            assert f"/xl/{target}" in overrides
+            sheet = ElementTree.fromstring(archive.read(f"xl/{target}"))
+            values.append([row[0].find("s:v", ns).text for row in sheet.findall("s:sheetData/s:row", ns)[1:]])
+            assert "".join(sheet.find("s:sheetData/s:row", ns).itertext()) == "n"
+    assert values == [["1", "2"], ["3", "4"], ["5"]]
+
+
+def test_balance_tracks_last_tx_datetime(client: TestClient, master_data):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 5})
+    last = client.post("/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 2}).json()
+
+    balance = client.get("/inventory/balance").json()[0]
+    assert balance["qty_on_hand"] == 3
+    assert balance["last_tx_datetime"] == last["tx_datetime"]
+
+
+def test_dashboard_summary(client: TestClient, master_data):
+    from app import db as db_module
+
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    inbound = client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 10}).json()
+    client.post("/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 4})
+
+    summary = client.get("/dashboard/summary").json()
+    assert summary["product_count"] == 1
+    assert summary["lot_count"] == 1
+    assert summary["total_qty"] == 6
+    assert summary["negative_lot_count"] == 0
+    assert (summary["today_in_qty"], summary["today_out_qty"]) == (10, 4)
+
+    client.put(f"/inventory/transactions/{inbound['tx_id']}", json={"qty": 2})
+    summary = client.get("/dashboard/summary").json()
+    assert summary["total_qty"] == -2
+    assert summary["negative_lot_count"] == 1
+    assert summary["today_in_qty"] == 2
+
+    other_group = client.post("/product-groups", json={"group_name": "Drinks"}).json()
+    client.put(f"/products/{product_id}", json={"group_id": other_group["group_id"]})
+    groups = {group["group_name"]: group for group in client.get("/dashboard/summary").json()["groups"]}
+    assert (groups["Food"]["qty_on_hand"], groups["Food"]["negative_lot_count"]) == (0, 0)
+    assert (groups["Drinks"]["qty_on_hand"], groups["Drinks"]["negative_lot_count"]) == (-2, 1)
+
+    # Counts cover active products and lots, kept in the group summary rows.
+    client.put(f"/lots/{lot_id}", json={"is_active": False})
+    client.put(f"/products/{product_id}", json={"is_active": False})
+    summary = client.get("/dashboard/summary").json()
+    assert (summary["product_count"], summary["lot_count"]) == (0, 0)
+    client.put(f"/products/{product_id}", json={"is_active": True, "group_id": master_data["group"]["group_id"]})
+    client.put(f"/lots/{lot_id}", json={"is_active": True})
+    client.post("/lots", json={"product_id": product_id, "mfg_date": "2024-02-01", "lot_no": "L-2"})
+    summary = client.get("/dashboard/summary").json()
+    assert (summary["product_count"], summary["lot_count"]) == (1, 2)
+    with db_module.engine.connect() as conn:
+        counts = dict(conn.execute(sa.text("SELECT group_id, lot_count FROM group_stock_summary")).all())
+    assert counts == {master_data["group"]["group_id"]: 2, other_group["group_id"]: 0}
+
+
+def test_dashboard_counts_a_lot_short_at_two_locations_once(client: TestClient, master_data):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    store = client.post("/locations", json={"location_code": "STORE", "location_name": "Store"}).json()
+    for location_id in (1, store["location_id"]):
+        shortage = {"product_id": product_id, "lot_id": lot_id, "location_id": location_id, "qty": 2, "confirm_shortage": True}
+        assert client.post("/inventory/out", json=shortage).status_code == 201
+
+    summary = client.get("/dashboard/summary").json()
+    assert (summary["total_qty"], summary["negative_lot_count"]) == (-4, 1)
+    assert [group["negative_lot_count"] for group in summary["groups"]] == [1]
+
+    client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "location_id": 1, "qty": 2})
+    assert client.get("/dashboard/summary").json()["negative_lot_count"] == 1
+    client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "location_id": store["location_id"], "qty": 2})
+    assert client.get("/dashboard/summary").json()["negative_lot_count"] == 0
+
+
+def test_master_data_cache_invalidation(client: TestClient, master_data):
+    from app import db as db_module
+    from app.cache import master_cache
+
+    master_cache.version_check_interval = 0
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    payload = {"product_id": product_id, "lot_id": lot_id, "qty": 1}
+
+    assert client.post("/inventory/in", json=payload).status_code == 201
+    assert client.post("/inventory/in", json=payload).status_code == 201
+    stats = client.get("/master-data/cache-stats").json()
+    assert stats["hits"] >= 3
+    assert stats["size"] == 4  # group, product, lot and location
+
+    # Another worker deactivates the lot: the cached snapshot is served until the shared version moves.
+    with db_module.engine.begin() as conn:
+        conn.execute(sa.text("UPDATE lot SET is_active = 0 WHERE lot_id = :lot_id"), {"lot_id": lot_id})
+    assert client.post("/inventory/in", json=payload).status_code == 201
+    with db_module.engine.begin() as conn:
+        conn.execute(sa.text("UPDATE master_data_version SET version = version + 1"))
+    assert client.post("/inventory/in", json=payload).status_code == 400
+
+    client.put(f"/lots/{lot_id}", json={"is_active": True})
+    assert client.post("/inventory/in", json=payload).status_code == 201
+
+
+def test_search_index_follows_master_writes(client: TestClient, master_data):
+    group_id = master_data["group"]["group_id"]
+    pear = client.post(
+        "/products",
+        json={"group_id": group_id, "product_code": "FRUIT-PEAR", "product_name": "Green Pear"},
+    ).json()
+    client.post("/lots", json={"product_id": pear["product_id"], "mfg_date": "2024-01-01", "lot_no": "PEAR-2024"})
+
+    hits = client.get("/search", params={"q": "pear"}).json()
+    assert {(hit["entity_type"], hit["code"]) for hit in hits} == {("product", "FRUIT-PEAR"), ("lot", "PEAR-2024")}
+    assert client.get("/search", params={"q": "pear", "entity_type": "lot"}).json()[0]["product_id"] == pear["product_id"]
+
+    client.put(f"/products/{pear['product_id']}", json={"product_name": "Nashi"})
+    assert [p["product_code"] for p in client.get("/products", params={"q": "ash"}).json()] == ["FRUIT-PEAR"]
+    assert client.get("/products", params={"q": "green"}).json() == []
+    assert [p["product_code"] for p in client.get("/products", params={"product_code": "uit-p"}).json()] == ["FRUIT-PEAR"]
+    assert [lot["lot_no"] for lot in client.get("/lots", params={"lot_no": "r-20"}).json()] == ["PEAR-2024"]
+
+    short = client.get("/search", params={"q": "P0"}).json()
+    assert [hit["code"] for hit in short] == ["P001"]
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import re
+
+from fastapi.testclient import TestClient
+
+
+def _samples(text: str) -> dict[str, float]:
+    samples = {}
+    for line in text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+    return samples
+
+
+def test_metrics_endpoint(client: TestClient, master_data):
+    from app import metrics
+
+    metrics.reset()
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 5})
+    client.post("/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 2})
+    assert client.post("/inventory/out", json={"product_id": product_id, "lot_id": lot_id, "qty": 50}).status_code == 409
+    client.put(f"/lots/{lot_id}", json={"is_active": True})
+    client.get("/no-such-page")
+
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = _samples(response.text)
+
+    assert samples['inventory_http_requests_total{method="POST",route="/inventory/out",status="409"}'] == 1
+    assert samples['inventory_http_requests_total{method="PUT",route="/lots/{lot_id}",status="200"}'] == 1
+    assert samples['inventory_http_requests_total{method="GET",route="unmatched",status="404"}'] == 1
+    assert samples['inventory_http_request_duration_seconds_count{method="POST",route="/inventory/out"}'] == 2
+    # The rejected outbound rolled back, so only committed postings are counted.
+    assert samples['inventory_postings_total{tx_type="IN"}'] == 1
+    assert samples['inventory_postings_total{tx_type="OUT"}'] == 1
+    assert samples['inventory_posted_qty_total{tx_type="OUT"}'] == 2
+    assert samples['inventory_db_query_duration_seconds_count{operation="UPDATE",table="inventory_balance"}'] >= 2
+    assert samples['inventory_db_query_duration_seconds_count{operation="INSERT",table="audit_log"}'] == 2
+    assert samples['inventory_db_commit_duration_seconds_count'] >= 2
+    assert samples['inventory_db_pool_wait_seconds_bucket{le="+Inf"}'] >= 4
+    assert samples["inventory_audit_outbox_pending"] == 0
+    assert "inventory_audit_outbox_lag_seconds" in samples
+    buckets = [value for name, value in samples.items() if name.startswith("inventory_http_request_duration_seconds_bucket")]
+    assert buckets and all(value >= 0 for value in buckets)
+
+
+def test_statement_labels_and_histogram():
+    from app import metrics
+
+    assert metrics.statement_labels("SELECT lot.lot_id FROM lot WHERE lot.lot_id = ?") == ("SELECT", "lot")
+    assert metrics.statement_labels('INSERT INTO "audit_log" (action) VALUES (?)') == ("INSERT", "audit_log")
+    assert metrics.statement_labels("UPDATE inventory_balance SET qty_on_hand=? RETURNING qty_on_hand") == (
+        "UPDATE",
+        "inventory_balance",
+    )
+    assert metrics.statement_labels("WITH t AS (SELECT 1) SELECT * FROM product") == ("SELECT", "product")
+    assert metrics.statement_labels("PRAGMA journal_mode") == ("OTHER", "")
+
+    histogram = metrics.Histogram("bench_seconds", "Benchmark.", ("route",))
+    for _ in range(3):
+        histogram.observe(0.003, "/inventory/in")
+    assert histogram.count("/inventory/in") == 3
+    assert re.search(r'bench_seconds_bucket\{route="/inventory/in",le="0.005"\} 3', "\n".join(histogram.render()))
+
+
+def test_metrics_middleware_labels_requests_by_route():
+    from fastapi import FastAPI
+
+    from app import main, metrics
+
+    assert any(middleware.cls is metrics.MetricsMiddleware for middleware in main.app.user_middleware)
+
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"item_id": item_id}
+
+    app.add_middleware(metrics.MetricsMiddleware)
+    metrics.reset()
+    with TestClient(app) as client:
+        assert client.get("/items/1").status_code == 200
+        assert client.get("/items/2").status_code == 200
+        assert client.get("/nowhere").status_code == 404
+    assert metrics.HTTP_REQUESTS.value("GET", "/items/{item_id}", 200) == 2
+    assert metrics.HTTP_LATENCY.count("GET", "/items/{item_id}") == 2
+    assert metrics.HTTP_REQUESTS.value("GET", "unmatched", 404) == 1
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+# Statements per request once the master-data cache is warm.
+BUDGETS = {
+    ("POST", "/inventory/in"): 5,
+    ("POST", "/inventory/out"): 5,
+    ("POST", "/inventory/batch"): 7,
+    ("POST", "/inventory/out/allocate"): 10,  # split across two lots
+    ("POST", "/inventory/transfer"): 10,
+    ("PUT", "/inventory/transactions/{tx_id}"): 10,
+    ("GET", "/inventory/transactions"): 1,
+    ("GET", "/inventory/balance"): 1,
+    ("GET", "/audit-logs"): 1,
+    ("GET", "/dashboard/summary"): 4,
+    ("POST", "/async/inventory/in"): 5,
+    ("GET", "/async/inventory/transactions"): 1,
+}
+
+
+@pytest.fixture()
+def profiled(monkeypatch):
+    monkeypatch.setenv("QUERY_PROFILING", "true")
+    monkeypatch.setenv("SLOW_QUERY_MS", "10000")
+
+
+def _within_budget(response, method: str, route: str) -> int:
+    assert response.status_code < 400, response.text
+    count = int(response.headers["X-Query-Count"])
+    assert count <= BUDGETS[(method, route)], f"{method} {route} ran {count} statements"
+    assert "X-Query-Repeated" not in response.headers
+    return count
+
+
+def test_endpoints_stay_within_query_budget(profiled, client: TestClient, master_data):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    line = {"product_id": product_id, "lot_id": lot_id}
+    store = client.post("/locations", json={"location_code": "STORE", "location_name": "Store"}).json()["location_id"]
+    other_lot = client.post("/lots", json={"product_id": product_id, "mfg_date": "2024-01-01", "lot_no": "OLD"}).json()
+    client.post("/inventory/in", json={**line, "location_id": store, "qty": 1})  # warm the master-data cache
+    client.post("/inventory/in", json={"product_id": product_id, "lot_id": other_lot["lot_id"], "qty": 2})
+
+    tx = client.post("/inventory/in", json={**line, "qty": 100})
+    _within_budget(tx, "POST", "/inventory/in")
+    _within_budget(client.post("/inventory/out", json={**line, "qty": 1}), "POST", "/inventory/out")
+    batch = {"lines": [{**line, "tx_type": "IN" if n % 2 else "OUT", "qty": 1} for n in range(50)]}
+    _within_budget(client.post("/inventory/batch", json=batch), "POST", "/inventory/batch")
+    allocate = client.post("/inventory/out/allocate", json={"product_id": product_id, "qty": 5})
+    assert len(allocate.json()) == 2
+    _within_budget(allocate, "POST", "/inventory/out/allocate")
+    transfer = {**line, "from_location_id": 1, "to_location_id": store, "qty": 3}
+    _within_budget(client.post("/inventory/transfer", json=transfer), "POST", "/inventory/transfer")
+    correction = client.put(f"/inventory/transactions/{tx.json()['tx_id']}", json={"qty": 90})
+    _within_budget(correction, "PUT", "/inventory/transactions/{tx_id}")
+    _within_budget(client.post("/async/inventory/in", json={**line, "qty": 1}), "POST", "/async/inventory/in")
+
+    # Listings return many rows from a single statement; nothing is lazy-loaded per row.
+    listing = client.get("/inventory/transactions", params={"limit": 100})
+    assert len(listing.json()) == 61
+    _within_budget(listing, "GET", "/inventory/transactions")
+    _within_budget(client.get("/async/inventory/transactions"), "GET", "/async/inventory/transactions")
+    _within_budget(client.get("/inventory/balance", params={"by_location": True}), "GET", "/inventory/balance")
+    _within_budget(client.get("/audit-logs"), "GET", "/audit-logs")
+    _within_budget(client.get("/dashboard/summary"), "GET", "/dashboard/summary")
+
+
+def test_repeated_statements_are_flagged(profiled, client: TestClient, master_data):
+    from app import db as db_module
+    from app import models, profiling
+
+    lot_ids = [
+        client.post("/lots", json={"product_id": master_data["product"]["product_id"], "mfg_date": f"2024-01-{day:02d}", "lot_no": "N"}).json()["lot_id"]
+        for day in range(1, 7)
+    ]
+    with profiling.profile_queries() as profile, db_module.SessionLocal() as db:
+        names = [db.get(models.Lot, lot_id).product.product_name for lot_id in lot_ids]
+    assert names == ["Apple"] * 6
+    repeated = profile.repeated()
+    # One lookup per lot plus one lazy load of its product: the classic N+1 shape.
+    assert sorted((statement.split()[1].split(".")[0], count) for statement, count in repeated.items()) == [
+        ("lot", 6),
+        ("product", 6),
+    ]
+
+
+def test_slow_queries_are_logged_with_plan(profiled, client: TestClient, master_data, monkeypatch, caplog):
+    from app import profiling
+
+    client.post("/inventory/in", json={"product_id": master_data["product"]["product_id"], "lot_id": master_data["lot"]["lot_id"], "qty": 1})
+    monkeypatch.setattr(profiling, "SLOW_QUERY_MS", 0)
+    with caplog.at_level(logging.WARNING, logger="app.profiling"):
+        client.get("/inventory/balance", params={"location_id": 1})
+    messages = [record.getMessage() for record in caplog.records]
+    balance_query = next(message for message in messages if "FROM inventory_balance" in message)
+    assert "params=(1,)" in balance_query
+    assert "ix_inventory_balance_location" in balance_query
+
+
+def test_profiling_middleware_only_when_enabled(client: TestClient):
+    from app import main, profiling
+
+    assert not profiling.QUERY_PROFILING
+    assert not any(middleware.cls is profiling.QueryProfilingMiddleware for middleware in main.app.user_middleware)
+    assert "X-Query-Count" not in client.get("/").headers
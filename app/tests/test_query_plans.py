@@ -0,0 +1,200 @@
+from __future__ import annotations
+
+import datetime as dt
+import re
+
+import pytest
+import sqlalchemy as sa
+from fastapi.testclient import TestClient
+
+PRODUCTS = 20
+LOTS_PER_PRODUCT = 5
+TX_PER_LOT = 200
+LEDGER_TABLES = ("inventory_tx", "audit_log")
+
+
+@pytest.fixture()
+def large_ledger(client: TestClient):
+    from app import db as db_module
+    from app import models, services
+
+    start = dt.datetime(2024, 1, 1)
+    with db_module.engine.begin() as conn:
+        conn.execute(sa.insert(models.ProductGroup), [{"group_id": 1, "group_name": "Bulk", "is_active": True}])
+        conn.execute(
+            sa.insert(models.Product),
+            [
+                {"product_id": p, "group_id": 1, "product_code": f"P{p:04d}", "product_name": f"Product {p}", "is_active": True}
+                for p in range(1, PRODUCTS + 1)
+            ],
+        )
+        lots = [
+            {"lot_id": (p - 1) * LOTS_PER_PRODUCT + n, "product_id": p, "mfg_date": dt.date(2024, 1, n), "lot_no": f"L{n}", "is_active": True}
+            for p in range(1, PRODUCTS + 1)
+            for n in range(1, LOTS_PER_PRODUCT + 1)
+        ]
+        conn.execute(sa.insert(models.Lot), lots)
+        conn.execute(
+            sa.insert(models.InventoryTx),
+            [
+                {
+                    "tx_type": "IN" if i % 3 else "OUT",
+                    "tx_datetime": start + dt.timedelta(minutes=i * len(lots) + index),
+                    "product_id": lot["product_id"],
+                    "lot_id": lot["lot_id"],
+                    "qty": 1 + i % 7,
+                }
+                for index, lot in enumerate(lots)
+                for i in range(TX_PER_LOT)
+            ],
+        )
+        conn.exec_driver_sql("ANALYZE")
+    with db_module.SessionLocal() as db:
+        services.rebuild_balances(db, 1, PRODUCTS)
+        db.commit()
+    return db_module.engine
+
+
+@pytest.fixture()
+def captured_statements(large_ledger):
+    statements: list[tuple[str, object]] = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if not executemany and not statement.lstrip().upper().startswith(("EXPLAIN", "INSERT", "PRAGMA")):
+            statements.append((statement, parameters))
+
+    sa.event.listen(large_ledger, "before_cursor_execute", capture)
+    yield statements
+    sa.event.remove(large_ledger, "before_cursor_execute", capture)
+
+
+def _full_scans(engine, statements, tables=LEDGER_TABLES) -> list[str]:
+    failures = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            if not any(table in statement for table in tables):
+                continue
+            plan = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).all()
+            for row in plan:
+                detail = row[-1]
+                match = re.match(r"SCAN (\w+)", detail)
+                if match and match.group(1) in tables and "USING" not in detail:
+                    failures.append(f"{detail}: {statement}")
+    return failures
+
+
+def test_ledger_queries_use_indexes(client: TestClient, large_ledger, captured_statements):
+    first_page = client.get("/inventory/transactions", params={"lot_id": 7, "limit": 50})
+    assert first_page.status_code == 200
+    cursor = first_page.headers["X-Next-Cursor"]
+    client.get("/inventory/transactions", params={"lot_id": 7, "limit": 50, "cursor": cursor})
+    client.get("/inventory/transactions", params={"limit": 50})
+    client.get(
+        "/inventory/transactions",
+        params={"start_datetime": "2024-01-02T00:00:00", "end_datetime": "2024-01-03T00:00:00", "limit": 50},
+    )
+    tx_id = first_page.json()[0]["tx_id"]
+    before_correction = len(captured_statements)
+    assert client.put(f"/inventory/transactions/{tx_id}", json={"qty": 9, "lot_id": 8}).status_code == 200
+    # A correction applies deltas; it never re-sums the lot's ledger.
+    correction = [statement for statement, _ in captured_statements[before_correction:]]
+    assert not [statement for statement in correction if "inventory_tx" in statement and "sum(" in statement.lower()]
+    assert client.post("/inventory/in", json={"product_id": 2, "lot_id": 7, "qty": 3}).status_code == 201
+    assert client.post("/inventory/out", json={"product_id": 2, "lot_id": 7, "qty": 1}).status_code == 201
+
+    assert any("inventory_tx" in statement for statement, _ in captured_statements)
+    assert _full_scans(large_ledger, captured_statements) == []
+
+
+def test_balance_as_of_reads_one_period(client: TestClient, large_ledger, captured_statements):
+    from app import db as db_module
+    from app import services
+
+    with db_module.SessionLocal() as db:
+        assert services.take_balance_snapshot(db, dt.date(2024, 1, 5)) == PRODUCTS * LOTS_PER_PRODUCT
+        db.commit()
+    captured_statements.clear()
+
+    response = client.get("/inventory/balance", params={"as_of": "2024-01-07"})
+    assert response.status_code == 200
+    assert len(response.json()) == PRODUCTS * LOTS_PER_PRODUCT
+    assert _full_scans(large_ledger, captured_statements) == []
+
+
+def test_location_balances_use_indexes(client: TestClient, large_ledger, captured_statements):
+    from app import models
+
+    with large_ledger.begin() as conn:
+        conn.execute(
+            sa.insert(models.Location),
+            [{"location_id": n, "location_code": f"BIN{n:03d}", "location_name": f"Bin {n}", "is_active": True} for n in range(2, 300)],
+        )
+    for location_id in (2, 3):
+        transfer = {"product_id": 2, "lot_id": 7, "from_location_id": 1, "to_location_id": location_id, "qty": 1}
+        assert client.post("/inventory/transfer", json=transfer).status_code == 201
+    with large_ledger.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    captured_statements.clear()
+
+    in_bin = client.get("/inventory/balance", params={"location_id": 2}).json()
+    assert [(row["product_code"], row["lot_no"], row["location_code"], row["qty_on_hand"]) for row in in_bin] == [("P0002", "L2", "BIN002", 1)]
+    per_location = client.get("/inventory/balance", params={"product_code": "P0002", "by_location": True}).json()
+    assert len(per_location) == LOTS_PER_PRODUCT + 2
+    rolled_up = client.get("/inventory/balance", params={"product_code": "P0002"}).json()
+    assert len(rolled_up) == LOTS_PER_PRODUCT
+    assert _full_scans(large_ledger, captured_statements, ("inventory_balance",)) == []
+
+
+def test_allocation_reads_only_lots_with_stock(client: TestClient, large_ledger, captured_statements):
+    with large_ledger.begin() as conn:
+        conn.exec_driver_sql("ANALYZE")
+    captured_statements.clear()
+
+    response = client.post("/inventory/out/allocate", json={"product_id": 2, "qty": 3})
+    assert response.status_code == 201
+    candidates = [(s, p) for s, p in captured_statements if "FROM inventory_balance JOIN lot" in s]
+    assert len(candidates) == 1
+    with large_ledger.connect() as conn:
+        plan = " ".join(row[-1] for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {candidates[0][0]}", candidates[0][1]))
+    assert "ix_inventory_balance_in_stock" in plan
+    assert _full_scans(large_ledger, captured_statements, ("inventory_balance",)) == []
+
+    # FIFO looks up each candidate's first receipt through the lot's ledger index.
+    captured_statements.clear()
+    response = client.post("/inventory/out/allocate", json={"product_id": 2, "qty": 3, "strategy": "FIFO"})
+    assert response.status_code == 201
+    assert _full_scans(large_ledger, captured_statements, ("inventory_balance", "inventory_tx")) == []
+
+
+def test_audit_log_pages_use_indexes(client: TestClient, large_ledger, captured_statements):
+    from app import models
+
+    start = dt.datetime(2024, 1, 1)
+    with large_ledger.begin() as conn:
+        conn.execute(
+            sa.insert(models.AuditLog),
+            [
+                {
+                    "entity_type": "inventory_tx" if i % 4 else "lot",
+                    "entity_id": str(i % 500),
+                    "action": "CREATE",
+                    "changed_fields": {},
+                    "created_at": start + dt.timedelta(minutes=i),
+                }
+                for i in range(20_000)
+            ],
+        )
+        conn.exec_driver_sql("ANALYZE")
+    captured_statements.clear()
+
+    first_page = client.get("/audit-logs", params={"limit": 50})
+    cursor = first_page.headers["X-Next-Cursor"]
+    client.get("/audit-logs", params={"limit": 50, "cursor": cursor})
+    filtered = client.get("/audit-logs", params={"entity_type": "inventory_tx", "entity_id": "7", "limit": 10})
+    assert len(filtered.json()) == 10
+    client.get(
+        "/audit-logs",
+        params={"entity_type": "inventory_tx", "entity_id": "7", "limit": 10, "cursor": filtered.headers["X-Next-Cursor"]},
+    )
+
+    assert _full_scans(large_ledger, captured_statements) == []
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import sqlite3
+
+import pytest
+from fastapi.testclient import TestClient
+
+
+@pytest.fixture()
+def read_replica(tmp_path, monkeypatch):
+    # A second SQLite file stands in for a replica that has not caught up yet.
+    replica_path = tmp_path / "replica.db"
+    monkeypatch.setenv("DATABASE_READ_URL", f"sqlite:///{replica_path}")
+    return replica_path
+
+
+def _replicate(primary_path, replica_path) -> None:
+    from app import db as db_module
+
+    db_module.read_engine.dispose()
+    with sqlite3.connect(primary_path) as source, sqlite3.connect(replica_path) as target:
+        source.backup(target)
+
+
+def test_reads_go_to_replica_unless_pinned_after_write(read_replica, client: TestClient, master_data, tmp_path):
+    product_id = master_data["product"]["product_id"]
+    lot_id = master_data["lot"]["lot_id"]
+    assert client.post("/inventory/in", json={"product_id": product_id, "lot_id": lot_id, "qty": 7}).status_code == 201
+    assert "db_primary_until" in client.cookies
+
+    # Read-your-writes: the writer sees its own posting on the primary.
+    assert [row["qty_on_hand"] for row in client.get("/inventory/balance").json()] == [7]
+
+    # Without the pin the same read hits the lagging replica.
+    client.cookies.clear()
+    assert client.get("/inventory/balance").json() == []
+    assert client.get("/async/inventory/balance").json() == []
+    assert client.get("/inventory/transactions", params={"format": "ndjson"}).text == ""
+
+    _replicate(tmp_path / "test.db", read_replica)
+    assert [row["qty_on_hand"] for row in client.get("/inventory/balance").json()] == [7]
+    assert len(client.get("/inventory/transactions").json()) == 1
+
+
+def test_pinning_middleware_is_pure_asgi(read_replica, client: TestClient):
+    from starlette.middleware.base import BaseHTTPMiddleware
+
+    from app import db as db_module
+    from app import main
+
+    middleware = [item.cls for item in main.app.user_middleware]
+    assert db_module.PrimaryPinMiddleware in middleware
+    assert BaseHTTPMiddleware not in middleware
+
+    response = client.post("/product-groups", json={"group_name": "Pinned"})
+    assert response.status_code == 201
+    cookie = response.headers["set-cookie"]
+    assert cookie.startswith("db_primary_until=")
+    assert all(part in cookie for part in ("HttpOnly", "Max-Age=5", "Path=/", "SameSite=lax"))
+
+
+def test_failed_write_does_not_pin(read_replica, client: TestClient, master_data):
+    client.cookies.clear()
+    response = client.post(
+        "/inventory/out",
+        json={"product_id": master_data["product"]["product_id"], "lot_id": master_data["lot"]["lot_id"], "qty": 5},
+    )
+    assert response.status_code == 409
+    assert "db_primary_until" not in client.cookies
+
+
+def test_no_pinning_middleware_without_replica(client: TestClient, master_data):
+    from starlette.middleware.base import BaseHTTPMiddleware
+
+    from app import main
+
+    assert not any(middleware.cls is BaseHTTPMiddleware for middleware in main.app.user_middleware)
+    response = client.post("/inventory/in", json={"product_id": master_data["product"]["product_id"], "lot_id": master_data["lot"]["lot_id"], "qty": 1})
+    assert response.status_code == 201
+    assert "db_primary_until" not in client.cookies
@@ -0,0 +1,171 @@
+"""Compare requests/sec and latency of the sync and async request stacks.
+
+Starts uvicorn against a throwaway database, seeds one lot and drives the
+same scenarios through ``/...`` (sync routes) and ``/async/...``::
+
+    python benchmarks/async_vs_sync.py --requests 2000 --concurrency 64
+    python benchmarks/async_vs_sync.py --database-url postgresql://localhost/inventory_bench
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _create_schema(database_url: str) -> None:
+    subprocess.run(
+        [sys.executable, "-c", "from app import db, models; db.Base.metadata.create_all(db.engine)"],
+        cwd=ROOT,
+        env={**os.environ, "DATABASE_URL": database_url},
+        check=True,
+    )
+
+
+def _start_server(database_url: str, port: int, workers: int) -> subprocess.Popen:
+    server = subprocess.Popen(
+        [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            "app.main:app",
+            "--port",
+            str(port),
+            "--workers",
+            str(workers),
+            "--log-level",
+            "warning",
+        ],
+        cwd=ROOT,
+        env={**os.environ, "DATABASE_URL": database_url},
+    )
+    deadline = time.monotonic() + 20
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+            return server
+        except httpx.TransportError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+
+def _seed(base_url: str) -> dict:
+    with httpx.Client(base_url=base_url) as client:
+        group = client.post("/product-groups", json={"group_name": "Bench"}).json()
+        product = client.post(
+            "/products",
+            json={"group_id": group["group_id"], "product_code": "BENCH-1", "product_name": "Bench product"},
+        ).json()
+        lot = client.post(
+            "/lots",
+            json={"product_id": product["product_id"], "mfg_date": "2024-01-01", "lot_no": "BENCH-LOT"},
+        ).json()
+        for _ in range(200):
+            client.post("/inventory/in", json={"product_id": product["product_id"], "lot_id": lot["lot_id"], "qty": 5})
+    return {"product_id": product["product_id"], "lot_id": lot["lot_id"], "qty": 1}
+
+
+def _percentile(sorted_values: list[float], pct: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(pct / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def _run_scenario(base_url: str, method: str, path: str, body: dict | None, requests: int, concurrency: int) -> dict:
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies: list[float] = []
+    errors = 0
+    queue: asyncio.Queue[None] = asyncio.Queue()
+    for _ in range(requests):
+        queue.put_nowait(None)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+
+        async def worker() -> None:
+            nonlocal errors
+            while not queue.empty():
+                queue.get_nowait()
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, json=body)
+                except httpx.TransportError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if response.status_code >= 400:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latencies) or [float("nan")]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    _create_schema(database_url)
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = _start_server(database_url, port, args.workers)
+    try:
+        posting = _seed(base_url)
+        scenarios = [
+            ("post_in", "POST", "/inventory/in", posting),
+            ("list_transactions", "GET", "/inventory/transactions?limit=50", None),
+            ("list_balance", "GET", "/inventory/balance", None),
+        ]
+        results = {}
+        for name, method, path, body in scenarios:
+            for stack, prefix in (("sync", ""), ("async", "/async")):
+                result = asyncio.run(
+                    _run_scenario(base_url, method, prefix + path, body, args.requests, args.concurrency)
+                )
+                results[f"{name}/{stack}"] = result
+                print(
+                    f"{name:<18} {stack:<5} {result['rps']:>9} req/s  "
+                    f"p50 {result['p50_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  errors {result['errors']}"
+                )
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""Generate a reproducible synthetic inventory dataset for benchmarks.
+
+Writes ``--groups`` product groups, ``--products`` products per group,
+``--lots`` lots per product and ``--years`` years of ledger rows ending
+yesterday (``--tx-per-day`` rows a day, one audit record each) straight into
+the tables. Balances and the dashboard counters are then rebuilt from the
+ledger, and month-end snapshots are taken, so the API sees a consistent
+database. The same ``--seed`` always yields the same data::
+
+    python benchmarks/datagen.py --database-url sqlite:////tmp/bench.db --groups 5 --products 40 --lots 20 --years 2
+
+The schema is dropped and recreated: point ``--database-url`` at a scratch
+database. The last line of output is a JSON summary that the suite runner
+uses to build requests.
+"""
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+CHUNK = 20_000
+REBUILD_PRODUCTS_PER_CHUNK = 100
+IN_SHARE = 0.55  # slightly more receipts than issues keeps most lots in stock
+
+
+def product_code(product_id: int) -> str:
+    return f"P{product_id:06d}"
+
+
+def lot_no(lot_id: int) -> str:
+    return f"L{lot_id:07d}"
+
+
+def generate(
+    *,
+    groups: int,
+    products: int,
+    lots: int,
+    years: float,
+    tx_per_day: int,
+    locations: int,
+    seed: int,
+) -> dict:
+    import sqlalchemy as sa
+
+    from app import db as db_module
+    from app import models, services
+
+    rng = random.Random(seed)
+    engine = db_module.engine
+    is_postgresql = engine.dialect.name == "postgresql"
+    if is_postgresql:
+        models.Base.metadata.drop_all(engine)
+    models.Base.metadata.create_all(engine)
+
+    end = dt.datetime.combine(dt.datetime.utcnow().date(), dt.time.min)  # ledger ends at midnight: snapshots can cover it
+    days = max(int(years * 365), 1)
+    start = end - dt.timedelta(days=days)
+    product_count = groups * products
+    lot_count = product_count * lots
+
+    with engine.begin() as conn:
+        conn.execute(
+            sa.insert(models.ProductGroup),
+            [{"group_id": g, "group_name": f"Group {g}", "is_active": True} for g in range(1, groups + 1)],
+        )
+        conn.execute(
+            sa.insert(models.Product),
+            [
+                {
+                    "product_id": p,
+                    "group_id": (p - 1) // products + 1,
+                    "product_code": product_code(p),
+                    "product_name": f"Product {p}",
+                    "is_active": True,
+                }
+                for p in range(1, product_count + 1)
+            ],
+        )
+        conn.execute(
+            sa.insert(models.GroupStockSummary),
+            [
+                {
+                    "group_id": g,
+                    "qty_on_hand": 0,
+                    "product_count": products,
+                    "lot_count": products * lots,
+                }
+                for g in range(1, groups + 1)
+            ],
+        )
+        if locations > 1:
+            conn.execute(
+                sa.insert(models.Location),
+                [
+                    {"location_id": n, "location_code": f"LOC{n:03d}", "location_name": f"Location {n}", "is_active": True}
+                    for n in range(2, locations + 1)
+                ],
+            )
+        for offset in range(0, lot_count, CHUNK):
+            conn.execute(
+                sa.insert(models.Lot),
+                [
+                    {
+                        "lot_id": lot_id,
+                        "product_id": (lot_id - 1) // lots + 1,
+                        "mfg_date": (start + dt.timedelta(days=rng.randrange(days))).date(),
+                        "lot_no": lot_no(lot_id),
+                        "is_active": True,
+                    }
+                    for lot_id in range(offset + 1, min(offset + CHUNK, lot_count) + 1)
+                ],
+            )
+
+    total = days * tx_per_day
+    step = dt.timedelta(days=days) / total
+    volume: dict[tuple[dt.date, str], list[int]] = {}
+    tx_id = 0
+    while tx_id < total:
+        ledger, audit_rows = [], []
+        for _ in range(min(CHUNK, total - tx_id)):
+            tx_id += 1
+            lot_id = rng.randint(1, lot_count)
+            tx_type = "IN" if rng.random() < IN_SHARE else "OUT"
+            qty = rng.randint(1, 20)
+            at = start + step * (tx_id - 1)
+            ledger.append(
+                {
+                    "tx_id": tx_id,
+                    "tx_type": tx_type,
+                    "tx_datetime": at,
+                    "product_id": (lot_id - 1) // lots + 1,
+                    "lot_id": lot_id,
+                    "location_id": rng.randint(1, locations),
+                    "qty": qty,
+                    "is_void": False,
+                }
+            )
+            audit_rows.append(
+                {
+                    "entity_type": "inventory_tx",
+                    "entity_id": str(tx_id),
+                    "action": "CREATE",
+                    "changed_fields": {"after": {"lot_id": lot_id, "qty": qty}},
+                    "created_at": at,
+                }
+            )
+            day_volume = volume.setdefault((at.date(), tx_type), [0, 0])
+            day_volume[0] += 1
+            day_volume[1] += qty
+        with engine.begin() as conn:
+            conn.execute(sa.insert(models.InventoryTx), ledger)
+            conn.execute(sa.insert(models.AuditLog), audit_rows)
+
+    with engine.begin() as conn:
+        conn.execute(
+            sa.insert(models.DailyTxSummary),
+            [
+                {"tx_date": tx_date, "tx_type": tx_type, "tx_count": count, "qty": qty}
+                for (tx_date, tx_type), (count, qty) in sorted(volume.items())
+            ],
+        )
+        if is_postgresql:
+            for table, column in (
+                ("product_group", "group_id"),
+                ("product", "product_id"),
+                ("lot", "lot_id"),
+                ("location", "location_id"),
+                ("inventory_tx", "tx_id"),
+            ):
+                conn.exec_driver_sql(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', '{column}'), (SELECT MAX({column}) FROM {table}))"
+                )
+            conn.exec_driver_sql("ANALYZE")
+        else:
+            conn.exec_driver_sql("ANALYZE")
+
+    with db_module.SessionLocal() as db:
+        for first in range(1, product_count + 1, REBUILD_PRODUCTS_PER_CHUNK):
+            services.rebuild_balances(db, first, min(first + REBUILD_PRODUCTS_PER_CHUNK - 1, product_count))
+            db.commit()
+        month_ends = []
+        month = start.date().replace(day=1)
+        while month < end.date():
+            next_month = (month + dt.timedelta(days=32)).replace(day=1)
+            month_ends.append(min(next_month, end.date()) - dt.timedelta(days=1))
+            month = next_month
+        for snapshot_date in month_ends:
+            services.take_balance_snapshot(db, snapshot_date)
+            db.commit()
+
+    return {
+        "groups": groups,
+        "products": product_count,
+        "lots": lot_count,
+        "locations": locations,
+        "transactions": total,
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "snapshots": [day.isoformat() for day in month_ends],
+        "seed": seed,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--groups", type=int, default=5)
+    parser.add_argument("--products", type=int, default=40, help="Products per group")
+    parser.add_argument("--lots", type=int, default=20, help="Lots per product")
+    parser.add_argument("--years", type=float, default=1)
+    parser.add_argument("--tx-per-day", type=int, default=500)
+    parser.add_argument("--locations", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    os.environ["DATABASE_URL"] = args.database_url
+    sys.path.insert(0, str(ROOT))
+    started = time.perf_counter()
+    summary = generate(
+        groups=args.groups,
+        products=args.products,
+        lots=args.lots,
+        years=args.years,
+        tx_per_day=args.tx_per_day,
+        locations=args.locations,
+        seed=args.seed,
+    )
+    summary["seconds"] = round(time.perf_counter() - started, 1)
+    print(
+        f"{summary['transactions']} transactions over {summary['products']} products / {summary['lots']} lots "
+        f"in {summary['seconds']}s"
+    )
+    print(json.dumps(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,128 @@
+"""Check that exports stream: time to first byte and server RSS while streaming.
+
+Seeds ``--rows`` ledger rows directly into a throwaway database, starts uvicorn
+and downloads ``/export/transactions`` as CSV and XLSX while sampling the
+server's anonymous resident memory (Linux ``/proc``)::
+
+    python benchmarks/export_stream.py --rows 5000000
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import httpx
+
+from async_vs_sync import ROOT, _create_schema, _free_port, _start_server
+
+SEED_CHUNK = 50_000
+
+
+def _seed(database_url: str, rows: int) -> None:
+    script = f"""
+import datetime as dt
+
+import sqlalchemy as sa
+from app import db, models
+
+start = dt.datetime(2024, 1, 1)
+with db.engine.begin() as conn:
+    conn.execute(sa.insert(models.ProductGroup), [{{"group_id": 1, "group_name": "Bench", "is_active": True}}])
+    conn.execute(sa.insert(models.Product), [{{"product_id": 1, "group_id": 1, "product_code": "BENCH-1", "product_name": "Bench", "is_active": True}}])
+    conn.execute(sa.insert(models.Lot), [{{"lot_id": 1, "product_id": 1, "mfg_date": dt.date(2024, 1, 1), "lot_no": "L1", "is_active": True}}])
+for offset in range(0, {rows}, {SEED_CHUNK}):
+    with db.engine.begin() as conn:
+        conn.execute(
+            sa.insert(models.InventoryTx),
+            [
+                {{"tx_type": "IN", "tx_datetime": start + dt.timedelta(seconds=i), "product_id": 1, "lot_id": 1, "qty": 1, "ref_doc": f"DOC-{{i}}"}}
+                for i in range(offset, min(offset + {SEED_CHUNK}, {rows}))
+            ],
+        )
+"""
+    subprocess.run([sys.executable, "-c", script], cwd=ROOT, env={**os.environ, "DATABASE_URL": database_url}, check=True)
+
+
+def _rss_mb(pid: int) -> float:
+    for line in Path(f"/proc/{pid}/status").read_text().splitlines():
+        # Anonymous memory only: SQLite's mmap'd database pages are file-backed.
+        if line.startswith("RssAnon:"):
+            return int(line.split()[1]) / 1024
+    return float("nan")
+
+
+def _download(base_url: str, path: str, pid: int) -> dict:
+    samples: list[float] = []
+    done = threading.Event()
+
+    def sample() -> None:
+        while not done.is_set():
+            samples.append(_rss_mb(pid))
+            time.sleep(0.1)
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    baseline = _rss_mb(pid)
+    sampler.start()
+    size = 0
+    first_byte = None
+    started = time.perf_counter()
+    with httpx.stream("GET", base_url + path, timeout=None) as response:
+        response.raise_for_status()
+        for chunk in response.iter_bytes():
+            if first_byte is None:
+                first_byte = time.perf_counter() - started
+            size += len(chunk)
+    elapsed = time.perf_counter() - started
+    done.set()
+    sampler.join()
+    return {
+        "ttfb_ms": round((first_byte or elapsed) * 1000, 1),
+        "seconds": round(elapsed, 2),
+        "mb": round(size / 1024 / 1024, 1),
+        "rss_baseline_mb": round(baseline, 1),
+        "rss_peak_mb": round(max(samples, default=baseline), 1),
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    _create_schema(database_url)
+    started = time.perf_counter()
+    _seed(database_url, args.rows)
+    print(f"seeded {args.rows} rows in {time.perf_counter() - started:.1f}s")
+
+    port = _free_port()
+    server = _start_server(database_url, port, workers=1)
+    results = {}
+    try:
+        for fmt in ("csv", "xlsx"):
+            result = _download(f"http://127.0.0.1:{port}", f"/export/transactions?format={fmt}", server.pid)
+            results[fmt] = result
+            print(
+                f"{fmt:<5} ttfb {result['ttfb_ms']:>8} ms  {result['seconds']:>7} s  {result['mb']:>8} MB  "
+                f"rss {result['rss_baseline_mb']} -> {result['rss_peak_mb']} MB"
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
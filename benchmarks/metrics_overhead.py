@@ -0,0 +1,115 @@
+"""Measure what the in-process metrics cost per observation and per request.
+
+Runs in process, without a server or database, so only the instrumentation is
+timed::
+
+    python benchmarks/metrics_overhead.py
+    python benchmarks/metrics_overhead.py --requests 5000 --rounds 10 --output metrics.json
+
+"per request" drives a one-route FastAPI app through the ASGI interface with
+and without ``MetricsMiddleware`` in interleaved rounds and keeps the best
+round of each, which filters out scheduler noise.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+SCOPE = {
+    "type": "http",
+    "asgi": {"version": "3.0"},
+    "http_version": "1.1",
+    "method": "GET",
+    "scheme": "http",
+    "path": "/ping",
+    "raw_path": b"/ping",
+    "root_path": "",
+    "query_string": b"",
+    "headers": [],
+    "server": ("bench", 80),
+    "client": ("bench", 1),
+}
+
+
+def per_observation(observations: int) -> float:
+    from app import metrics
+
+    histogram = metrics.Histogram("bench_seconds", "Benchmark.", ("route",))
+    start = time.perf_counter()
+    for _ in range(observations):
+        histogram.observe(0.003, "/inventory/in")
+    return (time.perf_counter() - start) / observations
+
+
+def per_request(requests: int, rounds: int) -> tuple[float, float]:
+    from fastapi import FastAPI
+
+    from app import metrics
+
+    def build(with_metrics: bool) -> FastAPI:
+        app = FastAPI()
+
+        @app.get("/ping")
+        async def ping():
+            return {"ok": True}
+
+        if with_metrics:
+            app.add_middleware(metrics.MetricsMiddleware)
+        return app
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        pass
+
+    async def timed(app, count: int) -> float:
+        start = time.perf_counter()
+        for _ in range(count):
+            await app(dict(SCOPE), receive, send)
+        return (time.perf_counter() - start) / count
+
+    async def compare() -> tuple[float, float]:
+        plain, instrumented = build(False), build(True)
+        await timed(plain, 200)
+        await timed(instrumented, 200)
+        results = [(await timed(plain, requests), await timed(instrumented, requests)) for _ in range(rounds)]
+        return min(off for off, _ in results), min(on for _, on in results)
+
+    return asyncio.run(compare())
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--observations", type=int, default=100_000)
+    parser.add_argument("--requests", type=int, default=2000, help="Requests per round and app")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(ROOT))
+    observation = per_observation(args.observations)
+    off, on = per_request(args.requests, args.rounds)
+    results = {
+        "observation_us": round(observation * 1e6, 3),
+        "request_off_us": round(off * 1e6, 2),
+        "request_on_us": round(on * 1e6, 2),
+        "request_overhead_us": round((on - off) * 1e6, 2),
+    }
+    print(f"histogram observation      {results['observation_us']:>8} us")
+    print(f"request, metrics off       {results['request_off_us']:>8} us")
+    print(f"request, metrics on        {results['request_on_us']:>8} us")
+    print(f"overhead per request       {results['request_overhead_us']:>8} us")
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
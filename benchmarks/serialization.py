@@ -0,0 +1,149 @@
+"""Time list-endpoint serialization: ORM + response_model validation vs column rows + orjson.
+
+Generates a dataset with ``benchmarks/datagen.py``, then for each list
+endpoint runs its query and encodes the result both ways, in process so that
+HTTP overhead does not hide the difference::
+
+    python benchmarks/serialization.py --scale medium
+    python benchmarks/serialization.py --database-url postgresql://localhost/inventory_bench --reuse
+
+"before" is what FastAPI does for a route that returns ORM objects: load
+entities, validate them through ``TypeAdapter(list[Model])`` with
+``from_attributes``, dump in JSON mode and encode with ``json.dumps``.
+"after" is the path the routes use now (``app.serialization``).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+from suite import ROOT, SCALES, _generate
+
+
+def _best_of(repeat: int, fn) -> tuple[float, bytes]:
+    best, body = float("inf"), b""
+    for _ in range(repeat):
+        started = time.perf_counter()
+        body = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, body
+
+
+def run(repeat: int) -> dict:
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+
+    from app import db as db_module
+    from app import models, schemas, serialization, services
+
+    def before(schema, stmt, session):
+        adapter = TypeAdapter(list[schema])
+
+        def encode() -> bytes:
+            session.expunge_all()  # a request starts with an empty identity map
+            rows = session.execute(stmt).scalars().all()
+            content = adapter.dump_python(adapter.validate_python(rows, from_attributes=True), mode="json")
+            return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        return encode
+
+    def after(columns, stmt, session):
+        def encode() -> bytes:
+            return serialization.dumps(serialization.row_dicts(session.execute(stmt.with_only_columns(*columns))))
+
+        return encode
+
+    def balance_before(session):
+        adapter = TypeAdapter(list[schemas.BalanceOut])
+
+        def encode() -> bytes:
+            rows = [
+                schemas.BalanceOut(
+                    product_group=row.group_name,
+                    product_code=row.product_code,
+                    product_name=row.product_name,
+                    mfg_date=row.mfg_date,
+                    lot_no=row.lot_no,
+                    qty_on_hand=row.qty_on_hand,
+                    last_tx_datetime=row.last_tx_datetime,
+                    location_code=row.location_code,
+                )
+                for row in session.execute(services.balance_stmt(session, by_location=True))
+            ]
+            content = adapter.dump_python(adapter.validate_python(rows), mode="json")
+            return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+        return encode
+
+    results = {}
+    with db_module.SessionLocal() as session:
+        tx_page = services.transactions_stmt(session).limit(1000)
+        audit_page = services.audit_logs_stmt().limit(1000)
+        cases = {
+            "GET /products": (
+                before(schemas.ProductOut, select(models.Product).order_by(models.Product.product_code), session),
+                after(serialization.columns(models.Product, schemas.ProductOut), select(models.Product).order_by(models.Product.product_code), session),
+            ),
+            "GET /lots": (
+                before(schemas.LotOut, select(models.Lot).order_by(models.Lot.mfg_date.desc()), session),
+                after(serialization.columns(models.Lot, schemas.LotOut), select(models.Lot).order_by(models.Lot.mfg_date.desc()), session),
+            ),
+            "GET /inventory/transactions?limit=1000": (
+                before(schemas.InventoryTxOut, tx_page, session),
+                after(services.TX_OUT_COLUMNS, tx_page, session),
+            ),
+            "GET /audit-logs?limit=1000": (
+                before(schemas.AuditLogOut, audit_page, session),
+                after(services.AUDIT_LOG_OUT_COLUMNS, audit_page, session),
+            ),
+            "GET /inventory/balance?by_location=true": (
+                balance_before(session),
+                lambda: serialization.dumps(services.list_balance(session, by_location=True)),
+            ),
+        }
+        for name, (old, new) in cases.items():
+            old_seconds, old_body = _best_of(repeat, old)
+            new_seconds, new_body = _best_of(repeat, new)
+            assert json.loads(old_body) == json.loads(new_body), name
+            results[name] = {
+                "rows": len(json.loads(new_body)),
+                "before_ms": round(old_seconds * 1000, 2),
+                "after_ms": round(new_seconds * 1000, 2),
+                "speedup": round(old_seconds / new_seconds, 2),
+            }
+            print(
+                f"{name:<40} {results[name]['rows']:>7} rows  {results[name]['before_ms']:>9} ms -> "
+                f"{results[name]['after_ms']:>9} ms  x{results[name]['speedup']}"
+            )
+    return results
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="medium")
+    parser.add_argument("--database-url", help="Defaults to a temporary SQLite file")
+    parser.add_argument("--reuse", action="store_true", help="Use the data already in --database-url")
+    parser.add_argument("--repeat", type=int, default=5, help="Best of N runs per endpoint and path")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    args = parser.parse_args(argv)
+
+    database_url = args.database_url or f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    if not args.reuse:
+        summary = _generate(database_url, SCALES[args.scale], args.seed)
+        print(f"dataset: {summary['transactions']} transactions, {summary['lots']} lots")
+    os.environ["DATABASE_URL"] = database_url
+    sys.path.insert(0, str(ROOT))
+    results = run(args.repeat)
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2), encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""Measure concurrent posting throughput on SQLite with and without the tuned pragmas.
+
+Each profile runs in its own interpreter (``app.db`` reads its settings at import
+time) against a fresh database file. Worker threads post inbound lines through
+``services.post_inbound`` and count "database is locked" failures::
+
+    python benchmarks/sqlite_concurrency.py --threads 16 --postings 200
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+PROFILES = {
+    "rollback-journal": {
+        "SQLITE_JOURNAL_MODE": "DELETE",
+        "SQLITE_SYNCHRONOUS": "FULL",
+        "SQLITE_BUSY_TIMEOUT_MS": "5000",
+        "SQLITE_CACHE_SIZE": "-2000",
+        "SQLITE_MMAP_SIZE": "0",
+    },
+    "wal-tuned": {},
+}
+
+
+def run_worker(threads: int, postings: int) -> dict:
+    import datetime as dt
+    from concurrent.futures import ThreadPoolExecutor
+
+    from sqlalchemy.exc import OperationalError
+
+    from app import models, schemas, services
+    from app.db import Base, SessionLocal, engine
+
+    Base.metadata.create_all(engine)
+    with SessionLocal() as db:
+        group = models.ProductGroup(group_name="Bench")
+        db.add(group)
+        db.flush()
+        product = models.Product(product_code="BENCH-1", product_name="Bench", group_id=group.group_id)
+        db.add(product)
+        db.flush()
+        lot = models.Lot(product_id=product.product_id, lot_no="L1", mfg_date=dt.date(2024, 1, 1))
+        db.add(lot)
+        db.commit()
+        payload = schemas.InventoryInCreate(product_id=product.product_id, lot_id=lot.lot_id, qty=1)
+
+    def post(_: int) -> tuple[int, int]:
+        ok = locked = 0
+        for _ in range(postings):
+            with SessionLocal() as db:
+                try:
+                    services.post_inbound(db, payload)
+                    db.commit()
+                    ok += 1
+                except OperationalError as exc:
+                    db.rollback()
+                    if "locked" not in str(exc):
+                        raise
+                    locked += 1
+        return ok, locked
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(post, range(threads)))
+    elapsed = time.perf_counter() - started
+    ok = sum(item[0] for item in results)
+    return {
+        "postings": ok,
+        "locked_errors": sum(item[1] for item in results),
+        "seconds": round(elapsed, 3),
+        "postings_per_sec": round(ok / elapsed, 1),
+    }
+
+
+def run_profile(name: str, threads: int, postings: int) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {**os.environ, **PROFILES[name], "DATABASE_URL": f"sqlite:///{Path(tmp) / 'bench.db'}"}
+        completed = subprocess.run(
+            [sys.executable, __file__, "--worker", "--threads", str(threads), "--postings", str(postings)],
+            cwd=ROOT,
+            env=env,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    return {"profile": name, **json.loads(completed.stdout.strip().splitlines()[-1])}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--postings", type=int, default=100, help="Postings per thread")
+    parser.add_argument("--profile", choices=sorted(PROFILES), action="append")
+    parser.add_argument("--output", help="Write results as JSON")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        sys.path.insert(0, str(ROOT))
+        print(json.dumps(run_worker(args.threads, args.postings)))
+        return
+
+    results = [run_profile(name, args.threads, args.postings) for name in args.profile or PROFILES]
+    for item in results:
+        print(
+            f"{item['profile']:<18} {item['postings_per_sec']:>8} postings/s  "
+            f"{item['postings']} ok  {item['locked_errors']} locked  {item['seconds']}s"
+        )
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""Reproducible load test: synthetic dataset + mixed scenarios per backend.
+
+For each backend (a temporary SQLite file, plus PostgreSQL when
+``--postgres-url`` is given) the runner generates a dataset with
+``benchmarks/datagen.py``, starts uvicorn on it and drives these scenarios:
+
+- ``posting_mix``: inbound, outbound, 10-line batches and FEFO allocations
+- ``balance_listing``: current stock by group/product/location and as of a month end
+- ``transaction_search``: ledger pages by date window, product, lot and location
+- ``audit_queries``: latest audit page and one transaction's history
+
+Each scenario reports ops/sec and p50/p95/p99 latency. Requests are chosen by a
+seeded RNG per client, so two runs at the same commit send the same requests::
+
+    python benchmarks/suite.py --scale small
+    python benchmarks/suite.py --scale medium --postgres-url postgresql://localhost/inventory_bench --output after.json
+    python benchmarks/suite.py --scale medium --output after.json --compare before.json
+
+The PostgreSQL database is dropped and recreated: use a scratch database.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import datetime as dt
+import json
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+import httpx
+
+from async_vs_sync import ROOT, _free_port, _percentile, _start_server
+
+SCALES = {
+    "small": {"groups": 2, "products": 10, "lots": 5, "years": 0.25, "tx-per-day": 200, "locations": 2},
+    "medium": {"groups": 5, "products": 40, "lots": 20, "years": 1, "tx-per-day": 500, "locations": 3},
+    "large": {"groups": 10, "products": 100, "lots": 20, "years": 3, "tx-per-day": 2000, "locations": 5},
+}
+
+# A request: (method, path, query params, JSON body)
+Request = tuple[str, str, dict | None, dict | None]
+
+
+class Dataset:
+    def __init__(self, summary: dict):
+        self.summary = summary
+        self.products = summary["products"]
+        self.lots_per_product = summary["lots"] // summary["products"]
+        self.locations = summary["locations"]
+        self.transactions = summary["transactions"]
+        self.start = dt.datetime.fromisoformat(summary["start"])
+        self.end = dt.datetime.fromisoformat(summary["end"])
+        self.snapshots = summary["snapshots"]
+        self.groups = summary["groups"]
+
+    def line(self, rng: random.Random) -> dict:
+        product_id = rng.randint(1, self.products)
+        lot_id = (product_id - 1) * self.lots_per_product + rng.randint(1, self.lots_per_product)
+        return {"product_id": product_id, "lot_id": lot_id, "location_id": rng.randint(1, self.locations)}
+
+    def window(self, rng: random.Random, days: int) -> dict:
+        span = max((self.end - self.start).days - days, 0)
+        start = self.start + dt.timedelta(days=rng.randint(0, span))
+        return {"start_datetime": start.isoformat(), "end_datetime": (start + dt.timedelta(days=days)).isoformat()}
+
+
+def posting_mix(data: Dataset, rng: random.Random) -> Request:
+    roll = rng.random()
+    if roll < 0.4:
+        return "POST", "/inventory/in", None, {**data.line(rng), "qty": rng.randint(1, 20)}
+    if roll < 0.8:
+        return "POST", "/inventory/out", None, {**data.line(rng), "qty": rng.randint(1, 5), "confirm_shortage": True}
+    if roll < 0.9:
+        lines = [
+            {**data.line(rng), "tx_type": rng.choice(("IN", "OUT")), "qty": rng.randint(1, 5), "confirm_shortage": True}
+            for _ in range(10)
+        ]
+        return "POST", "/inventory/batch", None, {"lines": lines}
+    line = data.line(rng)
+    body = {"product_id": line["product_id"], "location_id": line["location_id"], "qty": rng.randint(1, 10)}
+    return "POST", "/inventory/out/allocate", None, body
+
+
+def balance_listing(data: Dataset, rng: random.Random) -> Request:
+    roll = rng.random()
+    if roll < 0.3:
+        return "GET", "/inventory/balance", {"group_id": rng.randint(1, data.groups)}, None
+    if roll < 0.6:
+        return "GET", "/inventory/balance", {"product_code": f"P{rng.randint(1, data.products):06d}"}, None
+    if roll < 0.8:
+        return "GET", "/inventory/balance", {"location_id": rng.randint(1, data.locations), "by_location": "true"}, None
+    params = {"group_id": rng.randint(1, data.groups)}
+    if data.snapshots:
+        params["as_of"] = rng.choice(data.snapshots)
+    return "GET", "/inventory/balance", params, None
+
+
+def transaction_search(data: Dataset, rng: random.Random) -> Request:
+    roll = rng.random()
+    params: dict = {"limit": 50}
+    if roll < 0.3:
+        params.update(data.window(rng, 1))
+    elif roll < 0.5:
+        params.update(data.window(rng, 7))
+        params["product_code"] = f"P{rng.randint(1, data.products):06d}"
+    elif roll < 0.8:
+        params["lot_id"] = data.line(rng)["lot_id"]
+    else:
+        params.update(data.window(rng, 30))
+        params["location_id"] = rng.randint(1, data.locations)
+    return "GET", "/inventory/transactions", params, None
+
+
+def audit_queries(data: Dataset, rng: random.Random) -> Request:
+    if rng.random() < 0.5:
+        return "GET", "/audit-logs", {"limit": 50}, None
+    params = {"entity_type": "inventory_tx", "entity_id": str(rng.randint(1, data.transactions))}
+    return "GET", "/audit-logs", params, None
+
+
+# name -> (request builder, accepted statuses); allocations may run out of stock.
+SCENARIOS: dict[str, tuple[Callable[[Dataset, random.Random], Request], frozenset[int]]] = {
+    "posting_mix": (posting_mix, frozenset({200, 201, 409})),
+    "balance_listing": (balance_listing, frozenset({200})),
+    "transaction_search": (transaction_search, frozenset({200})),
+    "audit_queries": (audit_queries, frozenset({200})),
+}
+
+
+async def _run_scenario(
+    base_url: str, data: Dataset, name: str, requests: int, concurrency: int, seed: int
+) -> dict:
+    build, accepted = SCENARIOS[name]
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies: list[float] = []
+    errors = 0
+    remaining = requests
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+
+        async def worker(index: int) -> None:
+            nonlocal errors, remaining
+            rng = random.Random(f"{seed}/{name}/{index}")
+            while remaining > 0:
+                remaining -= 1
+                method, path, params, body = build(data, rng)
+                started = time.perf_counter()
+                try:
+                    response = await client.request(method, path, params=params, json=body)
+                except httpx.TransportError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - started)
+                if response.status_code not in accepted:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(index) for index in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    latencies = sorted(latencies) or [float("nan")]
+    return {
+        "requests": requests,
+        "errors": errors,
+        "ops_per_sec": round(requests / elapsed, 1),
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+    }
+
+
+def _generate(database_url: str, scale: dict, seed: int) -> dict:
+    options = [item for key, value in scale.items() for item in (f"--{key}", str(value))]
+    completed = subprocess.run(
+        [sys.executable, str(ROOT / "benchmarks" / "datagen.py"), "--database-url", database_url, "--seed", str(seed), *options],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def run_backend(database_url: str, scale: dict, args) -> dict:
+    summary = _generate(database_url, scale, args.seed)
+    print(f"dataset: {summary['transactions']} transactions, {summary['lots']} lots ({summary['seconds']}s)")
+    data = Dataset(summary)
+    port = _free_port()
+    base_url = f"http://127.0.0.1:{port}"
+    server = _start_server(database_url, port, args.workers)
+    results = {}
+    try:
+        for name in args.scenarios:
+            # Warm-up fills the master-data cache and the database page cache; it is not measured.
+            asyncio.run(_run_scenario(base_url, data, name, min(50, args.requests), args.concurrency, args.seed + 1))
+            result = asyncio.run(_run_scenario(base_url, data, name, args.requests, args.concurrency, args.seed))
+            results[name] = result
+            print(
+                f"  {name:<20} {result['ops_per_sec']:>9} ops/s  p50 {result['p50_ms']:>8} ms  "
+                f"p95 {result['p95_ms']:>8} ms  p99 {result['p99_ms']:>8} ms  errors {result['errors']}"
+            )
+    finally:
+        server.terminate()
+        server.wait()
+    return {"dataset": summary, "scenarios": results}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current: dict, previous: dict) -> None:
+    print(f"\nvs {previous['meta'].get('git_commit')} ({previous['meta'].get('timestamp')}):")
+    for backend, result in current["backends"].items():
+        before = previous["backends"].get(backend, {}).get("scenarios", {})
+        for name, now in result["scenarios"].items():
+            if name not in before:
+                continue
+            then = before[name]
+            rate = (now["ops_per_sec"] / then["ops_per_sec"] - 1) * 100 if then["ops_per_sec"] else float("nan")
+            print(
+                f"  {backend:<9} {name:<20} ops/s {then['ops_per_sec']:>9} -> {now['ops_per_sec']:>9} ({rate:+.1f}%)  "
+                f"p95 {then['p95_ms']:>8} -> {now['p95_ms']:>8} ms"
+            )
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scale", choices=sorted(SCALES), default="small")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=1000, help="Measured requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--postgres-url", help="Also run against this (scratch) PostgreSQL database")
+    parser.add_argument("--skip-sqlite", action="store_true")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Print the change against a previous --output file")
+    args = parser.parse_args(argv)
+
+    backends = {}
+    if not args.skip_sqlite:
+        backends["sqlite"] = f"sqlite:///{tempfile.mkdtemp()}/bench.db"
+    if args.postgres_url:
+        backends["postgres"] = args.postgres_url
+    if not backends:
+        parser.error("nothing to run: --skip-sqlite without --postgres-url")
+
+    report = {
+        "meta": {
+            "timestamp": dt.datetime.now(dt.timezone.utc).isoformat(timespec="seconds"),
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "scale": args.scale,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "workers": args.workers,
+            "seed": args.seed,
+        },
+        "backends": {},
+    }
+    for backend, database_url in backends.items():
+        print(f"{backend} ({args.scale})")
+        report["backends"][backend] = run_backend(database_url, SCALES[args.scale], args)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2), encoding="utf-8")
+    if args.compare:
+        compare(report, json.loads(Path(args.compare).read_text(encoding="utf-8")))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())